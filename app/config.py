@@ -13,7 +13,56 @@ if TARGET_USER_ID:
     TARGET_USER_ID = TARGET_USER_ID.strip()
 
 # P2P Quake API
-P2P_API_URL = "https://api.p2pquake.net/v2/history?codes=551&limit=1"
+# Number of recent events fetched per poll. Above 1, /check_quake runs in batch
+# mode and walks every fetched event oldest-first from a saved cursor.
+P2P_HISTORY_LIMIT = int(os.getenv("P2P_HISTORY_LIMIT", "1"))
+# Information codes fetched in the same call: 551 earthquake, 552 tsunami
+# forecast, 556 early warning (e.g. "551,552,556")
+P2P_CODES = [int(c) for c in os.getenv("P2P_CODES", "551").split(",") if c.strip()]
+# Other codes share the list, so fetch a few items to keep the latest quake in it
+_P2P_LIMIT = P2P_HISTORY_LIMIT if P2P_CODES == [551] else max(P2P_HISTORY_LIMIT, 10)
+P2P_API_URL = os.getenv(
+    "P2P_API_URL",
+    "https://api.p2pquake.net/v2/history?" + "&".join(f"codes={c}" for c in P2P_CODES) + f"&limit={_P2P_LIMIT}",
+)
+
+# Per-quake state (max scale, tsunami, notified) kept to spot corrections in later reports
+QUAKE_EVENT_CACHE_SIZE = int(os.getenv("QUAKE_EVENT_CACHE_SIZE", "1000"))
+QUAKE_EVENT_CACHE_TTL = float(os.getenv("QUAKE_EVENT_CACHE_TTL", "86400"))
+
+# /check_quake: concurrent calls share one upstream fetch, and its result is
+# reused for this many seconds (0 = coalesce only) so bursts cause no extra traffic.
+# A new quake can reach callers of /check_quake up to this much later.
+QUAKE_RESULT_TTL = float(os.getenv("QUAKE_RESULT_TTL", "1"))
+
+# Local archive of every 551 report seen (backs /quakes and /quake_stats)
+QUAKE_ARCHIVE_ENABLED = os.getenv("QUAKE_ARCHIVE_ENABLED", "true").lower() == "true"
+QUAKE_ARCHIVE_FILE = os.getenv("QUAKE_ARCHIVE_FILE", "data/quake_archive.bin")
+
+# Coordination between instances
+# "sqlite" keeps one idempotency key per notified quake in CLAIMS_DB, so several
+# instances (or scheduler retries) sharing that file notify each event once.
+# "memory" only deduplicates within this process; "none" disables claims.
+CLAIMS_BACKEND = os.getenv("CLAIMS_BACKEND", "sqlite").lower()
+CLAIMS_DB = os.getenv("CLAIMS_DB", "data/claims.sqlite3")
+CLAIMS_RETENTION_DAYS = float(os.getenv("CLAIMS_RETENTION_DAYS", "7"))
+# When the dedupe state or the claim store fails: retries (with a growing delay
+# in seconds), then "true" notifies anyway (a possible duplicate) and "false"
+# drops the notification (a possible missed alert)
+DEDUPE_RETRIES = int(os.getenv("DEDUPE_RETRIES", "2"))
+DEDUPE_RETRY_DELAY = float(os.getenv("DEDUPE_RETRY_DELAY", "0.2"))
+DEDUPE_FAIL_OPEN = os.getenv("DEDUPE_FAIL_OPEN", "true").lower() == "true"
+
+# Upstream resilience for the history API
+# Optional mirror, raced against P2P_API_URL when it has not answered within
+# P2P_HEDGE_DELAY seconds (or failed); the first good answer wins
+P2P_MIRROR_URL = os.getenv("P2P_MIRROR_URL", "")
+P2P_HEDGE_DELAY = float(os.getenv("P2P_HEDGE_DELAY", "1.5"))
+# Hard limit (seconds) for one fetch, mirror included
+P2P_FETCH_DEADLINE = float(os.getenv("P2P_FETCH_DEADLINE", "8"))
+# Consecutive failures that open an endpoint's circuit, and seconds before retrying it
+P2P_BREAKER_FAILURES = int(os.getenv("P2P_BREAKER_FAILURES", "5"))
+P2P_BREAKER_RESET = float(os.getenv("P2P_BREAKER_RESET", "30"))
 
 # Watch List for Health Check
 WATCH_LIST = {
@@ -22,3 +71,116 @@ WATCH_LIST = {
     "URL_USAGI": os.getenv("URL_USAGI"),
     "URL_ROBO": os.getenv("URL_ROBO"),
 }
+
+# Large watch lists
+# JSON/YAML file (or directory of them) replacing WATCH_LIST, with per-target
+# interval, timeout and expected_status
+HEALTH_WATCH_FILE = os.getenv("HEALTH_WATCH_FILE", "")
+# Sharding across nodes (or processes): every node lists all of them as "id=base URL,..."
+# and probes only the targets that consistent hashing assigns to its HEALTH_NODE_ID
+HEALTH_NODES = {
+    node.strip(): url.strip().rstrip("/")
+    for node, url in (
+        item.split("=", 1)
+        for item in os.getenv("HEALTH_NODES", "").split(",")
+        if "=" in item
+    )
+}
+HEALTH_NODE_ID = os.getenv("HEALTH_NODE_ID", "")
+# Seconds to wait for another node's shard result
+HEALTH_SHARD_TIMEOUT = float(os.getenv("HEALTH_SHARD_TIMEOUT", "120"))
+# Targets sharing a host: probes in flight at once, and probes per second (0 = unlimited)
+HEALTH_PER_HOST_CONCURRENCY = int(os.getenv("HEALTH_PER_HOST_CONCURRENCY", "2"))
+HEALTH_HOST_RATE = float(os.getenv("HEALTH_HOST_RATE", "0"))
+HEALTH_HOST_BURST = float(os.getenv("HEALTH_HOST_BURST", "5"))
+
+# Health Check concurrency
+# Maximum number of targets probed at the same time
+HEALTH_MAX_CONCURRENCY = int(os.getenv("HEALTH_MAX_CONCURRENCY", "10"))
+# Seconds each target may take, counted from when its probe starts
+HEALTH_TARGET_DEADLINE = float(os.getenv("HEALTH_TARGET_DEADLINE", "30"))
+# How targets are requested: "head" (HEAD, confirmed with a GET if rejected),
+# "stream" (GET closed once the headers arrive) or "get" (full download)
+HEALTH_PROBE_MODE = os.getenv("HEALTH_PROBE_MODE", "head").lower()
+# Targets slower than this (seconds) are reported as degraded; 0 disables
+HEALTH_LATENCY_SLO = float(os.getenv("HEALTH_LATENCY_SLO", "5"))
+# Per-target overrides, e.g. "USAGI=1.5,ROBO=3"
+HEALTH_LATENCY_SLOS = {
+    name.strip(): float(slo)
+    for name, slo in (
+        item.split("=", 1)
+        for item in os.getenv("HEALTH_LATENCY_SLOS", "").split(",")
+        if "=" in item
+    )
+}
+
+# Health history and alerting
+# Probe results kept per target for /health_history (one per patrol)
+HEALTH_HISTORY_SIZE = int(os.getenv("HEALTH_HISTORY_SIZE", "1440"))
+# Consecutive results needed before a target is reported DOWN (or UP again)
+HEALTH_ALERT_AFTER = int(os.getenv("HEALTH_ALERT_AFTER", "2"))
+# A target whose results flip this many times within the last N patrols is "flapping"
+HEALTH_FLAP_WINDOW = int(os.getenv("HEALTH_FLAP_WINDOW", "10"))
+HEALTH_FLAP_THRESHOLD = int(os.getenv("HEALTH_FLAP_THRESHOLD", "4"))
+HEALTH_STATE_FILE = os.getenv("HEALTH_STATE_FILE", "data/health_state.json")
+
+# Shared HTTP connection pool
+# Number of per-host pools to keep, and connections kept alive per host
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+# Per-host overrides, e.g. "api.p2pquake.net=4,api.line.me=4"
+HTTP_HOST_POOL_SIZES = {
+    host.strip(): int(size)
+    for host, size in (
+        item.split("=", 1)
+        for item in os.getenv("HTTP_HOST_POOL_SIZES", "api.p2pquake.net=4,api.line.me=4").split(",")
+        if "=" in item
+    )
+}
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+# Retries for idempotent requests (connection errors and 502/503/504)
+HTTP_RETRY_TOTAL = int(os.getenv("HTTP_RETRY_TOTAL", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+
+# P2P Quake WebSocket push feed (alternative to scheduler polling)
+QUAKE_STREAM_ENABLED = os.getenv("QUAKE_STREAM_ENABLED", "false").lower() == "true"
+P2P_WS_URL = os.getenv("P2P_WS_URL", "wss://api.p2pquake.net/v2/ws")
+# Poll interval (seconds) used only while the stream is disconnected
+QUAKE_STREAM_FALLBACK_INTERVAL = float(os.getenv("QUAKE_STREAM_FALLBACK_INTERVAL", "60"))
+QUAKE_STREAM_BACKOFF_MAX = float(os.getenv("QUAKE_STREAM_BACKOFF_MAX", "60"))
+
+# LINE Messaging API endpoint (override to point at a local stand-in)
+LINE_API_ENDPOINT = os.getenv("LINE_API_ENDPOINT", "https://api.line.me")
+
+# Background notification dispatch
+# Undelivered LINE messages are kept here so they survive a restart
+NOTIFY_SPOOL_FILE = os.getenv("NOTIFY_SPOOL_FILE", "data/notification_spool.jsonl")
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+NOTIFY_BACKOFF_MAX = float(os.getenv("NOTIFY_BACKOFF_MAX", "300"))
+
+# Alert recipients
+# TARGET_USER_ID is always notified; extra IDs can be listed here (comma-separated)
+SUBSCRIBER_IDS = [i.strip() for i in os.getenv("SUBSCRIBER_IDS", "").split(",") if i.strip()]
+SUBSCRIBERS_FILE = os.getenv("SUBSCRIBERS_FILE", "data/subscribers.json")
+# Number of multicast batches (up to 500 users each) sent at the same time
+LINE_MULTICAST_CONCURRENCY = int(os.getenv("LINE_MULTICAST_CONCURRENCY", "4"))
+
+# In-process scheduler (alternative to an external cron calling the endpoints)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+# Quake polling: min_interval while a quake happened within the active window,
+# stretching towards max_interval when quiet (seconds)
+QUAKE_POLL_MIN_INTERVAL = float(os.getenv("QUAKE_POLL_MIN_INTERVAL", "5"))
+QUAKE_POLL_MAX_INTERVAL = float(os.getenv("QUAKE_POLL_MAX_INTERVAL", "60"))
+QUAKE_ACTIVE_WINDOW = float(os.getenv("QUAKE_ACTIVE_WINDOW", "1800"))
+# Health patrols: faster while a target is failing or slow
+HEALTH_POLL_MIN_INTERVAL = float(os.getenv("HEALTH_POLL_MIN_INTERVAL", "30"))
+HEALTH_POLL_MAX_INTERVAL = float(os.getenv("HEALTH_POLL_MAX_INTERVAL", "300"))
+# Growth per quiet run, and random spread of each delay (fraction)
+SCHEDULER_BACKOFF_FACTOR = float(os.getenv("SCHEDULER_BACKOFF_FACTOR", "1.5"))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+
+# Startup
+# Build services and load the HTTP/LINE client libraries in the background right
+# after startup, instead of on the first request that needs them
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
@@ -1,44 +1,385 @@
-from fastapi import FastAPI
-import os
-from .config import LINE_CHANNEL_ACCESS_TOKEN, TARGET_USER_ID, P2P_API_URL, WATCH_LIST
+import time
+
+# Measured from here so /startup_stats can report how long importing the app took
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from .config import (
+    LINE_CHANNEL_ACCESS_TOKEN, LINE_API_ENDPOINT, TARGET_USER_ID, P2P_API_URL, P2P_HISTORY_LIMIT, P2P_CODES,
+    P2P_MIRROR_URL, P2P_HEDGE_DELAY, P2P_FETCH_DEADLINE, P2P_BREAKER_FAILURES, P2P_BREAKER_RESET, WATCH_LIST,
+    HEALTH_WATCH_FILE, HEALTH_NODES, HEALTH_NODE_ID, HEALTH_SHARD_TIMEOUT,
+    HEALTH_PER_HOST_CONCURRENCY, HEALTH_HOST_RATE, HEALTH_HOST_BURST,
+    HEALTH_MAX_CONCURRENCY, HEALTH_TARGET_DEADLINE, HEALTH_PROBE_MODE, HEALTH_LATENCY_SLO, HEALTH_LATENCY_SLOS,
+    HEALTH_HISTORY_SIZE, HEALTH_ALERT_AFTER, HEALTH_FLAP_WINDOW, HEALTH_FLAP_THRESHOLD, HEALTH_STATE_FILE,
+    QUAKE_STREAM_ENABLED, P2P_WS_URL, QUAKE_STREAM_FALLBACK_INTERVAL, QUAKE_STREAM_BACKOFF_MAX,
+    NOTIFY_SPOOL_FILE, NOTIFY_MAX_ATTEMPTS, NOTIFY_BACKOFF_MAX,
+    SUBSCRIBER_IDS, SUBSCRIBERS_FILE, LINE_MULTICAST_CONCURRENCY,
+    QUAKE_EVENT_CACHE_SIZE, QUAKE_EVENT_CACHE_TTL, QUAKE_RESULT_TTL, QUAKE_ARCHIVE_ENABLED, QUAKE_ARCHIVE_FILE, CLAIMS_BACKEND, CLAIMS_DB, CLAIMS_RETENTION_DAYS,
+    DEDUPE_RETRIES, DEDUPE_RETRY_DELAY, DEDUPE_FAIL_OPEN,
+    SCHEDULER_ENABLED, QUAKE_POLL_MIN_INTERVAL, QUAKE_POLL_MAX_INTERVAL, QUAKE_ACTIVE_WINDOW,
+    HEALTH_POLL_MIN_INTERVAL, HEALTH_POLL_MAX_INTERVAL, SCHEDULER_BACKOFF_FACTOR, SCHEDULER_JITTER,
+    WARM_UP_ON_STARTUP,
+)
+from .services.coordination import ClaimStore, DedupeWrites, InMemoryClaimStore, SqliteClaimStore, default_owner
+from .services.host_limits import HostLimits
+from .services.http_client import get_session, close_session, close_async_session
 from .services.line_notifier import LineNotifier
+from .services.metrics import REGISTRY, CONTENT_TYPE, QUAKE_CHECKS_TOTAL
+from .services.notification_queue import NotificationQueue, PRIORITY_QUAKE, PRIORITY_HEALTH
+from .services.quake_archive import QuakeArchive, parse_time
 from .services.quake_service import QuakeService
+from .services.quake_stream import QuakeStreamIngestor
+from .services.resilience import HedgedFetcher
+from .services.scheduler import AdaptiveInterval, JobResult, Scheduler
+from .services.single_flight import SingleFlight
+from .services.subscribers import SubscriberRegistry
 from .services.health_service import HealthService
-from typing import Dict, Any
+from .services.health_history import HealthHistory, DEGRADED, DOWN, FLAPPING, UP
+from .services.health_shards import fetch_shard, merge_shards
+from .services.state_store import JsonFileStateStore
+from .services.watch_list import HashRing, WatchTarget, as_targets, load_watch_list
+from typing import Callable, Dict, Any, List, Optional
 
-app = FastAPI()
+# Services are created on first use (or by the startup warm-up), so importing
+# this module does no file I/O and loads no HTTP or LINE client libraries
+_services: Dict[str, Any] = {}
+_services_lock = threading.RLock()
+quake_stream: Optional[QuakeStreamIngestor] = None
+scheduler: Optional[Scheduler] = None
+startup_stats: Dict[str, Optional[float]] = {"import_seconds": None, "warm_up_seconds": None}
 
-# Ensure data directory exists
-os.makedirs("data", exist_ok=True)
+def _service(name: str, factory: Callable[[], Any]) -> Any:
+    service = _services.get(name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(name)
+            if service is None:
+                service = _services[name] = factory()
+    return service
 
-# Initialize Services
-line_notifier = LineNotifier(LINE_CHANNEL_ACCESS_TOKEN, TARGET_USER_ID)
-quake_service = QuakeService(P2P_API_URL)
-health_service = HealthService()
+def get_subscriber_registry() -> SubscriberRegistry:
+    return _service("subscriber_registry", lambda: SubscriberRegistry(
+        SUBSCRIBERS_FILE, static_ids=[TARGET_USER_ID, *SUBSCRIBER_IDS]
+    ))
 
-@app.get("/")
-def read_root() -> Dict[str, str]:
-    return {"status": "Meerkat Bot is running 🦦"}
+def get_line_notifier() -> LineNotifier:
+    return _service("line_notifier", lambda: LineNotifier(
+        LINE_CHANNEL_ACCESS_TOKEN, TARGET_USER_ID, LINE_API_ENDPOINT,
+        multicast_concurrency=LINE_MULTICAST_CONCURRENCY,
+    ))
 
-@app.get("/check_quake")
-def check_earthquake() -> Dict[str, Any]:
-    result = quake_service.check_quake()
+def get_quake_archive() -> Optional[QuakeArchive]:
+    if not QUAKE_ARCHIVE_ENABLED:
+        return None
+    return _service("quake_archive", lambda: QuakeArchive(QUAKE_ARCHIVE_FILE))
+
+def get_claim_store() -> Optional[ClaimStore]:
+    retention = CLAIMS_RETENTION_DAYS * 86400
+    if CLAIMS_BACKEND == "sqlite":
+        return _service("claim_store", lambda: SqliteClaimStore(CLAIMS_DB, retention))
+    if CLAIMS_BACKEND == "memory":
+        return _service("claim_store", lambda: InMemoryClaimStore(retention))
+    return None
+
+def get_quake_service() -> QuakeService:
+    return _service("quake_service", lambda: QuakeService(
+        P2P_API_URL, recipient_filter=get_subscriber_registry().recipients_for,
+        archive=get_quake_archive(), claims=get_claim_store(),
+        event_cache_size=QUAKE_EVENT_CACHE_SIZE, event_cache_ttl=QUAKE_EVENT_CACHE_TTL,
+        feed_codes=P2P_CODES, fetcher=HedgedFetcher(
+            [P2P_API_URL, P2P_MIRROR_URL], hedge_delay=P2P_HEDGE_DELAY, deadline=P2P_FETCH_DEADLINE,
+            failure_threshold=P2P_BREAKER_FAILURES, reset_timeout=P2P_BREAKER_RESET,
+        ),
+        dedupe=DedupeWrites(DEDUPE_RETRIES, DEDUPE_RETRY_DELAY, DEDUPE_FAIL_OPEN),
+    ))
+
+def get_health_service() -> HealthService:
+    return _service("health_service", lambda: HealthService(
+        HEALTH_MAX_CONCURRENCY, HEALTH_TARGET_DEADLINE, history=HealthHistory(
+            HEALTH_HISTORY_SIZE, HEALTH_ALERT_AFTER, HEALTH_FLAP_WINDOW, HEALTH_FLAP_THRESHOLD,
+            state_store=JsonFileStateStore(HEALTH_STATE_FILE),
+        ),
+        probe_mode=HEALTH_PROBE_MODE, latency_slo=HEALTH_LATENCY_SLO, latency_slos=HEALTH_LATENCY_SLOS,
+        host_limits=HostLimits(HEALTH_PER_HOST_CONCURRENCY, HEALTH_HOST_RATE, HEALTH_HOST_BURST),
+    ))
+
+def get_watch_targets() -> List[WatchTarget]:
+    """This node's share of the watch list (all of it unless HEALTH_NODES is set)."""
+    def build() -> List[WatchTarget]:
+        targets = load_watch_list(HEALTH_WATCH_FILE) if HEALTH_WATCH_FILE else as_targets(WATCH_LIST)
+        if not HEALTH_NODES:
+            return targets
+        if HEALTH_NODE_ID not in HEALTH_NODES:
+            raise ValueError(f"HEALTH_NODE_ID {HEALTH_NODE_ID!r} is not one of HEALTH_NODES")
+        return HashRing(HEALTH_NODES).shard(targets, HEALTH_NODE_ID)
+    return _service("watch_targets", build)
+
+def get_notification_queue() -> NotificationQueue:
+    return _service("notification_queue", lambda: NotificationQueue(
+        send_notification, NOTIFY_SPOOL_FILE,
+        max_attempts=NOTIFY_MAX_ATTEMPTS, backoff_max=NOTIFY_BACKOFF_MAX,
+        claims=get_claim_store(), owner=default_owner(),
+    ))
+
+async def send_notification(text: str, recipients: Optional[List[str]]) -> Any:
+    return await get_line_notifier().fan_out_async(text, recipients)
+
+def warm_up() -> None:
+    """Create every service and load the client libraries ahead of the first request."""
+    started = time.perf_counter()
+    get_quake_service()
+    get_health_service()
+    get_subscriber_registry().region_index()
+    # Loads requests and the LINE SDK / aiohttp client modules
+    get_session()
+    get_line_notifier().line_bot_api
+    import aiohttp  # noqa: F401
+    import linebot.aiohttp_async_http_client  # noqa: F401
+    startup_stats["warm_up_seconds"] = time.perf_counter() - started
+
+def enqueue_health_alert(text: str) -> str:
+    """Queue a site health alert for the operators (TARGET_USER_ID / SUBSCRIBER_IDS)."""
+    return get_notification_queue().enqueue(text, PRIORITY_HEALTH, list(get_subscriber_registry().static_ids))
+
+def enqueue_quake_alert(result: Dict[str, Any]) -> bool:
+    """
+    Queue a quake alert for the subscribers picked by region.
+    Returns False if no subscriber's area was affected enough.
+    """
+    recipients = result.pop("recipients", None)
+    if recipients is None:
+        recipients = get_subscriber_registry().all_ids()
+    result["recipient_count"] = len(recipients)
+    if not recipients:
+        return False
+    result["notification_id"] = get_notification_queue().enqueue(result["message"], PRIORITY_QUAKE, recipients)
+    return True
+
+async def notify_stream_quake(result: Dict[str, Any]) -> None:
+    enqueue_quake_alert(result)
+
+async def run_quake_check() -> Dict[str, Any]:
+    """One poll of the P2P Quake API, queueing alerts for qualifying events."""
+    if P2P_HISTORY_LIMIT > 1:
+        result = await get_quake_service().check_quakes_async()
+        for event in result["results"] + result.get("feed", []):
+            event["notified"] = enqueue_quake_alert(event)
+        result["notified"] = any(event["notified"] for event in result["results"])
+        QUAKE_CHECKS_TOTAL.inc(status=result["status"])
+        return result
+
+    result = await get_quake_service().check_quake_async()
+    QUAKE_CHECKS_TOTAL.inc(status=result["status"])
 
     if result.get("notify"):
-        line_notifier.send_message(result["message"])
-        result["notified"] = True
+        # Delivery (with retries) happens in the background
+        result["notified"] = enqueue_quake_alert(result)
     else:
         result["notified"] = False
+    # Tsunami forecasts and early warnings fetched in the same call
+    for item in result.get("feed", []):
+        item["notified"] = enqueue_quake_alert(item)
 
     return result
 
-@app.get("/check_health")
-def check_website_health() -> Dict[str, Any]:
-    errors = health_service.check_health(WATCH_LIST)
+# Shared by /check_quake and the scheduler; alerts are queued by the caller that ran the check
+quake_check = SingleFlight(run_quake_check, ttl=QUAKE_RESULT_TTL, cache_if=lambda result: result["status"] != "Error")
+
+def quake_activity(result: Dict[str, Any]) -> JobResult:
+    """Scheduler outcome of a quake check: the newest quake counts as activity."""
+    latest = result.get("latest") or result.get("time")
+    try:
+        activity_at = parse_time(latest)
+    except ValueError:
+        activity_at = None
+    return result["status"] != "Error", activity_at
+
+HEALTH_ALERT_TITLES = {
+    DOWN: "🦦 Emergency Alert!",
+    FLAPPING: "🦦 Unstable Site Warning",
+    DEGRADED: "🦦 Slow Response Warning",
+    UP: "🦦 Recovery Notice",
+}
+
+async def run_health_patrol() -> Dict[str, Any]:
+    """One patrol of this node's watch targets, queueing alerts for state changes."""
+    result = await get_health_service().patrol_async(get_watch_targets())
+    errors, degraded, alerts = result["errors"], result["degraded"], result["alerts"]
+
+    # Only state changes are sent, so a long outage alerts once (and once more on recovery).
+    # One message per kind of change, so a recovery never goes out under an emergency title.
+    if alerts:
+        for kind, title in HEALTH_ALERT_TITLES.items():
+            lines = [alert for alert in alerts if getattr(alert, "kind", DOWN) == kind]
+            if lines:
+                enqueue_health_alert(f"{title} \n\n" + "\n".join(lines))
+        return {"status": "Alert Sent", "detail": errors + degraded, "alerts": alerts}
 
     if errors:
-        alert_text = "🦦 Emergency Alert! \n\n" + "\n".join(errors)
-        line_notifier.send_message(alert_text)
-        return {"status": "Alert Sent", "detail": errors}
+        return {"status": "Known Issues", "detail": errors + degraded}
+
+    if degraded:
+        return {"status": "Degraded", "detail": degraded}
 
     return {"status": "All Green", "detail": "異常なし"}
+
+async def run_health_check() -> Dict[str, Any]:
+    """Patrol this node's shard and merge in the other nodes' shard results."""
+    peers = {node: url for node, url in HEALTH_NODES.items() if node != HEALTH_NODE_ID}
+    if not peers:
+        return await run_health_patrol()
+    results = await asyncio.gather(
+        run_health_patrol(), *(fetch_shard(node, url, HEALTH_SHARD_TIMEOUT) for node, url in peers.items())
+    )
+    return merge_shards(dict(zip([HEALTH_NODE_ID, *peers], results)))
+
+def health_activity(result: Dict[str, Any]) -> JobResult:
+    """Scheduler outcome of a patrol: any failing or slow target counts as activity."""
+    return True, None if result["status"] == "All Green" else time.time()
+
+def build_scheduler() -> Scheduler:
+    new_scheduler = Scheduler()
+
+    async def quake_job() -> JobResult:
+        # The scheduler's own polls never reuse a result, so they add no alert latency
+        return quake_activity(await quake_check(max_age=0))
+
+    async def health_job() -> JobResult:
+        return health_activity(await run_health_patrol())
+
+    # With the stream enabled, quakes are pushed (and polled only while it is down)
+    if not QUAKE_STREAM_ENABLED:
+        new_scheduler.add_job("quake", quake_job, AdaptiveInterval(
+            QUAKE_POLL_MIN_INTERVAL, QUAKE_POLL_MAX_INTERVAL, SCHEDULER_BACKOFF_FACTOR,
+            SCHEDULER_JITTER, active_window=QUAKE_ACTIVE_WINDOW,
+        ))
+    new_scheduler.add_job("health", health_job, AdaptiveInterval(
+        HEALTH_POLL_MIN_INTERVAL, HEALTH_POLL_MAX_INTERVAL, SCHEDULER_BACKOFF_FACTOR,
+        SCHEDULER_JITTER, active_window=HEALTH_POLL_MIN_INTERVAL * 2,
+    ))
+    return new_scheduler
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global quake_stream, scheduler
+    # Runs in a thread so the server starts accepting requests right away
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up)) if WARM_UP_ON_STARTUP else None
+    get_notification_queue().start()
+    if QUAKE_STREAM_ENABLED:
+        quake_stream = QuakeStreamIngestor(
+            P2P_WS_URL, get_quake_service(), notify_stream_quake,
+            fallback_interval=QUAKE_STREAM_FALLBACK_INTERVAL,
+            backoff_max=QUAKE_STREAM_BACKOFF_MAX, poll=lambda: quake_check(max_age=0),
+        )
+        quake_stream.start()
+    if SCHEDULER_ENABLED:
+        scheduler = build_scheduler()
+        scheduler.start()
+
+    yield
+
+    if warm_up_task is not None:
+        await warm_up_task
+    if scheduler is not None:
+        await scheduler.stop()
+        scheduler = None
+    if quake_stream is not None:
+        await quake_stream.stop()
+        quake_stream = None
+    await get_notification_queue().stop()
+    await close_async_session()
+    close_session()
+
+app = FastAPI(lifespan=lifespan)
+
+startup_stats["import_seconds"] = time.perf_counter() - _import_started
+
+@app.get("/")
+def read_root() -> Dict[str, str]:
+    return {"status": "Meerkat Bot is running 🦦"}
+
+@app.get("/check_quake")
+async def check_earthquake() -> Dict[str, Any]:
+    result = await quake_check()
+    if scheduler is not None:
+        scheduler.report("quake", *quake_activity(result))
+    return result
+
+@app.get("/quake_cache_stats")
+def quake_cache_stats() -> Dict[str, Any]:
+    return get_quake_service().get_cache_stats()
+
+@app.get("/upstream_stats")
+def upstream_stats() -> Dict[str, Any]:
+    """Circuit breaker state and hedged request counts for the history API (and mirror)."""
+    return {**get_quake_service().fetcher.get_stats(), "check_quake": quake_check.get_stats()}
+
+@app.get("/quakes")
+def quakes(since: Optional[str] = None, until: Optional[str] = None, min_scale: Optional[int] = None,
+           min_magnitude: Optional[float] = None, region: Optional[str] = None,
+           limit: int = 100) -> Dict[str, Any]:
+    """Archived reports, newest first. since/until: 'YYYY/MM/DD[ HH:MM:SS]' (JST), ISO or epoch."""
+    archive = get_quake_archive()
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Quake archive is disabled")
+    try:
+        items = archive.query(since, until, min_scale, min_magnitude, region, limit=max(1, min(limit, 1000)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"count": len(items), "quakes": items}
+
+@app.get("/quake_stats")
+def quake_stats(since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+    """Counts per region, max scale and magnitude over the archive."""
+    archive = get_quake_archive()
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Quake archive is disabled")
+    try:
+        return archive.stats(since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stream_status")
+def stream_status() -> Dict[str, Any]:
+    if quake_stream is None:
+        return {"enabled": False}
+    return {"enabled": True, **quake_stream.get_status()}
+
+@app.get("/queue_stats")
+def queue_stats() -> Dict[str, Any]:
+    return get_notification_queue().get_stats()
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of the pipeline latency histograms and counters."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/scheduler_status")
+def scheduler_status() -> Dict[str, Any]:
+    """Current polling cadence of the in-process scheduler."""
+    if scheduler is None:
+        return {"running": False, "jobs": {}}
+    return scheduler.get_status()
+
+@app.get("/startup_stats")
+def startup_stats_endpoint() -> Dict[str, Any]:
+    return {**startup_stats, "services": sorted(_services)}
+
+@app.get("/check_health")
+async def check_website_health(scope: str = "all") -> Dict[str, Any]:
+    """scope=all merges every node's shard; scope=shard patrols this node's shard only."""
+    if scope not in ("all", "shard"):
+        raise HTTPException(status_code=400, detail="scope must be 'all' or 'shard'")
+    result = await (run_health_check() if scope == "all" else run_health_patrol())
+    if scheduler is not None:
+        scheduler.report("health", *health_activity(result))
+    return result
+
+@app.get("/health_history")
+def health_history() -> Dict[str, Any]:
+    """Availability and latency percentiles per target, from recent patrols."""
+    return get_health_service().history.summary()
@@ -0,0 +1,129 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import closing
+from typing import Callable, Dict, Optional, Tuple
+
+from .metrics import DEDUPE_FAILURES_TOTAL
+
+logger = logging.getLogger(__name__)
+
+def default_owner() -> str:
+    """Identifies this process in claims (host:pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class DedupeWrites:
+    """
+    Runs the writes that decide whether an alert goes out (the state CAS and
+    the claim). A failing store is retried a few times; if it is still
+    unavailable, `fail_open` decides: True sends the alert anyway (risking a
+    duplicate), False drops it (risking a missed alert). Either way the failure
+    is logged at error level and counted in meerkat_dedupe_failures_total.
+    """
+
+    def __init__(self, retries: int = 2, delay: float = 0.2, fail_open: bool = True):
+        self.retries = retries
+        self.delay = delay
+        self.fail_open = fail_open
+
+    def run(self, op: str, write: Callable[[], bool]) -> bool:
+        """write()'s answer, or the fail_open policy once every attempt has failed."""
+        for attempt in range(self.retries + 1):
+            try:
+                return write()
+            except Exception as e:
+                error = e
+                if attempt < self.retries:
+                    logger.warning(f"Dedupe {op} failed (attempt {attempt + 1}), retrying: {e}")
+                    time.sleep(self.delay * (attempt + 1))
+        DEDUPE_FAILURES_TOTAL.inc(op=op)
+        logger.error(
+            f"Dedupe {op} failed after {self.retries + 1} attempts, "
+            f"{'notifying anyway' if self.fail_open else 'dropping the notification'}: {error}"
+        )
+        return self.fail_open
+
+class ClaimStore:
+    """
+    Idempotency keys shared by every instance of the bot.
+    The first caller to claim a key owns it; everyone else is told it is taken,
+    so an event is acted on at most once however many nodes see it.
+    """
+
+    def claim(self, key: str, owner: str) -> bool:
+        """Claim key for owner. Returns False if it was already claimed (by anyone)."""
+        raise NotImplementedError
+
+    def owner_of(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+class InMemoryClaimStore(ClaimStore):
+    """Process-local claims, for tests and single-instance setups."""
+
+    def __init__(self, retention: float = 7 * 86400):
+        self.retention = retention
+        self._claims: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, owner: str) -> bool:
+        now = time.time()
+        with self._lock:
+            current = self._claims.get(key)
+            if current is not None and now - current[1] < self.retention:
+                return False
+            self._claims[key] = (owner, now)
+            return True
+
+    def owner_of(self, key: str) -> Optional[str]:
+        current = self._claims.get(key)
+        return current[0] if current else None
+
+class SqliteClaimStore(ClaimStore):
+    """
+    Claims in an SQLite database, e.g. on a volume shared by all instances.
+    A claim is a single INSERT on the primary key, so SQLite's own locking
+    decides the winner. The rollback journal is used rather than WAL because
+    WAL does not work on network file systems.
+    Claims older than `retention` seconds are pruned.
+    """
+
+    def __init__(self, path: str, retention: float = 7 * 86400, busy_timeout: float = 10):
+        self.path = path
+        self.retention = retention
+        self.busy_timeout = busy_timeout
+        self._schema_ready = False
+        self._last_prune = 0.0
+
+    def claim(self, key: str, owner: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            if now - self._last_prune > 3600:
+                conn.execute("DELETE FROM claims WHERE claimed_at < ?", (now - self.retention,))
+                self._last_prune = now
+            cursor = conn.execute(
+                "INSERT INTO claims (key, owner, claimed_at) VALUES (?, ?, ?) ON CONFLICT(key) DO NOTHING",
+                (key, owner, now),
+            )
+            return cursor.rowcount == 1
+
+    def owner_of(self, key: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT owner FROM claims WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _connect(self):
+        import sqlite3
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit: every statement is its own transaction
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        if not self._schema_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS claims ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, claimed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS claims_claimed_at ON claims (claimed_at)")
+            self._schema_ready = True
+        return conn
@@ -0,0 +1,183 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from .coordination import ClaimStore, DedupeWrites
+from .quake_parser import parse_jst
+from .state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+JST = timezone(timedelta(hours=9))
+
+TSUNAMI_GRADES = {
+    "MajorWarning": "大津波警報",
+    "Warning": "津波警報",
+    "Watch": "津波注意報",
+    "Unknown": "津波情報 (種類不明)",
+}
+
+class FeedHandler:
+    """
+    Turns one kind of P2P Quake history item (by its code) into notifications.
+    Each handler decides what counts as "the same notification" (dedupe_key),
+    remembers the keys it has sent in the shared state store, and renders its
+    own message.
+    """
+
+    code = 0
+    status = ""
+    # Items issued longer ago than this (seconds) are not worth an alert any more
+    max_age = 3600.0
+    # Number of sent keys remembered in the state store
+    remembered = 50
+
+    def __init__(self, state_store: StateStore, claims: Optional[ClaimStore] = None, owner: str = "",
+                 dedupe: Optional[DedupeWrites] = None):
+        self.state_store = state_store
+        self.claims = claims
+        self.owner = owner
+        self.dedupe = dedupe or DedupeWrites()
+        self.state_key = f"sent_{self.code}"
+
+    def handle(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        item_id = item.get("_id") or item.get("id")
+        issued = self.issued_at(item)
+        time_str = issued.strftime("%Y/%m/%d %H:%M:%S") if issued else None
+        if issued is not None and datetime.now(JST) - issued > timedelta(seconds=self.max_age):
+            return {"notify": False, "status": "Too old", "code": self.code, "time": time_str}
+
+        sent = self._load_sent()
+        key = self.dedupe_key(item, sent)
+        if key is None:
+            return {"notify": False, "status": "Ignored", "code": self.code, "time": time_str}
+        if key in sent:
+            return {"notify": False, "status": "Already notified", "code": self.code, "time": time_str}
+
+        message = self.render(item)
+        if not self._mark_sent(sent, key):
+            return {"notify": False, "status": "Already notified", "code": self.code, "time": time_str}
+
+        return {
+            "notify": True,
+            "message": message,
+            "status": self.status,
+            "code": self.code,
+            "time": time_str,
+            "id": item_id,
+        }
+
+    def dedupe_key(self, item: Dict[str, Any], sent: List[str]) -> Optional[str]:
+        """
+        Identity of the notification this item would send; None to ignore the item.
+        sent holds the keys already sent, oldest first.
+        """
+        raise NotImplementedError
+
+    def render(self, item: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    @staticmethod
+    def issued_at(item: Dict[str, Any]) -> Optional[datetime]:
+        value = (item.get("issue") or {}).get("time") or item.get("time")
+        if not value:
+            return None
+        try:
+            # Sub-second parts ("...:30.123") are not needed
+            return parse_jst(value[:19])
+        except ValueError:
+            return None
+
+    def _load_sent(self) -> List[str]:
+        try:
+            return list(self.state_store.get(self.state_key) or [])
+        except Exception as e:
+            logger.warning(f"Failed to load {self.state_key}: {e}")
+            return []
+
+    def _mark_sent(self, sent: List[str], key: str) -> bool:
+        """Record key as sent. Returns False if another worker or instance got there first."""
+        if not self.dedupe.run("save", lambda: self.state_store.compare_and_swap(
+            self.state_key, sent or None, (sent + [key])[-self.remembered:]
+        )):
+            return False
+        if self.claims is None:
+            return True
+        return self.dedupe.run("claim", lambda: self.claims.claim(f"{self.code}:{key}", self.owner))
+
+class TsunamiHandler(FeedHandler):
+    """
+    552: tsunami forecasts. A forecast is sent whenever its areas or grades change,
+    and a cancellation when something was forecast since the last one. A
+    cancellation ends the episode: later forecasts are sent even if their
+    content matches one sent before it.
+    """
+
+    code = 552
+    status = "Tsunami Forecast"
+    max_age = 6 * 3600.0
+
+    def dedupe_key(self, item: Dict[str, Any], sent: List[str]) -> Optional[str]:
+        issued = self.issued_at(item)
+        issued_str = issued.strftime("%Y/%m/%d %H:%M:%S") if issued else str(item.get("_id") or item.get("id"))
+        if item.get("cancelled"):
+            if sent and sent[-1].startswith("cancelled@"):
+                # Nothing was forecast since the last cancellation
+                return sent[-1]
+            return f"cancelled@{issued_str}"
+
+        content = "|".join(sorted(f"{a.get('grade')}:{a.get('name')}" for a in item.get("areas") or []))
+        # Stable across restarts, unlike hash()
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+        cancelled = [key.partition("@")[2] for key in sent if key.startswith("cancelled@")]
+        if not cancelled:
+            return digest
+        episode = max(cancelled)
+        if issued is not None and issued_str < episode:
+            # Issued before that cancellation (the feed is replayed every poll)
+            return f"cancelled@{episode}"
+        return f"{digest}@{episode}"
+
+    def render(self, item: Dict[str, Any]) -> str:
+        if item.get("cancelled"):
+            return "🌊 ミーアキャット津波情報 🌊\n\n津波予報はすべて解除されました"
+
+        by_grade: Dict[str, List[str]] = {}
+        for area in item.get("areas") or []:
+            by_grade.setdefault(area.get("grade", "Unknown"), []).append(area.get("name", ""))
+        lines = [
+            f"【{TSUNAMI_GRADES.get(grade, grade)}】{'、'.join(by_grade[grade])}"
+            for grade in (*TSUNAMI_GRADES, *(g for g in by_grade if g not in TSUNAMI_GRADES))
+            if grade in by_grade
+        ]
+        return "🌊 ミーアキャット津波情報 🌊\n\n" + ("\n".join(lines) or "津波予報の対象地域はありません")
+
+class EEWHandler(FeedHandler):
+    """556: earthquake early warnings (warning level). One alert per event, plus its cancellation."""
+
+    code = 556
+    status = "Early Warning"
+    max_age = 600.0
+
+    def dedupe_key(self, item: Dict[str, Any], sent: List[str]) -> Optional[str]:
+        if item.get("test"):
+            return None
+        issue = item.get("issue") or {}
+        event_id = issue.get("eventId") or item.get("_id") or item.get("id")
+        return f"{event_id}:{'cancelled' if item.get('cancelled') else 'warning'}"
+
+    def render(self, item: Dict[str, Any]) -> str:
+        if item.get("cancelled"):
+            return "🚨 緊急地震速報 🚨\n\n先ほどの緊急地震速報は取り消されました"
+
+        hypocenter = ((item.get("earthquake") or {}).get("hypocenter") or {}).get("name") or "調査中"
+        prefs = list(dict.fromkeys(a.get("pref") for a in item.get("areas") or [] if a.get("pref")))
+        return (
+            f"🚨 緊急地震速報 (警報) 🚨\n\n"
+            f"【震源地】{hypocenter}\n"
+            f"【強い揺れに警戒】{'、'.join(prefs) or '調査中'}\n\n"
+            f"落ち着いて身の安全を確保してください"
+        )
+
+FEED_HANDLERS = {handler.code: handler for handler in (TsunamiHandler, EEWHandler)}
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from .state_store import StateStore, InMemoryStateStore
+
+logger = logging.getLogger(__name__)
+
+UP = "UP"
+DEGRADED = "DEGRADED"
+DOWN = "DOWN"
+# Kind of the alert sent when a target starts flapping (not a state of its own)
+FLAPPING = "FLAPPING"
+
+# One letter per result in the flap window, and the value stored in the ring
+_CODES = {UP: "U", DEGRADED: "S", DOWN: "D"}
+_RING_VALUES = {UP: 1, DEGRADED: 2, DOWN: 0}
+
+# Result of one probe: (target name, state, message or None, latency in seconds)
+ProbeResult = Tuple[str, str, Optional[str], float]
+
+class HealthAlert(str):
+    """An alert message that also knows what it announces: DOWN, DEGRADED, UP (recovery) or FLAPPING."""
+
+    def __new__(cls, message: str, kind: str) -> "HealthAlert":
+        alert = super().__new__(cls, message)
+        alert.kind = kind
+        return alert
+
+class _Ring:
+    """
+    Fixed-size ring of (timestamp, latency ms, state) samples in typed arrays
+    (13 bytes per sample). state is 0 = down, 1 = up, 2 = degraded.
+    """
+
+    __slots__ = ("times", "latencies", "states", "next", "count")
+
+    def __init__(self, size: int):
+        self.times = array("d", bytes(8 * size))
+        self.latencies = array("f", bytes(4 * size))
+        self.states = array("b", bytes(size))
+        self.next = 0
+        self.count = 0
+
+    def append(self, at: float, latency_ms: float, state: int) -> None:
+        i = self.next
+        self.times[i] = at
+        self.latencies[i] = latency_ms
+        self.states[i] = state
+        self.next = (i + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def summary(self) -> Dict[str, Any]:
+        n = self.count
+        if not n:
+            return {"samples": 0, "availability": None, "degraded_ratio": None,
+                    "p50_ms": None, "p99_ms": None, "since": None}
+        # Samples are unordered once the ring wraps, which is fine for these aggregates
+        latencies = sorted(self.latencies[:n])
+        states = self.states[:n]
+        oldest = self.times[self.next] if n == len(self.times) else self.times[0]
+        return {
+            "samples": n,
+            # Slow responses still count as available
+            "availability": round((n - states.count(0)) / n, 4),
+            "degraded_ratio": round(states.count(2) / n, 4),
+            "p50_ms": round(latencies[max(0, round(0.50 * n) - 1)], 1),
+            "p99_ms": round(latencies[max(0, round(0.99 * n) - 1)], 1),
+            "since": oldest,
+        }
+
+class HealthHistory:
+    """
+    Per-target probe history and UP/DEGRADED/DOWN state machine.
+    A target changes state only after `alert_after` consecutive results agreeing
+    on the same new state, and each change produces one alert.
+    A target whose results flip at least `flap_threshold` times within the last
+    `flap_window` probes is flapping: one alert says so, and further alerts are
+    held back until it settles.
+
+    The state machine is kept in the state store so alerts stay correct across
+    restarts (written only when a sweep changed it); the latency samples are
+    kept in memory only.
+    """
+
+    def __init__(self, size: int = 1440, alert_after: int = 2, flap_window: int = 10,
+                 flap_threshold: int = 4, state_store: Optional[StateStore] = None):
+        self.size = max(1, size)
+        self.alert_after = max(1, alert_after)
+        self.flap_window = max(2, flap_window)
+        self.flap_threshold = max(2, flap_threshold)
+        self.state_store = state_store or InMemoryStateStore()
+        self._rings: Dict[str, _Ring] = {}
+        # Sweeps are recorded from worker threads; one at a time
+        self._lock = threading.Lock()
+
+    def record_sweep(self, results: List[ProbeResult], at: Optional[float] = None) -> List[HealthAlert]:
+        """
+        Record one patrol. Returns the alert messages to send (state changes and
+        flapping notices), in the order of the results.
+        """
+        at = time.time() if at is None else at
+        with self._lock:
+            return self._record(results, at)
+
+    def _record(self, results: List[ProbeResult], at: float) -> List[HealthAlert]:
+        states = dict(self._load_states())
+        alerts = []
+        changed = False
+
+        for name, observed, message, latency in results:
+            ring = self._rings.get(name)
+            if ring is None:
+                ring = self._rings[name] = _Ring(self.size)
+            ring.append(at, latency * 1000, _RING_VALUES[observed])
+
+            previous = states.get(name)
+            state = dict(previous or {"state": UP, "alerted": UP, "streak": 0, "recent": "", "since": at})
+            alert = self._advance(name, state, observed, message, at)
+            if state != previous:
+                states[name] = state
+                changed = True
+            if alert:
+                alerts.append(alert)
+
+        # A steady sweep leaves the stored state as it was, so it is not rewritten
+        if changed:
+            self._save_states(states)
+        return alerts
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Availability, latency percentiles and current state per target."""
+        states = self._load_states()
+        report = {}
+        for name, ring in self._rings.items():
+            state = states.get(name) or {}
+            report[name] = {
+                "state": state.get("state"),
+                "state_since": state.get("since"),
+                "flapping": state.get("flapping", False),
+                **ring.summary(),
+            }
+        return report
+
+    def _advance(self, name: str, state: Dict[str, Any], observed: str, message: Optional[str],
+                 at: float) -> Optional[HealthAlert]:
+        """Apply one result to a target's state. Returns an alert message, if any."""
+        state["recent"] = (state["recent"] + _CODES[observed])[-self.flap_window:]
+
+        # New targets start as UP, so a target that is already down alerts once confirmed.
+        # The streak counts results for one candidate state; a different one restarts it.
+        if observed == state["state"]:
+            state["streak"], state["candidate"] = 0, None
+        elif observed != state.get("candidate"):
+            state["streak"], state["candidate"] = 1, observed
+        else:
+            state["streak"] += 1
+        if state["streak"] >= self.alert_after:
+            state["downtime"] = at - state["since"] if state["state"] == DOWN else None
+            state["state"], state["streak"], state["candidate"], state["since"] = observed, 0, None, at
+
+        recent = state["recent"]
+        flips = sum(1 for a, b in zip(recent, recent[1:]) if a != b)
+        if not state.get("flapping") and flips >= self.flap_threshold:
+            state["flapping"] = True
+            logger.warning(f"🔁 {name}: Flapping ({flips} changes in {len(recent)} checks)")
+            return HealthAlert(f"🔁 {name}: Unstable ({flips} changes in {len(recent)} checks), alerts paused", FLAPPING)
+        if state.get("flapping"):
+            # Hysteresis: resume alerting only once the target has calmed down
+            if flips > self.flap_threshold // 2:
+                return None
+            state["flapping"] = False
+
+        if state["state"] == state["alerted"]:
+            return None
+        state["alerted"] = state["state"]
+        if state["state"] != UP:
+            # The latest failure or slow-response message of the confirmed state
+            return HealthAlert(message or f"❌ {name}: {state['state'].title()}", state["state"])
+        if (state.get("downtime") or 0) >= 60:
+            return HealthAlert(f"✅ {name}: Recovered (down {state['downtime'] / 60:.0f} min)", UP)
+        return HealthAlert(f"✅ {name}: Recovered", UP)
+
+    def _load_states(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return self.state_store.get("targets") or {}
+        except Exception as e:
+            logger.warning(f"Failed to load health state: {e}")
+            return {}
+
+    def _save_states(self, states: Dict[str, Dict[str, Any]]) -> None:
+        try:
+            self.state_store.set("targets", states)
+        except Exception as e:
+            logger.error(f"Failed to save health state: {e}")
@@ -1,34 +1,318 @@
-import requests
+import asyncio
 import logging
-from typing import Dict, List
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .health_history import HealthAlert, HealthHistory, ProbeResult, UP, DEGRADED, DOWN
+from .host_limits import HostLimits
+from .http_client import get_session, get_async_session, default_timeout, async_request
+from .metrics import HEALTH_PROBE_SECONDS
+from .watch_list import WatchList, WatchTarget, as_targets
+
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 
+PROBE_MODES = ("get", "head", "stream")
+
 class HealthService:
-    def check_health(self, watch_list: Dict[str, str]) -> List[str]:
+    def __init__(self, max_concurrency: int = 10, target_deadline: float = 30,
+                 session: Optional["requests.Session"] = None, history: Optional[HealthHistory] = None,
+                 probe_mode: str = "get", latency_slo: Optional[float] = None,
+                 latency_slos: Optional[Dict[str, float]] = None, host_limits: Optional[HostLimits] = None):
+        if probe_mode not in PROBE_MODES:
+            raise ValueError(f"Unknown probe mode: {probe_mode} (expected one of {PROBE_MODES})")
+        self._session = session
+        self.max_concurrency = max(1, max_concurrency)
+        self.target_deadline = target_deadline
+        # Optional: turns raw results into state-change alerts
+        self.history = history
+        # "get" downloads the page; "head" and "stream" only wait for the status line
+        self.probe_mode = probe_mode
+        # Seconds after which a target counts as degraded (per-target values win)
+        self.latency_slo = latency_slo or None
+        self.latency_slos = latency_slos or {}
+        # Optional: per-host concurrency cap and rate limit for targets sharing a host
+        self.host_limits = host_limits
+        # For targets with their own interval: when each was last probed, and its last result
+        self._last_probed: Dict[str, float] = {}
+        self._last_results: Dict[str, ProbeResult] = {}
+
+    @property
+    def session(self) -> "requests.Session":
+        """Session for the blocking API; the shared one is only built when first needed."""
+        return self._session or get_session()
+
+    def check_health(self, watch_list: WatchList) -> List[str]:
         """
         Check health of URLs in the watch list.
+        Targets are probed concurrently (up to max_concurrency at a time) and
+        each probe is given target_deadline seconds from the moment it starts.
+        Returns:
+             List of error messages in watch list order. Empty list if all OK.
+        """
+        return self.patrol(watch_list)["errors"]
+
+    def patrol(self, watch_list: WatchList) -> Dict[str, List[str]]:
+        """
+        Run check_health and record the results.
+        watch_list is a {name: url} dict or a list of WatchTarget; targets with
+        an interval are skipped until it has passed, keeping their last result.
         Returns:
-             List of error messages. Empty list if all OK.
+            dict with 'errors' (current failures), 'degraded' (slower than the
+            latency SLO) and 'alerts' (messages to send).
+            Without a history every error is an alert.
+        The per-patrol DNS refresh (_forget_dns) is async-only: here each new
+        connection is resolved by the system resolver, and kept-alive pooled
+        connections are reused without a lookup.
         """
-        error_report = []
+        targets = as_targets(watch_list)
+        logger.info("🦦 Starting website health patrol...")
+        due = self._due(targets)
+        if not due:
+            return self._report(targets, [])
+
+        started_at: Dict[str, float] = {}
+        latencies: Dict[str, float] = {}
+        outcomes: Dict[str, Tuple[str, Optional[str]]] = {}
+
+        # Host limits are applied here, before submitting: a probe only reaches the
+        # pool once its host has a free slot and a token, so no worker sits waiting
+        # on a busy host while other hosts' targets queue behind it
+        queues: Dict[str, deque] = {}
+        for target in due:
+            queues.setdefault(target.host, deque()).append(target)
+        per_host = self.host_limits.per_host if self.host_limits else len(due)
+        running = {host: 0 for host in queues}
+        ready_at: Dict[str, float] = {}
+        futures = {}
+        pending = set()
+        # Probes given up on still hold their host's slot until they return
+        abandoned = set()
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(due)),
+            thread_name_prefix="health-probe",
+        )
+
+        def submit_ready() -> Optional[float]:
+            """Submit every target that may start now. Returns seconds until the next token, if waiting for one."""
+            now = time.monotonic()
+            next_token = None
+            for host, queue in queues.items():
+                while queue and running[host] < per_host:
+                    if host not in ready_at:
+                        ready_at[host] = now + (self.host_limits.reserve(host) if self.host_limits else 0)
+                    if ready_at[host] > now:
+                        next_token = min(next_token or ready_at[host], ready_at[host])
+                        break
+                    del ready_at[host]
+                    target = queue.popleft()
+                    running[host] += 1
+                    future = executor.submit(self._probe, target, started_at, latencies)
+                    futures[future] = target
+                    pending.add(future)
+            return None if next_token is None else next_token - now
+
+        try:
+            token_wait = submit_ready()
+            while pending or token_wait is not None or (abandoned and any(queues.values())):
+                if not pending and not abandoned:
+                    # Only waiting for a host's next token (this thread, not a pool worker)
+                    time.sleep(token_wait)
+                    token_wait = submit_ready()
+                    continue
+                timeout = self._next_expiry(futures, pending, started_at)
+                if token_wait is not None:
+                    timeout = min(timeout, token_wait)
+                done, _ = wait(pending | abandoned, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = futures[future]
+                    if future in pending:
+                        outcomes[target.name] = future.result()
+                        pending.discard(future)
+                    else:
+                        abandoned.discard(future)
+                    running[target.host] -= 1
+
+                # Give up on probes that have run past their own deadline
+                now = time.monotonic()
+                for future in list(pending):
+                    target = futures[future]
+                    start = started_at.get(target.name)
+                    deadline = self._deadline(target)
+                    if start is not None and now - start >= deadline:
+                        logger.warning(f"⏱️ {target.name}: Deadline exceeded ({deadline}s)")
+                        outcomes[target.name] = (DOWN, f"❌ {target.name}: Access failed")
+                        pending.discard(future)
+                        # Its host slot is freed once the request returns (bounded by its timeout)
+                        abandoned.add(future)
+
+                token_wait = submit_ready()
+        finally:
+            # Do not wait for hung probes; they are bounded by the request timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self._report(targets, [
+            (target.name, *outcomes[target.name], latencies.get(target.name, self._deadline(target)))
+            for target in due
+        ])
+
+    async def check_health_async(self, watch_list: WatchList) -> List[str]:
+        """Non-blocking version of check_health with the same limits and report order."""
+        return (await self.patrol_async(watch_list))["errors"]
+
+    async def patrol_async(self, watch_list: WatchList) -> Dict[str, List[str]]:
+        """Non-blocking version of patrol."""
+        targets = as_targets(watch_list)
         logger.info("🦦 Starting website health patrol...")
+        due = self._due(targets)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        host_slots = {
+            target.host: asyncio.Semaphore(self.host_limits.per_host) for target in due
+        } if self.host_limits else {}
+        self._forget_dns([target.url for target in due])
+
+        async def probe(target: WatchTarget) -> ProbeResult:
+            # Host slot first, so targets waiting for a busy host do not hold global slots
+            async with host_slots.get(target.host) or nullcontext():
+                delay = self.host_limits.reserve(target.host) if self.host_limits else 0
+                if delay:
+                    await asyncio.sleep(delay)
+                async with semaphore:
+                    # The deadline starts once the probe holds a concurrency slot
+                    deadline = self._deadline(target)
+                    start = time.perf_counter()
+                    try:
+                        status_code = await asyncio.wait_for(self._request_status_async(target.url, deadline), deadline)
+                        latency = time.perf_counter() - start
+                        state, message = self._classify(target.name, status_code, latency, target.expected_status)
+                    except Exception as e:
+                        latency = time.perf_counter() - start
+                        state, message = DOWN, f"❌ {target.name}: Access failed"
+                    HEALTH_PROBE_SECONDS.observe(latency, target=target.name, host=target.host)
+                    return target.name, state, message, latency
 
-        for name, url in watch_list.items():
-            if not url:
+        results = list(await asyncio.gather(*(probe(target) for target in due)))
+        # Recording may write the state file (lock, fsync, rename); keep it off the event loop
+        return await asyncio.to_thread(self._report, targets, results)
+
+    def _due(self, targets: List[WatchTarget]) -> List[WatchTarget]:
+        """Targets to probe in this patrol (those whose interval has passed), marked as probed."""
+        now = time.monotonic()
+        due = []
+        for target in targets:
+            last = self._last_probed.get(target.name)
+            if target.interval and last is not None and now - last < target.interval:
                 continue
+            if target.interval:
+                self._last_probed[target.name] = now
+            due.append(target)
+        return due
+
+    def _deadline(self, target: WatchTarget) -> float:
+        return target.timeout or self.target_deadline
+
+    def _report(self, targets: List[WatchTarget], results: List[ProbeResult]) -> Dict[str, List[str]]:
+        """Errors and degraded targets in watch list order; skipped targets report their last result."""
+        fresh = {result[0]: result for result in results}
+        for target in targets:
+            if target.interval and target.name in fresh:
+                self._last_results[target.name] = fresh[target.name]
+        current = [
+            fresh.get(target.name) or self._last_results.get(target.name) for target in targets
+        ]
+        errors = [result[2] for result in current if result and result[1] == DOWN]
+        degraded = [result[2] for result in current if result and result[1] == DEGRADED]
+        if self.history is None:
+            alerts = [HealthAlert(r[2], DOWN) for r in results if r[1] == DOWN]
+            return {"errors": errors, "degraded": degraded, "alerts": alerts}
+        return {"errors": errors, "degraded": degraded, "alerts": self.history.record_sweep(results)}
+
+    def _classify(self, name: str, status_code: int, latency: float,
+                  expected_status: Tuple[int, ...] = (200,)) -> Tuple[str, Optional[str]]:
+        """(state, message) for a probe that got a response."""
+        if status_code not in expected_status:
+            return DOWN, f"⚠️ {name}: Abnormal response (Code: {status_code})"
+
+        slo = self.latency_slos.get(name, self.latency_slo)
+        if slo and latency > slo:
+            logger.warning(f"🐢 {name}: Slow ({latency:.2f}s)")
+            return DEGRADED, f"🐢 {name}: Slow response ({latency:.1f}s > {slo:g}s)"
+
+        logger.info(f"✅ {name}: OK")
+        return UP, None
+
+    def _request_status(self, url: str, deadline: float) -> int:
+        timeout = default_timeout(deadline)
+        if self.probe_mode == "head":
+            response = self.session.head(url, timeout=timeout, allow_redirects=True)
+            if response.status_code < 400:
+                return response.status_code
+            # Some servers reject HEAD (405/501) or answer it differently; confirm with a GET
+        if self.probe_mode == "get":
+            return self.session.get(url, timeout=timeout).status_code
+        with self.session.get(url, timeout=timeout, stream=True) as response:
+            # Leaving the block closes the connection without reading the body
+            return response.status_code
+
+    async def _request_status_async(self, url: str, deadline: float) -> int:
+        if self.probe_mode == "head":
+            response = await async_request("HEAD", url, timeout=deadline)
+            if response.status_code < 400:
+                return response.status_code
+        response = await async_request(
+            "GET", url, timeout=deadline, read_body=self.probe_mode == "get"
+        )
+        return response.status_code
+
+    def _forget_dns(self, urls: List[str]) -> None:
+        """
+        Drop cached DNS answers for the targets, so every host is resolved once
+        per patrol (concurrent lookups of the same host share one query).
+        patrol_async only: it clears aiohttp's resolver cache.
+        """
+        connector = get_async_session().connector
+        for host_port in {self._host_port(url) for url in urls}:
+            if host_port[0]:
+                connector.clear_dns_cache(*host_port)
+
+    @staticmethod
+    def _host_port(url: str) -> Tuple[Optional[str], int]:
+        parts = urlsplit(url)
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        return parts.hostname, port or (443 if parts.scheme == "https" else 80)
 
-            try:
-                # Timeout after 30 seconds
-                response = requests.get(url, timeout=30)
+    def _next_expiry(self, futures, pending, started_at: Dict[str, float]) -> float:
+        """Seconds until the earliest running probe hits its deadline."""
+        now = time.monotonic()
+        remaining = [
+            started_at[futures[f].name] + self._deadline(futures[f]) - now
+            for f in pending if futures[f].name in started_at
+        ]
+        return max(0.0, min(remaining)) if remaining else self.target_deadline
 
-                if response.status_code != 200:
-                    error_report.append(f"⚠️ {name}: Abnormal response (Code: {response.status_code})")
-                else:
-                    logger.info(f"✅ {name}: OK")
+    def _probe(self, target: WatchTarget, started_at: Dict[str, float],
+               latencies: Dict[str, float]) -> Tuple[str, Optional[str]]:
+        """Probe a single target. Returns (state, message); message is None if OK."""
+        name = target.name
+        started_at[name] = start = time.monotonic()
+        try:
+            status_code = self._request_status(target.url, self._deadline(target))
+            latencies[name] = time.monotonic() - start
+            return self._classify(name, status_code, latencies[name], target.expected_status)
 
-            except Exception as e:
-                # We simplify the error message to avoid leaking too much info
-                error_report.append(f"❌ {name}: Access failed")
+        except Exception as e:
+            latencies[name] = time.monotonic() - start
+            # We simplify the error message to avoid leaking too much info
+            return DOWN, f"❌ {name}: Access failed"
 
-        return error_report
+        finally:
+            HEALTH_PROBE_SECONDS.observe(latencies[name], target=name, host=target.host)
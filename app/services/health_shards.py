@@ -0,0 +1,40 @@
+import logging
+from typing import Any, Dict
+
+from .http_client import async_get
+
+logger = logging.getLogger(__name__)
+
+# Patrol statuses from best to worst; the merged result takes the worst one
+HEALTH_STATUSES = ["All Green", "Degraded", "Known Issues", "Alert Sent"]
+
+async def fetch_shard(node: str, base_url: str, timeout: float) -> Dict[str, Any]:
+    """Patrol result of another node's shard (its /check_health?scope=shard)."""
+    try:
+        response = await async_get(f"{base_url}/check_health?scope=shard", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        logger.warning(f"⚠️ Health shard {node} unreachable: {e}")
+        return {"status": "Known Issues", "detail": [f"❌ shard {node}: Unreachable"]}
+
+def merge_shards(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    One patrol result for the whole watch list. Each node has already queued
+    the alerts for its own shard; they are listed here for reference only.
+    """
+    detail, alerts = [], []
+    for result in results.values():
+        if isinstance(result.get("detail"), list):
+            detail += result["detail"]
+        alerts += result.get("alerts", [])
+
+    status = max(
+        (result.get("status") for result in results.values()),
+        key=lambda s: HEALTH_STATUSES.index(s) if s in HEALTH_STATUSES else HEALTH_STATUSES.index("Known Issues"),
+    )
+    merged: Dict[str, Any] = {"status": status, "detail": detail or "異常なし"}
+    if alerts:
+        merged["alerts"] = alerts
+    merged["shards"] = {node: result.get("status") for node, result in results.items()}
+    return merged
@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import Dict
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, with bursts of up to `burst`.
+    Callers reserve a token and then wait the returned delay themselves, so the
+    same bucket works for threads and coroutines.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token. Returns the seconds to wait before using it (0 if available now)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance queues the caller behind earlier reservations
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class HostLimits:
+    """
+    Politeness limits for targets sharing a host: at most `per_host` probes in
+    flight at once (enforced by the patrol) and `rate` probes per second
+    (0 = unlimited, with bursts of `burst`).
+    """
+
+    def __init__(self, per_host: int = 2, rate: float = 0, burst: float = 1):
+        self.per_host = max(1, per_host)
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str) -> float:
+        """Seconds to wait before the next probe of host may start."""
+        if self.rate <= 0:
+            return 0.0
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(host, TokenBucket(self.rate, self.burst))
+        return bucket.reserve()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from ..config import (
+    HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_HOST_POOL_SIZES,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_RETRY_TOTAL, HTTP_RETRY_BACKOFF,
+)
+
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
+
+# requests, aiohttp and linebot are imported on first use: together they are
+# a large part of the import time, and a cold start should not wait for them.
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "MeerkatBot/1.0"
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+_async_session: Optional["aiohttp.ClientSession"] = None
+_async_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+RETRY_STATUSES = (502, 503, 504)
+
+def build_session(
+    pool_connections: int = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    host_pool_sizes: Optional[Dict[str, int]] = None,
+    retry_total: int = HTTP_RETRY_TOTAL,
+    retry_backoff: float = HTTP_RETRY_BACKOFF,
+) -> "requests.Session":
+    """
+    Build a keep-alive session with connection pooling and retries.
+    Only idempotent methods are retried, so a LINE push is never sent twice.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    def make_adapter(maxsize: int) -> HTTPAdapter:
+        retry = Retry(
+            total=retry_total,
+            backoff_factor=retry_backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,  # Callers still want to see the final status code
+        )
+        return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=maxsize, max_retries=retry)
+
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.mount("http://", make_adapter(pool_maxsize))
+    session.mount("https://", make_adapter(pool_maxsize))
+
+    # Longer prefixes win, so a host entry overrides the scheme default
+    for host, size in (host_pool_sizes or {}).items():
+        session.mount(f"https://{host}", make_adapter(size))
+        session.mount(f"http://{host}", make_adapter(size))
+
+    return session
+
+def get_session() -> "requests.Session":
+    """Return the process-wide session shared by all services."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session(host_pool_sizes=HTTP_HOST_POOL_SIZES)
+    return _session
+
+def close_session() -> None:
+    """Close the shared session (e.g. on shutdown)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def default_timeout(read_timeout: Optional[float] = None) -> Tuple[float, float]:
+    """(connect, read) timeout tuple for requests."""
+    return (HTTP_CONNECT_TIMEOUT, read_timeout if read_timeout is not None else HTTP_READ_TIMEOUT)
+
+class AsyncResponse:
+    """Fully read aiohttp response with the parts of the requests API we use."""
+
+    def __init__(self, status_code: int, headers, content: bytes, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+def get_async_session() -> "aiohttp.ClientSession":
+    """
+    Return the shared aiohttp session for the running event loop.
+    aiohttp sessions are bound to a loop, so a new loop gets a new session.
+    """
+    import aiohttp
+
+    global _async_session, _async_session_loop
+    loop = asyncio.get_running_loop()
+    if _async_session is None or _async_session.closed or _async_session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE,
+            limit_per_host=HTTP_POOL_MAXSIZE,
+            ttl_dns_cache=300,
+        )
+        _async_session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": USER_AGENT},
+            timeout=aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT),
+        )
+        _async_session_loop = loop
+    return _async_session
+
+async def close_async_session() -> None:
+    """Close the shared aiohttp session (e.g. on shutdown)."""
+    global _async_session, _async_session_loop
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+    _async_session = None
+    _async_session_loop = None
+
+class _RetryableStatus(Exception):
+    pass
+
+async def async_get(url: str, headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> AsyncResponse:
+    """
+    Non-blocking GET through the shared session, with the same retry policy
+    as the sync session (connection errors and 502/503/504).
+    timeout is the total time allowed per attempt.
+    """
+    return await async_request("GET", url, headers=headers, timeout=timeout)
+
+async def async_request(method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                        timeout: Optional[float] = None, read_body: bool = True) -> AsyncResponse:
+    """
+    async_get for any method. With read_body=False the response is closed as
+    soon as the headers arrive and content is empty.
+    """
+    import aiohttp
+
+    session = get_async_session()
+    client_timeout = aiohttp.ClientTimeout(
+        total=timeout, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=timeout or HTTP_READ_TIMEOUT
+    )
+
+    for attempt in range(HTTP_RETRY_TOTAL + 1):
+        last_attempt = attempt == HTTP_RETRY_TOTAL
+        try:
+            async with session.request(method, url, headers=headers, timeout=client_timeout) as response:
+                if response.status in RETRY_STATUSES and not last_attempt:
+                    raise _RetryableStatus(response.status)
+                content = await response.read() if read_body else b""
+                return AsyncResponse(response.status, response.headers, content, url)
+        except (aiohttp.ClientConnectionError, _RetryableStatus) as e:
+            if last_attempt:
+                raise
+            logger.debug(f"Retrying {url} after {e!r}")
+            await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
+
+def _pooled_line_http_client_class():
+    """Define PooledLineHttpClient (imports the LINE SDK)."""
+    from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
+
+    class PooledLineHttpClient(RequestsHttpClient):
+        """LINE SDK HttpClient that sends requests through the shared session."""
+
+        def get(self, url, headers=None, params=None, stream=False, timeout=None):
+            response = get_session().get(
+                url, headers=headers, params=params, stream=stream, timeout=timeout or self.timeout
+            )
+            return RequestsHttpResponse(response)
+
+        def post(self, url, headers=None, data=None, timeout=None):
+            response = get_session().post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+        def delete(self, url, headers=None, data=None, timeout=None):
+            response = get_session().delete(url, headers=headers, data=data, timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+        def put(self, url, headers=None, data=None, timeout=None):
+            response = get_session().put(url, headers=headers, data=data, timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+    return PooledLineHttpClient
+
+def __getattr__(name: str) -> Any:
+    # PooledLineHttpClient subclasses an SDK class, so it is only built when first imported
+    if name == "PooledLineHttpClient":
+        cls = globals()["PooledLineHttpClient"] = _pooled_line_http_client_class()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,55 @@
+import asyncio
 import logging
-from linebot import LineBotApi
-from linebot.models import TextSendMessage
+import time
+from typing import Any, Dict, List, Optional
+from ..config import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, LINE_API_ENDPOINT
+from .http_client import default_timeout, get_async_session
+from .metrics import LINE_PUSH_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# LINE multicast accepts at most 500 user IDs per call
+MULTICAST_MAX_RECIPIENTS = 500
+
+class DeliveryError(Exception):
+    """Some fan-out batches failed. Carries the recipients that still need the message."""
+
+    def __init__(self, failed_recipients: List[str], batch_results: List[Dict[str, Any]],
+                 status_code: Optional[int] = None, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"{len(failed_recipients)} recipients not delivered")
+        self.failed_recipients = failed_recipients
+        self.batch_results = batch_results
+        self.status_code = status_code
+        self.headers = headers
+
 class LineNotifier:
-    def __init__(self, access_token: str, target_user_id: str):
+    def __init__(self, access_token: str, target_user_id: str, endpoint: str = LINE_API_ENDPOINT,
+                 multicast_concurrency: int = 4):
         if not access_token:
             logger.warning("LINE_CHANNEL_ACCESS_TOKEN is not set.")
         if not target_user_id:
             logger.warning("TARGET_USER_ID is not set.")
 
-        self.line_bot_api = LineBotApi(access_token) if access_token else None
+        self.access_token = access_token
+        self.endpoint = endpoint
         self.target_user_id = target_user_id
+        self.multicast_concurrency = max(1, multicast_concurrency)
+        # SDK clients are created on first send, so constructing a notifier stays cheap
+        self._line_bot_api = None
+        self._async_api = None
+        self._async_api_session = None
+
+    @property
+    def line_bot_api(self):
+        """Blocking SDK client, or None without an access token."""
+        if self._line_bot_api is None and self.access_token:
+            from linebot import LineBotApi
+            from .http_client import PooledLineHttpClient
+
+            self._line_bot_api = LineBotApi(
+                self.access_token, endpoint=self.endpoint, timeout=default_timeout(), http_client=PooledLineHttpClient
+            )
+        return self._line_bot_api
 
     def send_message(self, text: str):
         """Send a text message to the target user/group."""
@@ -20,10 +57,111 @@ class LineNotifier:
             logger.error("Cannot send message: Missing token or target ID.")
             return False
 
+        from linebot.models import TextSendMessage
+
+        start = time.perf_counter()
         try:
             self.line_bot_api.push_message(self.target_user_id, TextSendMessage(text=text))
+            LINE_PUSH_SECONDS.observe(time.perf_counter() - start, kind="push", outcome="ok")
+            logger.info(f"Notification sent to {self.target_user_id}")
+            return True
+        except Exception as e:
+            LINE_PUSH_SECONDS.observe(time.perf_counter() - start, kind="push", outcome="error")
+            logger.error(f"Failed to send LINE message: {e}")
+            raise e
+
+    async def send_message_async(self, text: str):
+        """Non-blocking version of send_message."""
+        if not self.access_token or not self.target_user_id:
+            logger.error("Cannot send message: Missing token or target ID.")
+            return False
+
+        from linebot.models import TextSendMessage
+
+        start = time.perf_counter()
+        try:
+            await self._get_async_api().push_message(self.target_user_id, TextSendMessage(text=text))
+            LINE_PUSH_SECONDS.observe(time.perf_counter() - start, kind="push", outcome="ok")
             logger.info(f"Notification sent to {self.target_user_id}")
             return True
         except Exception as e:
+            LINE_PUSH_SECONDS.observe(time.perf_counter() - start, kind="push", outcome="error")
             logger.error(f"Failed to send LINE message: {e}")
             raise e
+
+    async def fan_out_async(self, text: str, recipient_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Send one message to many recipients.
+        User IDs are grouped into multicast calls of up to 500 IDs, sent concurrently.
+        Group and room IDs cannot be multicast, so each gets its own push.
+        Returns:
+            One result dict per batch, or False if not configured.
+            Raises DeliveryError if any batch failed.
+        """
+        if not self.access_token or not recipient_ids:
+            logger.error("Cannot send message: Missing token or recipients.")
+            return False
+
+        users = [r for r in recipient_ids if r.startswith("U")]
+        batches = [users[i:i + MULTICAST_MAX_RECIPIENTS] for i in range(0, len(users), MULTICAST_MAX_RECIPIENTS)]
+        batches += [[r] for r in recipient_ids if not r.startswith("U")]
+
+        from linebot.models import TextSendMessage
+
+        api = self._get_async_api()
+        message = TextSendMessage(text=text)
+        semaphore = asyncio.Semaphore(self.multicast_concurrency)
+
+        async def send_batch(index: int, batch: List[str]) -> Dict[str, Any]:
+            async with semaphore:
+                kind = "push" if len(batch) == 1 else "multicast"
+                start = time.perf_counter()
+                try:
+                    if len(batch) == 1:
+                        await api.push_message(batch[0], message)
+                    else:
+                        await api.multicast(batch, message)
+                    LINE_PUSH_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="ok")
+                    return {"batch": index, "recipients": batch, "ok": True}
+                except Exception as e:
+                    LINE_PUSH_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome="error")
+                    return {
+                        "batch": index, "recipients": batch, "ok": False, "error": str(e),
+                        "status_code": getattr(e, "status_code", None),
+                        "headers": getattr(e, "headers", None),
+                    }
+
+        results = await asyncio.gather(*(send_batch(i, b) for i, b in enumerate(batches)))
+
+        delivered = sum(len(r["recipients"]) for r in results if r["ok"])
+        logger.info(f"Fan-out delivered to {delivered}/{len(recipient_ids)} recipients in {len(batches)} batches")
+
+        failed = [r for r in results if not r["ok"]]
+        if failed:
+            # Report the most retryable failure: a rate limit (for Retry-After), then
+            # a server/network error, and only then a permanent 4xx rejection
+            first = (
+                next((r for r in failed if r["status_code"] == 429), None)
+                or next((r for r in failed if r["status_code"] is None or r["status_code"] >= 500), None)
+                or failed[0]
+            )
+            raise DeliveryError(
+                [rid for r in failed for rid in r["recipients"]], results,
+                status_code=first["status_code"], headers=first["headers"],
+            )
+        return results
+
+    def _get_async_api(self):
+        """AsyncLineBotApi bound to the shared aiohttp session of the running loop."""
+        session = get_async_session()
+        if self._async_api is None or self._async_api_session is not session:
+            import aiohttp
+            from linebot import AsyncLineBotApi
+            from linebot.aiohttp_async_http_client import AiohttpAsyncHttpClient
+
+            timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+            self._async_api = AsyncLineBotApi(
+                self.access_token, AiohttpAsyncHttpClient(session, timeout=timeout), endpoint=self.endpoint
+            )
+            self._async_api_session = session
+        return self._async_api
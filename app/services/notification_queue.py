@@ -0,0 +1,328 @@
+import asyncio
+import glob
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Awaitable, Callable, Dict, List, Optional
+
+from .coordination import ClaimStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process, one spool file
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lower value is delivered first
+PRIORITY_QUAKE = 0
+PRIORITY_HEALTH = 10
+
+class NotificationQueue:
+    """
+    In-process dispatch queue for LINE notifications.
+    Endpoints enqueue and return immediately; a background worker delivers
+    messages in priority order, retrying with exponential backoff (or the
+    server's Retry-After on 429). Pending jobs are kept in an append-only
+    spool file so they survive a restart.
+
+    Each process (e.g. uvicorn worker) writes its own spool file next to
+    spool_file and holds an flock on it while running. On startup, spools
+    whose lock is free belong to processes that are gone: their pending jobs
+    are adopted by exactly one process (and claimed in `claims`, if given,
+    for spool directories shared between hosts where flock is unreliable).
+
+    send is called as send(text, recipients). If it raises an error carrying
+    failed_recipients, only those recipients are retried.
+    """
+
+    def __init__(self, send: Callable[[str, Optional[List[str]]], Awaitable[Any]], spool_file: str = "data/notification_spool.jsonl",
+                 max_attempts: int = 8, backoff_initial: float = 1, backoff_max: float = 300,
+                 claims: Optional[ClaimStore] = None, owner: str = ""):
+        self.send = send
+        self.spool_file = spool_file
+        self.claims = claims
+        self.owner = owner
+        self.max_attempts = max_attempts
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self._ready: List = []     # heap of (priority, seq, job)
+        self._delayed: List = []   # heap of (not_before, seq, job)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[Dict[str, Any]] = None
+
+        self.delivered = 0
+        self.dropped = 0
+        self.retries = 0
+        self.last_delivery_lag: Optional[float] = None
+        self.last_batches: List[Dict[str, Any]] = []
+
+        # fsync is slow; one writer thread keeps the records in order off the event loop
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notification-spool")
+        self._spool: Optional[IO[str]] = None
+        self._restore_spool()
+
+    def enqueue(self, text: str, priority: int = PRIORITY_HEALTH, recipients: Optional[List[str]] = None) -> str:
+        job = {
+            "id": uuid.uuid4().hex,
+            "text": text,
+            "recipients": recipients,
+            "priority": priority,
+            "enqueued_at": time.time(),
+            "attempts": 0,
+        }
+        self._append_spool({"op": "add", "job": job})
+        heapq.heappush(self._ready, (priority, next(self._seq), job))
+        self._wakeup.set()
+        return job["id"]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="notification-queue")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Flush pending spool writes, then release the spool for the next process
+        await asyncio.wrap_future(self._writer.submit(self._close_spool))
+
+    async def drain(self, timeout: float = 10) -> bool:
+        """Wait until every queued job has been handled. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._ready or self._delayed or self._current is not None:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        pending = [job for _, _, job in self._ready + self._delayed]
+        oldest = min((job["enqueued_at"] for job in pending), default=None)
+        return {
+            "depth": len(pending),
+            "delayed": len(self._delayed),
+            "oldest_pending_age": now - oldest if oldest is not None else 0.0,
+            "last_delivery_lag": self.last_delivery_lag,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "last_batches": self.last_batches,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            self._promote_due()
+            if not self._ready:
+                self._wakeup.clear()
+                timeout = self._delayed[0][0] - time.monotonic() if self._delayed else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._ready)
+            self._current = job
+            try:
+                await self._deliver(job)
+            finally:
+                self._current = None
+
+    def _promote_due(self) -> None:
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, job = heapq.heappop(self._delayed)
+            heapq.heappush(self._ready, (job["priority"], seq, job))
+
+    async def _deliver(self, job: Dict[str, Any]) -> None:
+        job["attempts"] += 1
+        try:
+            sent = await self.send(job["text"], job.get("recipients"))
+        except Exception as e:
+            self._record_batches(getattr(e, "batch_results", None))
+            failed_recipients = getattr(e, "failed_recipients", None)
+            if failed_recipients:
+                # Do not resend to recipients that already got the message
+                job["recipients"] = failed_recipients
+                self._append_spool({"op": "update", "id": job["id"], "recipients": failed_recipients})
+            self._retry_or_drop(job, e)
+            return
+
+        if sent is False:
+            # Not configured (no token or target); retrying will not help
+            self._drop(job, "notifier not configured")
+            return
+
+        self._record_batches(sent if isinstance(sent, list) else None)
+        self.delivered += 1
+        self.last_delivery_lag = time.time() - job["enqueued_at"]
+        self._append_spool({"op": "done", "id": job["id"]})
+        logger.info(f"Notification {job['id']} delivered after {self.last_delivery_lag:.2f}s")
+
+    def _record_batches(self, batch_results: Optional[List[Dict[str, Any]]]) -> None:
+        if batch_results:
+            self.last_batches = [
+                {"batch": r["batch"], "recipients": len(r["recipients"]), "ok": r["ok"]}
+                for r in batch_results
+            ]
+
+    def _retry_or_drop(self, job: Dict[str, Any], error: Exception) -> None:
+        status = getattr(error, "status_code", None)
+        if status is not None and 400 <= status < 500 and status != 429:
+            self._drop(job, f"rejected with {status}: {error}")
+            return
+        if job["attempts"] >= self.max_attempts:
+            self._drop(job, f"gave up after {job['attempts']} attempts: {error}")
+            return
+
+        delay = self._retry_after(error)
+        if delay is None:
+            backoff = min(self.backoff_initial * (2 ** (job["attempts"] - 1)), self.backoff_max)
+            delay = random.uniform(backoff / 2, backoff)
+
+        self.retries += 1
+        logger.warning(f"Notification {job['id']} failed ({error}); retrying in {delay:.1f}s")
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), job))
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        if getattr(error, "status_code", None) != 429:
+            return None
+        headers = getattr(error, "headers", None) or {}
+        try:
+            return min(float(headers.get("Retry-After")), self.backoff_max)
+        except (TypeError, ValueError):
+            return None
+
+    def _drop(self, job: Dict[str, Any], reason: str) -> None:
+        self.dropped += 1
+        logger.error(f"Dropping notification {job['id']}: {reason}")
+        self._append_spool({"op": "done", "id": job["id"]})
+
+    def _append_spool(self, record: Dict[str, Any]) -> None:
+        self._writer.submit(self._write_spool, record)
+
+    def _write_spool(self, record: Dict[str, Any]) -> None:
+        try:
+            if self._spool is None:
+                raise RuntimeError("spool is closed")
+            self._spool.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+        except Exception as e:
+            logger.error(f"Failed to write notification spool: {e}")
+
+    def _close_spool(self) -> None:
+        if self._spool is not None:
+            # Closing releases the flock
+            self._spool.close()
+            self._spool = None
+
+    def _restore_spool(self) -> None:
+        """Open this process's spool and adopt the jobs of spools whose process is gone."""
+        os.makedirs(os.path.dirname(self.spool_file) or ".", exist_ok=True)
+        if fcntl is None:
+            own_path, others = self.spool_file, []
+        else:
+            own_path = f"{self.spool_file}.{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            # The plain spool_file is the single-process spool of earlier versions
+            others = [self.spool_file] + sorted(
+                path for path in glob.glob(glob.escape(self.spool_file) + ".*") if not path.endswith(".tmp")
+            )
+
+        pending: Dict[str, Dict[str, Any]] = {}
+        adopted: List[IO[str]] = []
+        try:
+            if fcntl is None and os.path.exists(own_path):
+                with open(own_path, "r", encoding="utf-8") as f:
+                    pending.update(self._read_spool(f))
+            for path in others:
+                f = self._lock_orphan(path)
+                if f is None:
+                    continue
+                adopted.append(f)
+                for job_id, job in self._read_spool(f).items():
+                    if self._claim_orphan(path, job_id):
+                        pending[job_id] = job
+        except Exception as e:
+            logger.error(f"Failed to read notification spool: {e}")
+
+        # Compacted: only the pending jobs, written before the adopted spools are removed.
+        # The lock is taken before the rename (it stays with the file), so a process
+        # starting meanwhile never sees this spool unlocked and takes it for an orphan.
+        tmp_path = own_path + ".tmp"
+        self._spool = open(tmp_path, "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self._spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._spool.truncate(0)
+        for job in pending.values():
+            self._spool.write(json.dumps({"op": "add", "job": job}, ensure_ascii=False) + "\n")
+        self._spool.flush()
+        os.fsync(self._spool.fileno())
+        os.replace(tmp_path, own_path)
+        for f in adopted:
+            os.unlink(f.name)
+            f.close()
+
+        for job in pending.values():
+            heapq.heappush(self._ready, (job["priority"], next(self._seq), job))
+        if pending:
+            logger.info(f"Restored {len(pending)} undelivered notifications from spool")
+
+    @staticmethod
+    def _lock_orphan(path: str) -> Optional[IO[str]]:
+        """The spool opened and locked, or None if its process is alive (or it was just adopted)."""
+        try:
+            f = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Another process adopted and removed it between our open and lock
+            if os.fstat(f.fileno()).st_nlink == 0:
+                raise BlockingIOError
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _claim_orphan(self, path: str, job_id: str) -> bool:
+        if self.claims is None:
+            return True
+        try:
+            return self.claims.claim(f"spool:{os.path.basename(path)}:{job_id}", self.owner)
+        except Exception as e:
+            # Resending is better than losing the alert
+            logger.error(f"Failed to claim spooled notification {job_id}: {e}")
+            return True
+
+    @staticmethod
+    def _read_spool(f: IO[str]) -> Dict[str, Dict[str, Any]]:
+        """Jobs added to a spool and not yet done."""
+        pending: Dict[str, Dict[str, Any]] = {}
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn last line after a crash
+            if record.get("op") == "add":
+                pending[record["job"]["id"]] = record["job"]
+            elif record.get("op") == "update" and record.get("id") in pending:
+                pending[record["id"]]["recipients"] = record["recipients"]
+            elif record.get("op") == "done":
+                pending.pop(record.get("id"), None)
+        return pending
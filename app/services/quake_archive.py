@@ -0,0 +1,464 @@
+import argparse
+import json
+import logging
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .quake_parser import parse_jst
+
+logger = logging.getLogger(__name__)
+
+JST = timezone(timedelta(hours=9))
+
+# One fixed-size record per report: time, id, hypocenter name, magnitude,
+# max scale, depth, latitude, longitude, domestic tsunami flag
+_RECORD = struct.Struct("<d32s64sfhhffb")
+
+# (time, id, region, magnitude, max_scale, depth, latitude, longitude, tsunami)
+Row = Tuple[float, str, str, float, int, int, float, float, int]
+# (time, region): identifies a quake, as QuakeService._event_key does
+Key = Tuple[float, str]
+
+def parse_time(value: Any) -> Optional[float]:
+    """Epoch seconds from an epoch number, 'YYYY/MM/DD HH:MM:SS' (JST) or an ISO date/time."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        # Every poll passes the same event times, so this one is cached
+        return parse_jst(text).timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, "%Y/%m/%d").replace(tzinfo=JST).timestamp()
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(text)
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=JST)).timestamp()
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, JST).strftime("%Y/%m/%d %H:%M:%S")
+
+def _text(value: bytes) -> str:
+    return value.rstrip(b"\0").decode("utf-8", "ignore")
+
+def _f32(value: Any) -> float:
+    """Round to float32, as stored, so a row compares equal after a reload."""
+    return struct.unpack("<f", struct.pack("<f", float(value)))[0]
+
+def _fit(value: str, size: int) -> str:
+    """Cut a string to fit in size UTF-8 bytes without splitting a character."""
+    return value.encode("utf-8")[:size].decode("utf-8", "ignore")
+
+class QuakeArchive:
+    """
+    Local archive of 551 (earthquake) reports.
+
+    Stored as an append-only file of fixed-size binary records, so several
+    processes can append safely (one write per record) and a reader only has
+    to pick up the tail it has not seen. In memory the archive is columnar
+    (typed arrays) and sorted by time, with per-region and per-scale posting
+    lists, so a query is a couple of bisects plus a walk over the matches.
+
+    Reports are keyed by the earthquake time and hypocenter, like the quake
+    service's per-quake state, so two quakes in the same second are kept apart.
+    A later report for the same quake replaces the earlier one; the scale flash,
+    sent before the hypocenter is known, is replaced by the first report naming it.
+    """
+
+    def __init__(self, path: str = "data/quake_archive.bin"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded_bytes = 0
+        self._reset()
+        self._catch_up()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._times)
+
+    def add(self, quake: Dict[str, Any]) -> bool:
+        """Archive one 551 report. Returns False if it was already archived unchanged."""
+        return self._write_batch([self.to_row(quake)]) > 0
+
+    def backfill(self, quakes: Iterable[Dict[str, Any]], batch_size: int = 10000) -> int:
+        """
+        Archive many reports (e.g. from iter_jsonl). Items that are not 551 or lack
+        earthquake data are skipped. Returns the number of reports written.
+        """
+        pending: Dict[Key, Row] = {}
+        batch: List[Row] = []
+
+        def flush() -> None:
+            changes = self._new_rows(batch, pending)
+            if changes:
+                self._append_records([row for _, row in changes])
+                pending.update(changes)
+            batch.clear()
+
+        with self._lock:
+            self._catch_up()
+            for quake in quakes:
+                if quake.get("code", 551) != 551 or not quake.get("earthquake"):
+                    continue
+                try:
+                    batch.append(self.to_row(quake))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Skipping malformed quake report: {e}")
+                    continue
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+            # Records are streamed to disk per batch; the columns are rebuilt once
+            self._apply(list(pending.items()))
+        return len(pending)
+
+    def query(self, since: Any = None, until: Any = None, min_scale: Optional[int] = None,
+              min_magnitude: Optional[float] = None, region: Optional[str] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Reports in [since, until], newest first."""
+        with self._lock:
+            self._catch_up()
+            lo, hi = self._time_range(since, until)
+
+            if region is not None:
+                region_id = self._name_ids.get(region)
+                postings = self._by_region.get(region_id, ()) if region_id is not None else ()
+                positions = self._slice(postings, lo, hi)[::-1]
+            elif min_scale is not None:
+                lists = [self._slice(p, lo, hi) for scale, p in self._by_scale.items() if scale >= min_scale]
+                positions = sorted(chain.from_iterable(lists), reverse=True)
+            else:
+                positions = range(hi - 1, lo - 1, -1)
+
+            results = []
+            for i in positions:
+                if min_scale is not None and self._scales[i] < min_scale:
+                    continue
+                if min_magnitude is not None and self._magnitudes[i] < min_magnitude:
+                    continue
+                results.append(self._as_dict(i))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def stats(self, since: Any = None, until: Any = None, top_regions: int = 20) -> Dict[str, Any]:
+        """Counts per region, scale and magnitude over a time range."""
+        with self._lock:
+            self._catch_up()
+            lo, hi = self._time_range(since, until)
+            if lo >= hi:
+                return {"count": 0, "first": None, "last": None, "max_magnitude": None,
+                        "by_scale": {}, "by_magnitude": {}, "by_region": {}}
+
+            # Counting over array slices runs in C; no per-row Python objects are built
+            magnitudes = self._magnitudes[lo:hi]
+            region_counts = Counter(self._regions[lo:hi])
+            return {
+                "count": hi - lo,
+                "first": format_time(self._times[lo]),
+                "last": format_time(self._times[hi - 1]),
+                "max_magnitude": round(max(magnitudes), 1),
+                "by_scale": dict(sorted(Counter(self._scales[lo:hi]).items())),
+                "by_magnitude": dict(sorted(
+                    (f"M{m}", n) for m, n in Counter(int(m) for m in magnitudes if m >= 0).items()
+                )),
+                "by_region": {
+                    self._names[r] or "不明": n for r, n in region_counts.most_common(top_regions)
+                },
+            }
+
+    @staticmethod
+    def to_row(quake: Dict[str, Any]) -> Row:
+        earthquake = quake["earthquake"]
+        hypocenter = earthquake.get("hypocenter") or {}
+        return (
+            parse_time(earthquake["time"]),
+            _fit(str(quake.get("_id") or quake.get("id") or ""), 32),
+            _fit(hypocenter.get("name") or "", 64),
+            _f32(hypocenter.get("magnitude", -1)),
+            int(earthquake.get("maxScale", -1)),
+            int(hypocenter.get("depth", -1)),
+            _f32(hypocenter.get("latitude", -200)),
+            _f32(hypocenter.get("longitude", -200)),
+            0 if earthquake.get("domesticTsunami") in (None, "None", "Unknown") else 1,
+        )
+
+    def _reset(self) -> None:
+        self._times = array("d")
+        self._magnitudes = array("f")
+        self._scales = array("h")
+        self._depths = array("h")
+        self._latitudes = array("f")
+        self._longitudes = array("f")
+        self._tsunami = array("b")
+        self._regions = array("I")
+        self._ids: List[str] = []
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._keys: Dict[Key, int] = {}
+        self._by_region: Dict[int, array] = {}
+        self._by_scale: Dict[int, array] = {}
+
+    def _row_at(self, i: int) -> Row:
+        return (
+            self._times[i], self._ids[i], self._names[self._regions[i]], self._magnitudes[i],
+            self._scales[i], self._depths[i], self._latitudes[i], self._longitudes[i], self._tsunami[i],
+        )
+
+    def _as_dict(self, i: int) -> Dict[str, Any]:
+        return {
+            "id": self._ids[i],
+            "time": format_time(self._times[i]),
+            "hypocenter": self._names[self._regions[i]],
+            "magnitude": round(self._magnitudes[i], 1),
+            "maxScale": self._scales[i],
+            "depth": self._depths[i],
+            "latitude": round(self._latitudes[i], 4),
+            "longitude": round(self._longitudes[i], 4),
+            "tsunami": bool(self._tsunami[i]),
+        }
+
+    def _time_range(self, since: Any, until: Any) -> Tuple[int, int]:
+        since, until = parse_time(since), parse_time(until)
+        lo = bisect_left(self._times, since) if since is not None else 0
+        hi = bisect_right(self._times, until) if until is not None else len(self._times)
+        return lo, hi
+
+    @staticmethod
+    def _slice(positions, lo: int, hi: int):
+        """Part of a sorted posting list that falls in the row range [lo, hi)."""
+        return positions[bisect_left(positions, lo):bisect_left(positions, hi)]
+
+    def _write_batch(self, rows: List[Row]) -> int:
+        with self._lock:
+            # No catch-up (a stat per add): records other processes appended since
+            # the last read are applied, in file order, by the next query
+            changes = self._new_rows(rows)
+            if changes:
+                self._append_records([row for _, row in changes])
+                self._apply(changes)
+            return len(changes)
+
+    def _new_rows(self, rows: List[Row], pending: Optional[Dict[Key, Row]] = None) -> List[Tuple[Key, Row]]:
+        """
+        (key, row) for rows that add or change a quake, last report per quake
+        winning; the key is the one the quake is held under (see _held_key).
+        Rows are matched in the order given, i.e. file order.
+        """
+        pending = pending or {}
+        latest: Dict[Key, Row] = {}
+        for row in rows:
+            latest[self._held_key(row, latest, pending)] = row
+        changes = []
+        for key, row in latest.items():
+            if key in pending:
+                current = pending[key]
+            elif key in self._keys:
+                current = self._row_at(self._keys[key])
+            else:
+                current = None
+            if row != current:
+                changes.append((key, row))
+        return changes
+
+    def _held_key(self, row: Row, *held: Dict[Key, Row]) -> Key:
+        """
+        Key of the quake a row reports: its time and hypocenter, except that the
+        scale flash's (time, "") is taken over by the first report naming one.
+        """
+        key = (row[0], row[2])
+        if not row[2] or key in self._keys or any(key in rows for rows in held):
+            return key
+        flash = (row[0], "")
+        for rows in held:
+            if flash in rows:
+                current = rows[flash]
+                break
+        else:
+            if flash not in self._keys:
+                return key
+            current = self._row_at(self._keys[flash])
+        # Taken over already (in this batch) by this quake or another one
+        return flash if current[2] in ("", row[2]) else key
+
+    def _append_records(self, rows: List[Row]) -> None:
+        data = b"".join(
+            _RECORD.pack(t, i.encode("utf-8"), r.encode("utf-8"), m, s, d, la, lo, ts)
+            for t, i, r, m, s, d, la, lo, ts in rows
+        )
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # A single append, so concurrent writers never interleave within a record
+            os.write(fd, data)
+            end = os.lseek(fd, 0, os.SEEK_CUR)
+        finally:
+            os.close(fd)
+        # If another process appended in between, leave the offset alone: the next
+        # catch-up reads its records (and ours again, which is harmless)
+        if end - len(data) == self._loaded_bytes:
+            self._loaded_bytes = end
+
+    def _catch_up(self) -> None:
+        """Load records appended (by this or another process) since the last read."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        # Ignore a torn record at the end; it is re-read once complete
+        size -= size % _RECORD.size
+        if size < self._loaded_bytes:
+            # The file was replaced (e.g. compacted); start over
+            self._reset()
+            self._loaded_bytes = 0
+        if size == self._loaded_bytes:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._loaded_bytes)
+            data = f.read(size - self._loaded_bytes)
+        self._loaded_bytes = size
+        self._apply(self._new_rows([
+            (t, _text(i), _text(r), m, s, d, la, lo, ts)
+            for t, i, r, m, s, d, la, lo, ts in _RECORD.iter_unpack(data)
+        ]))
+
+    def _apply(self, changes: List[Tuple[Key, Row]]) -> None:
+        """
+        Merge changes (from _new_rows) into the columns. A later report of a held quake overwrites its
+        row in place and in-order new quakes are appended; only a new quake older
+        than the newest one held rebuilds the columns.
+        """
+        if not changes:
+            return
+
+        inserts = []
+        for key, row in sorted(changes):
+            position = self._keys.get(key)
+            if position is None:
+                inserts.append(row)
+                continue
+            self._replace_row(position, row)
+            if key[1] != row[2]:
+                # The scale flash now has its hypocenter
+                del self._keys[key]
+                self._keys[(row[0], row[2])] = position
+        if not inserts:
+            return
+
+        last = self._times[-1] if self._times else float("-inf")
+        if inserts[0][0] >= last:
+            for row in inserts:
+                self._append_row(row)
+            return
+
+        names = self._names
+        merged = {
+            (t, names[r]): (t, i, names[r], m, s, d, la, lo, ts)
+            for t, i, r, m, s, d, la, lo, ts in zip(
+                self._times, self._ids, self._regions, self._magnitudes, self._scales,
+                self._depths, self._latitudes, self._longitudes, self._tsunami,
+            )
+        }
+        merged.update(((row[0], row[2]), row) for row in inserts)
+        self._reset()
+        for key in sorted(merged):
+            self._append_row(merged[key])
+
+    def _region_id(self, region: str) -> int:
+        region_id = self._name_ids.get(region)
+        if region_id is None:
+            region_id = self._name_ids[region] = len(self._names)
+            self._names.append(region)
+        return region_id
+
+    def _replace_row(self, position: int, row: Row) -> None:
+        """Overwrite the row of the same quake (same time, so the position is unchanged)."""
+        _, quake_id, region, magnitude, scale, depth, latitude, longitude, tsunami = row
+        region_id = self._region_id(region)
+        if region_id != self._regions[position]:
+            self._move_posting(self._by_region, self._regions[position], region_id, position)
+            self._regions[position] = region_id
+        if scale != self._scales[position]:
+            self._move_posting(self._by_scale, self._scales[position], scale, position)
+            self._scales[position] = scale
+        self._ids[position] = quake_id
+        self._magnitudes[position] = magnitude
+        self._depths[position] = depth
+        self._latitudes[position] = latitude
+        self._longitudes[position] = longitude
+        self._tsunami[position] = tsunami
+
+    @staticmethod
+    def _move_posting(postings: Dict[int, array], old: int, new: int, position: int) -> None:
+        old_list = postings[old]
+        del old_list[bisect_left(old_list, position)]
+        if not old_list:
+            del postings[old]
+        new_list = postings.setdefault(new, array("I"))
+        new_list.insert(bisect_left(new_list, position), position)
+
+    def _append_row(self, row: Row) -> None:
+        t, quake_id, region, magnitude, scale, depth, latitude, longitude, tsunami = row
+        region_id = self._region_id(region)
+
+        position = len(self._times)
+        self._times.append(t)
+        self._ids.append(quake_id)
+        self._regions.append(region_id)
+        self._magnitudes.append(magnitude)
+        self._scales.append(scale)
+        self._depths.append(depth)
+        self._latitudes.append(latitude)
+        self._longitudes.append(longitude)
+        self._tsunami.append(tsunami)
+        self._keys[(t, region)] = position
+        self._by_region.setdefault(region_id, array("I")).append(position)
+        self._by_scale.setdefault(scale, array("I")).append(position)
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream items from a JSONL dump one line at a time (a line may also hold a JSON list)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                logger.warning(f"{path}:{number}: invalid JSON ({e})")
+                continue
+            if isinstance(item, list):
+                yield from item
+            else:
+                yield item
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill the quake archive from P2P Quake JSONL dumps.")
+    parser.add_argument("dumps", nargs="+", help="JSONL files of history API items")
+    parser.add_argument("--archive", default=os.getenv("QUAKE_ARCHIVE_FILE", "data/quake_archive.bin"))
+    args = parser.parse_args()
+
+    archive = QuakeArchive(args.archive)
+    for dump in args.dumps:
+        written = archive.backfill(iter_jsonl(dump))
+        print(f"{dump}: {written} reports archived")
+    print(f"{args.archive}: {len(archive)} quakes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import json
+import re
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+JST = timezone(timedelta(hours=9))
+
+# "points": [ ... ] of a 551 item. The array holds flat objects only, so it can
+# be matched (strings included) by the regex engine instead of being decoded.
+# Written as unrolled loops (each repetition starts with a distinct character),
+# so a failed match backtracks in linear time without possessive quantifiers.
+_POINTS_KEY = re.compile(rb'"points"\s*:\s*(?=\[)')
+_FLAT_ARRAY = re.compile(rb'\[[^\[\]"]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^\[\]"]*)*\]', re.S)
+_PLACEHOLDER = "\x00points#"
+
+_loads: Optional[Callable[[bytes], Any]] = None
+_backend = ""
+
+def loads(raw: bytes) -> Any:
+    """json.loads, using orjson when it is installed."""
+    global _loads, _backend
+    if _loads is None:
+        try:
+            import orjson
+            _loads, _backend = orjson.loads, "orjson"
+        except ImportError:
+            _loads, _backend = json.loads, "json"
+    return _loads(raw)
+
+def json_backend() -> str:
+    loads(b"null")
+    return _backend
+
+class LazyPoints(Sequence):
+    """The 'points' array of a 551 item, decoded from the raw body on first access."""
+
+    __slots__ = ("_raw", "_span", "_items")
+
+    def __init__(self, raw: bytes, span: Tuple[int, int]):
+        self._raw = raw
+        self._span = span
+        self._items: Optional[List[Dict[str, Any]]] = None
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if self._items is None:
+            start, end = self._span
+            self._items = loads(self._raw[start:end])
+            self._raw = None
+        return self._items
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __repr__(self) -> str:
+        return f"LazyPoints({'pending' if self._items is None else len(self._items)})"
+
+def parse_history(raw: bytes) -> Any:
+    """
+    Decode a history API body, leaving each item's 'points' array undecoded
+    (a LazyPoints) until something reads it. Only recipient selection does,
+    and only for quakes that are notified.
+    Falls back to a plain decode if the body does not have the expected shape.
+    """
+    pieces: List[bytes] = []
+    spans: List[Tuple[int, int]] = []
+    pos = 0
+    for key in _POINTS_KEY.finditer(raw):
+        span = _array_span(raw, key.end())
+        if key.start() < pos or span is None:
+            return loads(raw)
+        pieces += (raw[pos:key.end()], f'"\\u0000points#{len(spans)}"'.encode())
+        spans.append(span)
+        pos = span[1]
+    if not spans:
+        return loads(raw)
+    pieces.append(raw[pos:])
+
+    data = loads(b"".join(pieces))
+    restored = 0
+    for item in data if isinstance(data, list) else ():
+        placeholder = item.get("points") if isinstance(item, dict) else None
+        if isinstance(placeholder, str) and placeholder.startswith(_PLACEHOLDER):
+            item["points"] = LazyPoints(raw, spans[int(placeholder[len(_PLACEHOLDER):])])
+            restored += 1
+    # A "points" key outside the top-level items: not a body this parser understands
+    if restored != len(spans):
+        return loads(raw)
+    return data
+
+def _array_span(raw: bytes, start: int) -> Optional[Tuple[int, int]]:
+    """(start, end) of the flat JSON array starting at raw[start]."""
+    # Fast path: the first "]" closes the array unless it is inside a string.
+    # Without escaped quotes, that is the case when the quotes before it pair up.
+    end = raw.find(b"]", start) + 1
+    if end:
+        array = raw[start:end]
+        if b"[" not in array[1:] and b'\\"' not in array and not array.count(b'"') % 2:
+            return start, end
+    match = _FLAT_ARRAY.match(raw, start)
+    return match.span() if match else None
+
+@lru_cache(maxsize=1024)
+def parse_jst(value: str) -> datetime:
+    """'YYYY/MM/DD HH:MM:SS' (JST) as an aware datetime. Cached: every poll sees the same times."""
+    return datetime.strptime(value, "%Y/%m/%d %H:%M:%S").replace(tzinfo=JST)
@@ -1,16 +1,144 @@
-import requests
-import logging
+import asyncio
 import json
-import os
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, Optional
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple
+from ..config import HTTP_READ_TIMEOUT
+from .http_client import get_session, default_timeout, async_get
+from .metrics import P2P_FETCH_SECONDS, P2P_PARSE_SECONDS, QUAKE_STATE_SECONDS, MESSAGE_RENDER_SECONDS
+from .coordination import ClaimStore, DedupeWrites, default_owner
+from .feed_handlers import FEED_HANDLERS, FeedHandler
+from .quake_parser import parse_history, parse_jst
+from .resilience import HedgedFetcher
+from .state_store import StateStore, JsonFileStateStore
+
+if TYPE_CHECKING:
+    import requests
+    from .quake_archive import QuakeArchive
 
 logger = logging.getLogger(__name__)
 
+SCALE_TEXT = {
+    10: "震度1", 20: "震度2", 30: "震度3", 40: "震度4",
+    45: "震度5弱", 50: "震度5強", 55: "震度6弱", 60: "震度6強", 70: "震度7",
+}
+
+# A parsed history response (None on 304) and its ETag / Last-Modified
+Fetched = Tuple[Optional[List[Dict[str, Any]]], Tuple[Optional[str], Optional[str]]]
+
+# Tsunami values that are not yet an answer; a change to these is not worth a follow-up
+_TSUNAMI_PENDING = ("Unknown", "Checking")
+
+class _RecentIds:
+    """Bounded set of recently processed quake IDs (oldest evicted first)."""
+
+    def __init__(self, maxlen: int):
+        self._order = deque(maxlen=maxlen)
+        self._ids = set()
+
+    def __contains__(self, quake_id: str) -> bool:
+        return quake_id in self._ids
+
+    def add(self, quake_id: str) -> None:
+        if quake_id in self._ids:
+            return
+        if len(self._order) == self._order.maxlen:
+            self._ids.discard(self._order[0])
+        self._order.append(quake_id)
+        self._ids.add(quake_id)
+
+class _EventCache:
+    """
+    Bounded LRU of per-quake state (least recently used evicted first);
+    an entry expires `ttl` seconds after it was last written.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None or time.monotonic() - entry["stored_at"] > self.ttl:
+            return None
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        entry["stored_at"] = time.monotonic()
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
 class QuakeService:
-    def __init__(self, api_url: str, persistence_file: str = "data/last_quake.json"):
+    def __init__(self, api_url: str, persistence_file: str = "data/last_quake.json",
+                 session: Optional["requests.Session"] = None,
+                 state_store: Optional[StateStore] = None, recent_ids_size: int = 500,
+                 recipient_filter: Optional[Callable[[Dict[str, Any]], List[str]]] = None,
+                 archive: Optional["QuakeArchive"] = None,
+                 claims: Optional[ClaimStore] = None, owner: Optional[str] = None,
+                 event_cache_size: int = 1000, event_cache_ttl: float = 86400,
+                 feed_codes: Optional[List[int]] = None, fetcher: Optional[HedgedFetcher] = None,
+                 dedupe: Optional[DedupeWrites] = None):
         self.api_url = api_url
+        self._session = session
+        # Timeouts, circuit breaker and (with a mirror) hedged requests for the history API
+        self.fetcher = fetcher or HedgedFetcher([api_url])
         self.persistence_file = persistence_file
+        self.state_store = state_store or JsonFileStateStore(persistence_file)
+        # Optional: picks who should hear about a qualifying event (e.g. by region)
+        self.recipient_filter = recipient_filter
+        # Optional: keeps every evaluated report for /quakes and /quake_stats
+        self.archive = archive
+        # Optional: shared with other instances so each event is notified by one of them
+        self.claims = claims
+        self.owner = owner or default_owner()
+        # Retries and the fail-open/closed policy when the state or claim store fails
+        self.dedupe = dedupe or DedupeWrites()
+        self._recent_ids = _RecentIds(recent_ids_size)
+        # Last known state per quake (keyed by its time and hypocenter, see _event_key)
+        self._events = _EventCache(event_cache_size, event_cache_ttl)
+        # Other codes fetched alongside 551 (e.g. 552 tsunami, 556 early warning)
+        self.handlers: Dict[int, FeedHandler] = {
+            code: FEED_HANDLERS[code](self.state_store, claims, self.owner, self.dedupe)
+            for code in feed_codes or () if code in FEED_HANDLERS
+        }
+
+        # Decision stage (local state, validators, claims, state store, archive):
+        # one run at a time, whether from a poll, a worker thread or the stream
+        self._lock = threading.RLock()
+
+        # HTTP cache validators from the last fully processed response
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._cache_requests = 0
+        self._cache_hits = 0
+
+    @property
+    def session(self) -> "requests.Session":
+        """Session for the blocking API; the shared one is only built when first needed."""
+        return self._session or get_session()
 
     def check_quake(self) -> Dict[str, Any]:
         """
@@ -19,80 +147,411 @@ class QuakeService:
             dict containing 'notify' (bool), 'message' (str), and other details.
         """
         try:
-            headers = {"User-Agent": "MeerkatBot/1.0"}
-            logger.info(f"Accessing: {self.api_url}")
-            response = requests.get(self.api_url, headers=headers)
+            return self._decide(self._process_latest, self._fetch())
 
-            # Log for debugging
-            logger.debug(f"Status Code: {response.status_code}")
+        except Exception as e:
+            logger.error(f"Error checking quake: {e}")
+            return {"notify": False, "status": "Error", "error": str(e)}
 
-            response.raise_for_status()
+    async def check_quake_async(self) -> Dict[str, Any]:
+        """Non-blocking version of check_quake."""
+        try:
+            fetched = await self._fetch_async()
+            # The claim (SQLite), the state CAS (fsync) and the archive append block
+            return await asyncio.to_thread(self._decide, self._process_latest, fetched)
 
-            data = response.json()
-            if not data:
-                return {"notify": False, "status": "No data"}
+        except Exception as e:
+            logger.error(f"Error checking quake: {e}")
+            return {"notify": False, "status": "Error", "error": str(e)}
 
-            latest_quake = data[0]
-            quake_id = latest_quake.get("_id") # Use unique ID from API if available, or generate one
-            # As p2pquake doesn't always guarantee a clean top-level ID in all endpoints,
-            # we can fallback to checking time + hypocenter if ID is missing.
-            # But the 'history' endpoint usually has an ID.
-            if not quake_id:
-                quake_id = latest_quake.get("id")
+    def check_quakes(self) -> Dict[str, Any]:
+        """
+        Batch mode: walk every fetched event oldest-first from the saved cursor.
+        Returns:
+            dict with 'notify' (bool) and 'results', one entry per event to notify.
+        """
+        try:
+            return self._decide(self._process_batch, self._fetch())
+
+        except Exception as e:
+            logger.error(f"Error checking quakes: {e}")
+            return {"notify": False, "status": "Error", "error": str(e), "results": []}
+
+    async def check_quakes_async(self) -> Dict[str, Any]:
+        """Non-blocking version of check_quakes."""
+        try:
+            fetched = await self._fetch_async()
+            return await asyncio.to_thread(self._decide, self._process_batch, fetched)
+
+        except Exception as e:
+            logger.error(f"Error checking quakes: {e}")
+            return {"notify": False, "status": "Error", "error": str(e), "results": []}
 
-            # Fallback if no ID found (unlikely but safe)
-            if not quake_id:
-                quake_id = latest_quake["earthquake"]["time"]
+    def process_event(self, quake: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Evaluate a single pushed event (e.g. from the WebSocket feed)
+        with the same rules as check_quake.
+        """
+        try:
+            with self._lock:
+                quake_id = self._get_quake_id(quake)
+                if quake_id in self._recent_ids:
+                    return {"notify": False, "status": "Already notified"}
+
+                result = self._evaluate(quake, self._load_last_quake_id())
+                if result["status"] != "Small quake":
+                    self._recent_ids.add(quake_id)
+                return result
+
+        except Exception as e:
+            logger.error(f"Error processing quake event: {e}")
+            return {"notify": False, "status": "Error", "error": str(e)}
+
+    def process_feed_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate a pushed item of any handled code (551 goes through process_event)."""
+        if item.get("code", 551) == 551:
+            return self.process_event(item)
+        handler = self.handlers.get(item.get("code"))
+        if handler is None:
+            return {"notify": False, "status": "Unsupported code", "code": item.get("code")}
+        try:
+            with self._lock:
+                return handler.handle(item)
+        except Exception as e:
+            logger.error(f"Error processing feed item {item.get('code')}: {e}")
+            return {"notify": False, "status": "Error", "error": str(e)}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Conditional GET counters for the history API."""
+        return {
+            "requests": self._cache_requests,
+            "not_modified": self._cache_hits,
+            "hit_rate": self._cache_hits / self._cache_requests if self._cache_requests else 0.0,
+        }
+
+    def _decide(self, stage: Callable[[Any], Dict[str, Any]], fetched: Fetched) -> Dict[str, Any]:
+        data, validators = fetched
+        with self._lock:
+            result = stage(data)
+            if data is not None:
+                self._commit_validators(validators)
+            return result
+
+    def _process_latest(self, data: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Evaluate the newest event of a fetched list."""
+        if data is None:
+            return {"notify": False, "status": "Not modified"}
+        quakes = [item for item in data if item.get("code", 551) == 551]
+        feed = self._dispatch(data)
+        if not quakes:
+            result = {"notify": False, "status": "No data"}
+        else:
+            latest_quake = quakes[0]
 
             # Load last notified ID
             last_notified_id = self._load_last_quake_id()
 
-            if quake_id == last_notified_id:
-                 return {"notify": False, "status": "Already notified"}
+            result = self._evaluate(latest_quake, last_notified_id)
+        if feed:
+            result["feed"] = feed
+        return result
+
+    def _process_batch(self, data: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Walk a fetched list oldest-first from the saved cursor."""
+        if data is None:
+            return {"notify": False, "status": "Not modified", "results": []}
+        if not data:
+            return {"notify": False, "status": "No data", "results": []}
+
+        cursor = self._load_cursor()
+        last_notified_id = self._load_last_quake_id()
+        new_cursor = cursor
+        results = []
+        feed = self._dispatch(data)
+
+        # The history API returns newest first
+        for quake in reversed(data):
+            if quake.get("code", 551) != 551:
+                continue
+            time_str = quake["earthquake"]["time"]
+            # "YYYY/MM/DD HH:MM:SS" sorts lexically. Quakes before the cursor were
+            # settled by an earlier run (maybe before a restart), but a later report
+            # of one this process still holds state for may be a correction.
+            if cursor and time_str < cursor and not self._is_known(quake):
+                continue
+
+            quake_id = self._get_quake_id(quake)
+            if quake_id in self._recent_ids:
+                continue
+
+            result = self._evaluate(quake, last_notified_id)
+            if result["status"] != "Small quake":
+                # Small quakes stay eligible for a later scale correction
+                self._recent_ids.add(quake_id)
+            if result["notify"]:
+                last_notified_id = quake_id
+                results.append(result)
+
+            if not new_cursor or time_str > new_cursor:
+                new_cursor = time_str
 
-            time_str = latest_quake["earthquake"]["time"]
+        if new_cursor != cursor:
+            self._save_cursor(new_cursor)
 
-            # Timezone handling
-            JST = timezone(timedelta(hours=9))
-            quake_time = datetime.strptime(time_str, "%Y/%m/%d %H:%M:%S").replace(tzinfo=JST)
-            now = datetime.now(JST)
+        return {
+            "notify": bool(results or feed),
+            "status": "Earthquake Detected" if results else "No new quake",
+            "evaluated": len(data),
+            # Time of the newest event seen so far
+            "latest": new_cursor,
+            "results": results,
+            "feed": feed,
+        }
+
+    def _dispatch(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run non-551 items through their handlers, oldest first. Returns the ones to notify."""
+        if not self.handlers:
+            return []
+        notify = []
+        for item in reversed(data):
+            if item.get("code", 551) == 551 or item.get("code") not in self.handlers:
+                continue
+            result = self.process_feed_item(item)
+            if result["notify"]:
+                notify.append(result)
+        return notify
+
+    def _fetch(self) -> Fetched:
+        """
+        Fetch the event list from the history API with a conditional GET.
+        Returns:
+            (None if upstream answered 304 Not Modified, otherwise the parsed list; its validators)
+        """
+        logger.info(f"Accessing: {self.api_url}")
+        headers = self._conditional_headers()
+        with P2P_FETCH_SECONDS.time():
+            response = self.fetcher.fetch(
+                lambda url: self.session.get(url, headers=headers, timeout=default_timeout())
+            )
+        return self._read_response(response)
+
+    async def _fetch_async(self) -> Fetched:
+        """Non-blocking version of _fetch."""
+        logger.info(f"Accessing: {self.api_url}")
+        headers = self._conditional_headers()
+        with P2P_FETCH_SECONDS.time():
+            response = await self.fetcher.fetch_async(
+                lambda url: async_get(url, headers=headers, timeout=HTTP_READ_TIMEOUT)
+            )
+        return self._read_response(response)
+
+    def _conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        return headers
+
+    def _read_response(self, response) -> Fetched:
+        """Parse the body and read its validators; the body is None on 304."""
+        self._cache_requests += 1
+
+        # Log for debugging
+        logger.debug(f"Status Code: {response.status_code}")
+
+        if response.status_code == 304:
+            self._cache_hits += 1
+            return None, (None, None)
+
+        response.raise_for_status()
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        validators = (
+            etag if isinstance(etag, str) else None,
+            last_modified if isinstance(last_modified, str) else None,
+        )
+
+        with P2P_PARSE_SECONDS.time():
+            content = getattr(response, "content", None)
+            if isinstance(content, bytes):
+                # Observation points are only decoded if recipients are picked from them
+                return parse_history(content), validators
+            return response.json(), validators
 
-            # Sanity Check: Ignore if older than 24 hours (to prevent spamming very old quakes on boot)
-            if now - quake_time > timedelta(hours=24):
-                 return {"notify": False, "status": "Too old", "time": time_str}
+    def _commit_validators(self, validators: Tuple[Optional[str], Optional[str]]) -> None:
+        """
+        Remember the validators of the response just processed.
+        Only called once evaluation succeeded, so a failed run is retried in full.
+        """
+        self._etag, self._last_modified = validators
+
+    def _get_quake_id(self, quake: Dict[str, Any]) -> str:
+        quake_id = quake.get("_id") # Use unique ID from API if available, or generate one
+        # As p2pquake doesn't always guarantee a clean top-level ID in all endpoints,
+        # we can fallback to checking time + hypocenter if ID is missing.
+        # But the 'history' endpoint usually has an ID.
+        if not quake_id:
+            quake_id = quake.get("id")
+
+        # Fallback if no ID found (unlikely but safe)
+        if not quake_id:
+            quake_id = quake["earthquake"]["time"]
 
-            # Check scale
-            max_scale = latest_quake["earthquake"]["maxScale"]
-            # API spec: 30 = Scale 3
-            if max_scale < 30:
-                logger.info(f"Skipping small quake: Scale score {max_scale}")
-                # Even if small, we should NOT update the ID yet.
-                # If we save it, subsequent updates (e.g. scale correction) with the same ID will be ignored.
-                return {"notify": False, "status": "Small quake", "detail": "Skipped notification (Scale < 3)"}
+        return quake_id
 
-            # Construct message
-            message_text = self._create_message(latest_quake, time_str, max_scale)
+    @staticmethod
+    def _event_key(quake: Dict[str, Any]) -> str:
+        """
+        Key shared by all reports of one quake: its time and, once a report names
+        it, its hypocenter. The magnitude is left out since later reports refine it.
+        """
+        earthquake = quake["earthquake"]
+        hypocenter = (earthquake.get("hypocenter") or {}).get("name")
+        return f"{earthquake['time']} {hypocenter}" if hypocenter else earthquake["time"]
+
+    def _is_known(self, quake: Dict[str, Any]) -> bool:
+        """Whether per-quake state is held for the quake this report belongs to."""
+        key = self._event_key(quake)
+        return self._events.get(key) is not None or (
+            key != quake["earthquake"]["time"] and self._events.get(quake["earthquake"]["time"]) is not None
+        )
 
-            # Save ID after successful processing preparation
-            self._save_last_quake_id(quake_id)
+    def _evaluate(self, quake: Dict[str, Any], last_notified_id: Optional[str]) -> Dict[str, Any]:
+        """Decide whether a single event should be notified."""
+        quake_id = self._get_quake_id(quake)
+        time_str = quake["earthquake"]["time"]
+        key = self._event_key(quake)
 
-            return {
-                "notify": True,
-                "message": message_text,
-                "status": "Earthquake Detected",
-                "time": time_str
-            }
+        # A repeated report costs one lookup
+        known = self._events.get(key)
+        if known is None and key != time_str:
+            # The scale flash comes before the hypocenter is known; the first
+            # report that names one takes its state over
+            known = self._events.pop(time_str)
+        if known is not None and known["report_id"] == quake_id:
+            return {**known["result"], "time": time_str}
+        payload_hash = hash(json.dumps(quake["earthquake"], sort_keys=True, ensure_ascii=False))
+        if known is not None and known["hash"] == payload_hash:
+            known["report_id"] = quake_id
+            return {**known["result"], "time": time_str}
 
+        if known is not None and known["notified"]:
+            result = self._evaluate_correction(quake, quake_id, time_str, known, last_notified_id)
+        else:
+            result = self._evaluate_new(quake, quake_id, time_str, last_notified_id)
+
+        notified = result["notify"] or result["status"] == "Already notified"
+        if notified:
+            # A later report of a notified quake is a correction, not a new alert
+            cached = {"notify": False, "status": "Already notified"}
+        else:
+            cached = {key: result[key] for key in ("notify", "status", "detail") if key in result}
+        tsunami = quake["earthquake"].get("domesticTsunami")
+        if known is not None and tsunami in _TSUNAMI_PENDING:
+            tsunami = known["tsunami"]
+        self._events.put(key, {
+            "report_id": quake_id,
+            "hash": payload_hash,
+            "max_scale": max(quake["earthquake"]["maxScale"], known["max_scale"] if known else -1),
+            "tsunami": tsunami,
+            "notified": notified or bool(known and known["notified"]),
+            "result": cached,
+        })
+        # Only new or changed reports reach this point
+        self._archive(quake)
+        return result
+
+    def _archive(self, quake: Dict[str, Any]) -> None:
+        if self.archive is None:
+            return
+        try:
+            self.archive.add(quake)
         except Exception as e:
-            logger.error(f"Error checking quake: {e}")
-            return {"notify": False, "status": "Error", "error": str(e)}
+            logger.warning(f"Failed to archive quake: {e}")
 
-    def _create_message(self, quake_data, time_str, max_scale) -> str:
-        scale_map = {
-            10: "震度1", 20: "震度2", 30: "震度3", 40: "震度4",
-            45: "震度5弱", 50: "震度5強", 55: "震度6弱", 60: "震度6強", 70: "震度7",
+    def _evaluate_new(self, quake: Dict[str, Any], quake_id: str, time_str: str,
+                      last_notified_id: Optional[str]) -> Dict[str, Any]:
+        """Rules for a quake that has not been notified yet."""
+        if quake_id == last_notified_id:
+             return {"notify": False, "status": "Already notified", "time": time_str}
+
+        quake_time = parse_jst(time_str)
+        now = datetime.now(quake_time.tzinfo)
+
+        # Sanity Check: Ignore if older than 24 hours (to prevent spamming very old quakes on boot)
+        if now - quake_time > timedelta(hours=24):
+             return {"notify": False, "status": "Too old", "time": time_str}
+
+        # Check scale
+        max_scale = quake["earthquake"]["maxScale"]
+        # API spec: 30 = Scale 3
+        if max_scale < 30:
+            logger.info(f"Skipping small quake: Scale score {max_scale}")
+            # Even if small, we should NOT update the ID yet.
+            # If we save it, subsequent updates (e.g. scale correction) with the same ID will be ignored.
+            return {"notify": False, "status": "Small quake", "detail": "Skipped notification (Scale < 3)", "time": time_str}
+
+        # Construct message
+        with MESSAGE_RENDER_SECONDS.time():
+            message_text = self._create_message(quake, time_str, max_scale)
+
+        # Instances may first see different reports of the quake (the scale flash
+        # or a detailed one), so the claim is on the quake itself
+        return self._claim_notification(quake, quake_id, time_str, last_notified_id, message_text,
+                                        "Earthquake Detected", time_str)
+
+    def _evaluate_correction(self, quake: Dict[str, Any], quake_id: str, time_str: str,
+                             known: Dict[str, Any], last_notified_id: Optional[str]) -> Dict[str, Any]:
+        """A new report for a quake that was already notified: send an update only if it matters."""
+        earthquake = quake["earthquake"]
+        max_scale = earthquake["maxScale"]
+        tsunami = earthquake.get("domesticTsunami")
+        scale_upgraded = max_scale > known["max_scale"]
+        tsunami_changed = tsunami != known["tsunami"] and tsunami not in _TSUNAMI_PENDING
+        if not (scale_upgraded or tsunami_changed):
+            return {"notify": False, "status": "Already notified", "detail": "Minor correction", "time": time_str}
+
+        logger.info(f"Quake {time_str} corrected: scale {known['max_scale']} -> {max_scale}, tsunami {known['tsunami']} -> {tsunami}")
+        new_scale = max(max_scale, known["max_scale"])
+        new_tsunami = tsunami if tsunami_changed else known["tsunami"]
+        with MESSAGE_RENDER_SECONDS.time():
+            message_text = self._create_update_message(
+                quake, time_str, new_scale, known["max_scale"] if scale_upgraded else None,
+            )
+        # One update per state the quake reaches, whichever report carried it
+        result = self._claim_notification(quake, quake_id, time_str, last_notified_id, message_text,
+                                          "Earthquake Updated", f"{time_str} scale={new_scale} tsunami={new_tsunami}")
+        if result["notify"]:
+            result["update"] = True
+        return result
+
+    def _claim_notification(self, quake: Dict[str, Any], quake_id: str, time_str: str,
+                            last_notified_id: Optional[str], message_text: str, status: str,
+                            event: str) -> Dict[str, Any]:
+        # Save ID after successful processing preparation.
+        # If another worker already moved the ID on, it owns this notification.
+        if not self._save_last_quake_id(quake_id, expected=last_notified_id):
+            return {"notify": False, "status": "Already notified", "time": time_str}
+        # The local state only covers this instance; other instances may share the claims
+        if not self._claim(event):
+            return {"notify": False, "status": "Already notified", "detail": "Claimed by another instance",
+                    "time": time_str}
+
+        result = {
+            "notify": True,
+            "message": message_text,
+            "status": status,
+            "time": time_str,
+            "id": quake_id,
         }
-        scale_text = scale_map.get(max_scale, f"震度不明({max_scale})")
+        if self.recipient_filter is not None:
+            result["recipients"] = self.recipient_filter(quake)
+        return result
+
+    def _create_message(self, quake_data, time_str, max_scale) -> str:
+        scale_text = SCALE_TEXT.get(max_scale, f"震度不明({max_scale})")
 
         hypocenter_data = quake_data["earthquake"]["hypocenter"]
         hypocenter = hypocenter_data["name"]
@@ -113,26 +572,66 @@ class QuakeService:
             f"{tsunami_info}"
         )
 
-    def _load_last_quake_id(self) -> Optional[str]:
-        """Load the last notified earthquake ID from file."""
-        if not os.path.exists(self.persistence_file):
-            return None
+    def _create_update_message(self, quake_data, time_str, max_scale, previous_scale=None) -> str:
+        """Follow-up for a corrected report; an upgraded scale is shown as old -> new."""
+        scale_text = SCALE_TEXT.get(max_scale, f"震度不明({max_scale})")
+        if previous_scale is not None and previous_scale in SCALE_TEXT:
+            scale_text = f"{SCALE_TEXT[previous_scale]} → {scale_text}"
 
+        hypocenter_data = quake_data["earthquake"].get("hypocenter") or {}
+        hypocenter = hypocenter_data.get("name") or "調査中"
+        magnitude = hypocenter_data.get("magnitude", -1)
+
+        tsunami = quake_data["earthquake"].get("domesticTsunami")
+        tsunami_info = "津波の心配なし" if tsunami == "None" else "⚠️津波情報に注意！"
+
+        return (
+            f"🦦 ミーアキャット地震速報 (続報) 🦦\n\n"
+            f"【発生時刻】{time_str}\n"
+            f"【震源地】{hypocenter}\n"
+            f"【最大震度】{scale_text}\n"
+            f"【M】{magnitude if magnitude >= 0 else '調査中'}\n\n"
+            f"{tsunami_info}"
+        )
+
+    def _load_last_quake_id(self) -> Optional[str]:
+        """Load the last notified earthquake ID from the state store."""
         try:
-            with open(self.persistence_file, "r") as f:
-                data = json.load(f)
-                return data.get("id")
+            with QUAKE_STATE_SECONDS.time(op="load"):
+                return self.state_store.get("id")
         except Exception as e:
             logger.warning(f"Failed to load persistence file: {e}")
             return None
 
-    def _save_last_quake_id(self, quake_id: str) -> None:
-        """Save the last notified earthquake ID to file."""
+    def _save_last_quake_id(self, quake_id: str, expected: Optional[str] = None) -> bool:
+        """
+        Save the last notified earthquake ID, only if the stored ID is still expected.
+        Returns False if another worker changed it first.
+        """
+        with QUAKE_STATE_SECONDS.time(op="save"):
+            return self.dedupe.run("save", lambda: self.state_store.compare_and_swap(
+                "id", expected, quake_id, extra={"updated_at": datetime.now().isoformat()}
+            ))
+
+    def _claim(self, event: str) -> bool:
+        """Take the idempotency key for an event. Returns False if another instance has it."""
+        if self.claims is None:
+            return True
+        return self.dedupe.run("claim", lambda: self.claims.claim(f"quake:{event}", self.owner))
+
+    def _load_cursor(self) -> Optional[str]:
+        """Load the batch cursor (time of the newest evaluated event)."""
         try:
-            # ensure directory exists
-            os.makedirs(os.path.dirname(self.persistence_file), exist_ok=True)
+            with QUAKE_STATE_SECONDS.time(op="load"):
+                return self.state_store.get("cursor")
+        except Exception as e:
+            logger.warning(f"Failed to load cursor: {e}")
+            return None
 
-            with open(self.persistence_file, "w") as f:
-                json.dump({"id": quake_id, "updated_at": datetime.now().isoformat()}, f)
+    def _save_cursor(self, cursor: str) -> None:
+        """Save the batch cursor."""
+        try:
+            with QUAKE_STATE_SECONDS.time(op="save"):
+                self.state_store.set("cursor", cursor)
         except Exception as e:
-            logger.error(f"Failed to save persistence file: {e}")
+            logger.error(f"Failed to save cursor: {e}")
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .quake_service import QuakeService
+
+logger = logging.getLogger(__name__)
+
+# Called with a check_quake style result whenever a notification is needed
+NotifyCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+# One poll of the history API that queues its own alerts (e.g. main's quake_check)
+PollCallback = Callable[[], Awaitable[Dict[str, Any]]]
+
+class QuakeStreamIngestor:
+    """
+    Long-lived consumer of the P2P Quake WebSocket feed.
+    Events go through QuakeService.process_event, so dedupe, age and scale rules
+    are identical to /check_quake. While the stream is down, the ingestor falls
+    back to polling the history API until it reconnects: through `poll` if given
+    (so the fallback shares /check_quake's coalescing, metrics and batch mode),
+    otherwise with QuakeService.check_quake_async and on_notify.
+    """
+
+    def __init__(self, ws_url: str, quake_service: QuakeService, on_notify: NotifyCallback,
+                 fallback_interval: float = 60, backoff_initial: float = 1, backoff_max: float = 60,
+                 poll: Optional[PollCallback] = None):
+        self.ws_url = ws_url
+        self.quake_service = quake_service
+        self.on_notify = on_notify
+        self.poll = poll
+        self.fallback_interval = fallback_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.connected = False
+        self.reconnects = 0
+        self.events_received = 0
+        self.last_latency_ms: Optional[float] = None
+
+        self._task: Optional[asyncio.Task] = None
+        self._fallback_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="quake-stream")
+
+    async def stop(self) -> None:
+        for task in (self._task, self._fallback_task):
+            if task is not None:
+                task.cancel()
+        for task in (self._task, self._fallback_task):
+            if task is not None:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._fallback_task = None
+        self.connected = False
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "polling_fallback": self._fallback_task is not None and not self._fallback_task.done(),
+            "reconnects": self.reconnects,
+            "events_received": self.events_received,
+            "last_latency_ms": self.last_latency_ms,
+        }
+
+    async def run(self) -> None:
+        # Imported here so the app does not load websockets unless the stream is enabled
+        from websockets.asyncio.client import connect
+
+        backoff = self.backoff_initial
+
+        while True:
+            try:
+                async with connect(self.ws_url) as websocket:
+                    logger.info(f"🦦 Quake stream connected: {self.ws_url}")
+                    self.connected = True
+                    backoff = self.backoff_initial
+                    await self._stop_fallback()
+
+                    async for message in websocket:
+                        await self.handle_message(message)
+
+                logger.warning("Quake stream closed by server")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Quake stream error: {e}")
+
+            self.connected = False
+            self.reconnects += 1
+            self._start_fallback()
+
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, backoff)
+            logger.info(f"Reconnecting quake stream in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    async def handle_message(self, message) -> None:
+        received_at = time.perf_counter()
+        try:
+            event = json.loads(message)
+        except ValueError:
+            logger.warning("Ignoring non-JSON stream message")
+            return
+
+        # Earthquake information (551) and the codes the service has handlers for
+        code = event.get("code")
+        if code != 551 and code not in self.quake_service.handlers:
+            return
+
+        self.events_received += 1
+        # Serialized with polls by the service's lock, off the event loop
+        result = await asyncio.to_thread(self.quake_service.process_feed_item, event)
+        if result.get("notify") and await self._notify(result):
+            self.last_latency_ms = (time.perf_counter() - received_at) * 1000
+            logger.info(f"Stream event notified in {self.last_latency_ms:.1f}ms")
+
+    async def _notify(self, result: Dict[str, Any]) -> bool:
+        # A failed push must not tear down the stream connection
+        try:
+            await self.on_notify(result)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to notify stream event: {e}")
+            return False
+
+    def _start_fallback(self) -> None:
+        if self._fallback_task is None or self._fallback_task.done():
+            logger.info("Quake stream down, falling back to polling")
+            self._fallback_task = asyncio.create_task(self._poll_loop(), name="quake-stream-fallback")
+
+    async def _stop_fallback(self) -> None:
+        if self._fallback_task is not None:
+            self._fallback_task.cancel()
+            try:
+                await self._fallback_task
+            except asyncio.CancelledError:
+                pass
+            self._fallback_task = None
+
+    async def _poll_loop(self) -> None:
+        while True:
+            if self.poll is not None:
+                await self.poll()
+            else:
+                result = await self.quake_service.check_quake_async()
+                if result.get("notify"):
+                    await self._notify(result)
+                for item in result.get("feed", []):
+                    await self._notify(item)
+            await asyncio.sleep(self.fallback_interval)
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class UpstreamUnavailable(Exception):
+    """Every endpoint's circuit is open; the request was not sent."""
+
+class UpstreamError(Exception):
+    """The endpoint answered with a server error (5xx)."""
+
+    def __init__(self, url: str, status_code: int):
+        super().__init__(f"{status_code} Server Error for url: {url}")
+        self.status_code = status_code
+
+class CircuitBreaker:
+    """
+    Fails fast while an endpoint is unhealthy.
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are refused for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Circuit opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def release(self) -> None:
+        """A trial call was abandoned without an outcome (e.g. it lost a hedge race)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+class HedgedFetcher:
+    """
+    Requests a resource from a primary endpoint and optional mirrors.
+    - Each endpoint has its own circuit breaker; open ones are skipped.
+    - If no answer arrived after `hedge_delay` seconds (or the current attempt
+      failed), the next endpoint is raced against it; the first good answer wins.
+    - The whole fetch is bounded by `deadline` seconds.
+    A response counts as good unless it raised or has a 5xx status.
+    """
+
+    def __init__(self, urls: List[str], hedge_delay: float = 1.0, deadline: float = 10.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30):
+        self.urls = [url for url in urls if url]
+        self.hedge_delay = hedge_delay
+        self.deadline = deadline
+        self.breakers = {url: CircuitBreaker(failure_threshold, reset_timeout) for url in self.urls}
+        self.hedges = 0
+        self.wins: Dict[str, int] = {url: 0 for url in self.urls}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def fetch(self, request: Callable[[str], Any]) -> Any:
+        """Blocking fetch; request(url) performs one HTTP call and returns its response."""
+        race = _Race(self)
+        running: Dict[Any, str] = {}
+        try:
+            while True:
+                url = race.next_url(bool(running))
+                if url is not None:
+                    running[self._pool().submit(request, url)] = url
+                done, _ = wait(list(running), timeout=race.wait_timeout(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    ok, response = race.settle(running.pop(future), future.result)
+                    if ok:
+                        return response
+        finally:
+            # Losers keep running in the pool until their own socket timeouts
+            race.abandon(running.values())
+
+    async def fetch_async(self, request: Callable[[str], Awaitable[Any]]) -> Any:
+        """Non-blocking version of fetch."""
+        race = _Race(self)
+        running: Dict[asyncio.Future, str] = {}
+        try:
+            while True:
+                url = race.next_url(bool(running))
+                if url is not None:
+                    running[asyncio.ensure_future(request(url))] = url
+                done, _ = await asyncio.wait(list(running), timeout=race.wait_timeout(running),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    ok, response = race.settle(running.pop(task), task.result)
+                    if ok:
+                        return response
+        finally:
+            for task in running:
+                task.cancel()
+            race.abandon(running.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hedged_requests": self.hedges,
+            "endpoints": {
+                url: {**self.breakers[url].get_stats(), "wins": self.wins[url]} for url in self.urls
+            },
+        }
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=4 * max(1, len(self.urls)), thread_name_prefix="upstream-fetch"
+                    )
+        return self._executor
+
+class _Race:
+    """Book-keeping for one HedgedFetcher.fetch call."""
+
+    def __init__(self, fetcher: HedgedFetcher):
+        self.fetcher = fetcher
+        self.started = time.monotonic()
+        self.last_launch: Optional[float] = None
+        self.candidates = iter(fetcher.urls)
+        self.exhausted = False
+        self.timed_out = False
+        self.error: Optional[BaseException] = None
+
+    def next_url(self, racing: bool) -> Optional[str]:
+        """The endpoint to launch now, if it is time to start (or hedge) one."""
+        now = time.monotonic()
+        if self.exhausted or (racing and now - self.last_launch < self.fetcher.hedge_delay):
+            return None
+        for url in self.candidates:
+            if self.fetcher.breakers[url].allow():
+                if racing:
+                    self.fetcher.hedges += 1
+                    logger.info(f"No answer after {now - self.last_launch:.2f}s, hedging to {url}")
+                self.last_launch = now
+                return url
+            logger.info(f"Circuit open, skipping {url}")
+        self.exhausted = True
+        return None
+
+    def wait_timeout(self, running: Dict[Any, str]) -> float:
+        """Seconds to wait for an answer before hedging; raises once nothing is left to wait for."""
+        if not running:
+            raise self.error or UpstreamUnavailable("Circuit open for every upstream endpoint")
+        now = time.monotonic()
+        remaining = self.started + self.fetcher.deadline - now
+        if remaining <= 0:
+            self.timed_out = True
+            raise TimeoutError(f"No upstream answer within {self.fetcher.deadline}s")
+        if self.exhausted:
+            return remaining
+        return max(0.0, min(remaining, self.last_launch + self.fetcher.hedge_delay - now))
+
+    def settle(self, url: str, result: Callable[[], Any]):
+        """Record a finished attempt. Returns (True, response) for a good answer, else (False, None)."""
+        breaker = self.fetcher.breakers[url]
+        try:
+            response = result()
+            status_code = getattr(response, "status_code", 200)
+            if status_code >= 500:
+                raise UpstreamError(url, status_code)
+        except Exception as e:
+            logger.warning(f"Upstream attempt failed ({url}): {e}")
+            breaker.record_failure()
+            self.error = e
+            return False, None
+        breaker.record_success()
+        self.fetcher.wins[url] += 1
+        return True, response
+
+    def abandon(self, urls) -> None:
+        """Attempts left unfinished: too slow if the deadline passed, otherwise lost the race."""
+        for url in urls:
+            if self.timed_out:
+                self.fetcher.breakers[url].record_failure()
+            else:
+                self.fetcher.breakers[url].release()
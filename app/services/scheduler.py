@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A job returns (ok, activity_at): whether the run succeeded, and the epoch time
+# of the most recent activity it saw (e.g. the newest quake), if any
+JobResult = Tuple[bool, Optional[float]]
+Job = Callable[[], Awaitable[JobResult]]
+
+class AdaptiveInterval:
+    """
+    Polling interval that tightens during activity and relaxes when quiet.
+    - Activity within the last `active_window` seconds: poll every `min_interval`.
+    - Quiet runs: the interval grows by `factor` up to `max_interval`.
+    - Failed runs: the interval doubles (up to `max_interval`) to spare the upstream.
+    Every delay is spread by +/- `jitter` so instances do not poll in lockstep.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, factor: float = 1.5,
+                 jitter: float = 0.1, active_window: float = 600):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.factor = max(1.0, factor)
+        self.jitter = min(max(0.0, jitter), 1.0)
+        self.active_window = active_window
+        self.interval = min_interval
+        self.last_activity: Optional[float] = None
+        self.errors = 0
+
+    def record(self, ok: bool, activity_at: Optional[float] = None, now: Optional[float] = None) -> float:
+        """Apply one run's outcome. Returns the new interval (before jitter)."""
+        now = time.time() if now is None else now
+        if activity_at is not None and (self.last_activity is None or activity_at > self.last_activity):
+            self.last_activity = activity_at
+
+        if not ok:
+            self.errors += 1
+            self.interval = min(self.interval * 2, self.max_interval)
+        elif self.last_activity is not None and now - self.last_activity < self.active_window:
+            self.errors = 0
+            self.interval = self.min_interval
+        else:
+            self.errors = 0
+            self.interval = min(self.interval * self.factor, self.max_interval)
+        return self.interval
+
+    def next_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+class Scheduler:
+    """
+    In-process poller. Each job runs on its own adaptive interval; results of
+    externally triggered runs (the HTTP endpoints) can be fed in with report()
+    so they shape the cadence too.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._intervals: Dict[str, AdaptiveInterval] = {}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._wake: Dict[str, asyncio.Event] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add_job(self, name: str, job: Job, interval: AdaptiveInterval) -> None:
+        self._jobs[name] = job
+        self._intervals[name] = interval
+        self._state[name] = {"runs": 0, "failures": 0, "last_run": None, "next_run": None}
+
+    def start(self) -> None:
+        for name in self._jobs:
+            if name not in self._tasks:
+                self._wake[name] = asyncio.Event()
+                self._tasks[name] = asyncio.create_task(self._run(name), name=f"scheduler-{name}")
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def report(self, name: str, ok: bool, activity_at: Optional[float] = None) -> None:
+        """Feed in the outcome of a run made outside the scheduler."""
+        interval = self._intervals.get(name)
+        if interval is None:
+            return
+        before = interval.interval
+        if interval.record(ok, activity_at) < before and name in self._wake:
+            # Activity spotted elsewhere; do not sit out a long quiet delay
+            self._wake[name].set()
+
+    def get_status(self) -> Dict[str, Any]:
+        now = time.time()
+        jobs = {}
+        for name, interval in self._intervals.items():
+            state = self._state[name]
+            jobs[name] = {
+                "interval": round(interval.interval, 2),
+                "min_interval": interval.min_interval,
+                "max_interval": interval.max_interval,
+                "active": interval.last_activity is not None and now - interval.last_activity < interval.active_window,
+                "last_activity": interval.last_activity,
+                "consecutive_errors": interval.errors,
+                "runs": state["runs"],
+                "failures": state["failures"],
+                "last_run": state["last_run"],
+                "next_run_in": round(max(0.0, state["next_run"] - now), 2) if state["next_run"] else None,
+            }
+        return {"running": self.running, "jobs": jobs}
+
+    async def _run(self, name: str) -> None:
+        job, interval, state, wake = self._jobs[name], self._intervals[name], self._state[name], self._wake[name]
+        while True:
+            wake.clear()
+            try:
+                ok, activity_at = await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled job {name} failed: {e}")
+                ok, activity_at = False, None
+
+            state["runs"] += 1
+            state["failures"] += 0 if ok else 1
+            state["last_run"] = time.time()
+            interval.record(ok, activity_at)
+
+            # Re-plan if report() shortens the interval while we wait
+            delay = interval.next_delay()
+            state["next_run"] = state["last_run"] + delay
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), max(0.0, state["next_run"] - time.time()))
+                except asyncio.TimeoutError:
+                    break
+                wake.clear()
+                state["next_run"] = min(state["next_run"], state["last_run"] + interval.next_delay())
@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls of an async function returning a dict.
+    - While a call is running, other callers wait for it instead of starting
+      their own (one upstream fetch, one evaluation, one notification).
+    - Its result is then reused for `ttl` seconds.
+    Reused results are shallow copies with 'source' set to "in_flight" or "cache".
+    """
+
+    def __init__(self, fn: Callable[[], Awaitable[Dict[str, Any]]], ttl: float = 0,
+                 cache_if: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.fn = fn
+        self.ttl = ttl
+        # Results failing this check are shared with waiting callers but not cached
+        self.cache_if = cache_if
+        self.calls = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._task: Optional[asyncio.Future] = None
+        self._result: Optional[Dict[str, Any]] = None
+        self._result_at = 0.0
+
+    async def __call__(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """max_age: oldest cached result (seconds) this caller accepts; defaults to ttl."""
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        if self._result is not None and time.monotonic() - self._result_at < max_age:
+            self.cache_hits += 1
+            return {**self._result, "source": "cache"}
+
+        if self._task is not None and not self._task.done():
+            self.coalesced += 1
+            # Shielded: a caller giving up must not cancel the call for the others
+            return {**await asyncio.shield(self._task), "source": "in_flight"}
+
+        self.calls += 1
+        self._task = task = asyncio.ensure_future(self._run())
+        return await asyncio.shield(task)
+
+    def invalidate(self) -> None:
+        self._result = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "cache_hits": self.cache_hits, "ttl": self.ttl}
+
+    async def _run(self) -> Dict[str, Any]:
+        result = await self.fn()
+        if self.ttl > 0 and (self.cache_if is None or self.cache_if(result)):
+            self._result, self._result_at = result, time.monotonic()
+        else:
+            self._result = None
+        return result
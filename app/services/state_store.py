@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+class StateStore:
+    """Small key/value store for state that must survive restarts."""
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            self.set(key, value)
+
+    def compare_and_swap(self, key: str, expected: Any, new: Any,
+                         extra: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Set key to new only if it currently equals expected.
+        extra holds other keys written in the same step on success.
+        Returns True on success.
+        """
+        raise NotImplementedError
+
+class InMemoryStateStore(StateStore):
+    """Process-local store, mainly for tests."""
+
+    def __init__(self, initial: Optional[Dict[str, Any]] = None):
+        self._data = dict(initial or {})
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+
+    def update(self, values: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data.update(values)
+
+    def compare_and_swap(self, key: str, expected: Any, new: Any,
+                         extra: Optional[Dict[str, Any]] = None) -> bool:
+        with self._lock:
+            if self._data.get(key) != expected:
+                return False
+            self._data.update(extra or {})
+            self._data[key] = new
+            return True
+
+class JsonFileStateStore(StateStore):
+    """
+    JSON document on disk shared by every worker process.
+    Reads are served from memory and only re-parsed when the file's stat
+    signature changes. Writes take an exclusive lock file, re-read the latest
+    document and replace it atomically (write to temp file + rename).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._cache: Dict[str, Any] = {}
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._thread_lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._read().get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def update(self, values: Dict[str, Any]) -> None:
+        with self._locked():
+            data = self._read()
+            self._write({**data, **values})
+
+    def compare_and_swap(self, key: str, expected: Any, new: Any,
+                         extra: Optional[Dict[str, Any]] = None) -> bool:
+        with self._locked():
+            data = self._read()
+            if data.get(key) != expected:
+                logger.info(f"State '{key}' changed concurrently; skipping update")
+                return False
+            self._write({**data, **(extra or {}), key: new})
+            return True
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _read(self) -> Dict[str, Any]:
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return self._cache
+
+        if signature is None:
+            data = {}
+        else:
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.warning(f"Failed to load state file: {e}")
+                data = {}
+
+        self._cache, self._signature = data, signature
+        return data
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._cache, self._signature = data, self._stat_signature()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock across threads and processes."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._thread_lock, open(self.lock_path, "a+") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,116 @@
+import logging
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .state_store import StateStore, JsonFileStateStore
+
+logger = logging.getLogger(__name__)
+
+# Pseudo-area for subscribers without areas: matched against the event's maxScale
+NATIONWIDE = "*"
+
+# Shared empty value, so an empty registry does not rebuild the index every call
+_NO_SUBSCRIBERS: Dict[str, Dict] = {}
+
+class RegionIndex:
+    """
+    Precomputed area -> subscriber index for per-event recipient selection.
+    Each area maps to subscriber IDs sorted by their scale threshold, so all
+    subscribers of an area that saw scale S are a prefix found by bisect.
+    """
+
+    def __init__(self, subscribers: Dict[str, Dict[str, Any]], static_ids: Iterable[str] = ()):
+        entries: Dict[str, List[Tuple[int, str]]] = {}
+        for subscriber_id in static_ids:
+            entries.setdefault(NATIONWIDE, []).append((0, subscriber_id))
+        for subscriber_id, attributes in subscribers.items():
+            min_scale = attributes.get("min_scale", 0)
+            for area in attributes.get("areas") or [NATIONWIDE]:
+                entries.setdefault(area, []).append((min_scale, subscriber_id))
+
+        self._thresholds: Dict[str, List[int]] = {}
+        self._ids: Dict[str, List[str]] = {}
+        for area, items in entries.items():
+            items.sort()
+            self._thresholds[area] = [threshold for threshold, _ in items]
+            self._ids[area] = [subscriber_id for _, subscriber_id in items]
+
+    def recipients_for(self, quake: Dict[str, Any]) -> List[str]:
+        """Subscribers whose area observed at least their threshold scale."""
+        thresholds = self._thresholds
+
+        # Highest scale seen per indexed area (prefecture or city name)
+        area_max: Dict[str, int] = {}
+        for point in quake.get("points") or ():
+            scale = point.get("scale", -1)
+            for area in (point.get("pref"), point.get("addr")):
+                if area in thresholds and scale > area_max.get(area, -1):
+                    area_max[area] = scale
+        if NATIONWIDE in thresholds:
+            area_max[NATIONWIDE] = quake["earthquake"]["maxScale"]
+
+        recipients = set()
+        for area, scale in area_max.items():
+            matched = bisect_right(thresholds[area], scale)
+            if matched:
+                recipients.update(self._ids[area][:matched])
+        return list(recipients)
+
+class SubscriberRegistry:
+    """
+    Registry of LINE users/groups that receive alerts.
+    Subscribers are stored as {"id": {...}} under the "subscribers" key of a
+    state store (data/subscribers.json by default). Static IDs from the
+    environment are always included.
+    """
+
+    def __init__(self, path: str = "data/subscribers.json", static_ids: Iterable[Optional[str]] = (),
+                 state_store: Optional[StateStore] = None):
+        self.state_store = state_store or JsonFileStateStore(path)
+        self.static_ids = [i for i in static_ids if i]
+        self._index: Optional[RegionIndex] = None
+        self._indexed_from: Optional[Dict] = None
+
+    def add(self, subscriber_id: str, **attributes) -> None:
+        """
+        Register a subscriber. Optional attributes:
+            areas: prefecture or city names (as in the 551 "points" data); all areas if omitted
+            min_scale: lowest scale (API units, 30 = 震度3) that triggers an alert
+        """
+        subscribers = dict(self._load())
+        subscribers[subscriber_id] = attributes
+        self.state_store.set("subscribers", subscribers)
+
+    def remove(self, subscriber_id: str) -> bool:
+        subscribers = dict(self._load())
+        if subscriber_id not in subscribers:
+            return False
+        del subscribers[subscriber_id]
+        self.state_store.set("subscribers", subscribers)
+        return True
+
+    def all_ids(self) -> List[str]:
+        """Every recipient, static IDs first, without duplicates."""
+        ids = dict.fromkeys(self.static_ids)
+        ids.update(dict.fromkeys(self._load()))
+        return list(ids)
+
+    def recipients_for(self, quake: Dict[str, Any]) -> List[str]:
+        """Recipients for a qualifying 551 event, filtered by area and threshold."""
+        return self.region_index().recipients_for(quake)
+
+    def region_index(self) -> RegionIndex:
+        """The index, rebuilt only when the stored subscribers changed."""
+        subscribers = self._load()
+        # The state store hands back the same object until the file changes
+        if self._index is None or subscribers is not self._indexed_from:
+            self._index = RegionIndex(subscribers, self.static_ids)
+            self._indexed_from = subscribers
+        return self._index
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            return self.state_store.get("subscribers") or _NO_SUBSCRIBERS
+        except Exception as e:
+            logger.warning(f"Failed to load subscribers: {e}")
+            return _NO_SUBSCRIBERS
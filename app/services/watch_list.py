@@ -0,0 +1,146 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+WATCH_FILE_SUFFIXES = (".json", ".yaml", ".yml")
+
+class WatchTarget:
+    """
+    One monitored URL.
+    interval: minimum seconds between probes (None = every patrol)
+    timeout: seconds the probe may take (None = the service's target_deadline)
+    expected_status: status codes counted as healthy
+    """
+
+    __slots__ = ("name", "url", "interval", "timeout", "expected_status")
+
+    def __init__(self, name: str, url: str, interval: Optional[float] = None, timeout: Optional[float] = None,
+                 expected_status: Union[int, Iterable[int]] = 200):
+        self.name = name
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.expected_status = (
+            (int(expected_status),) if isinstance(expected_status, (int, str))
+            else tuple(int(code) for code in expected_status)
+        )
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc.lower()
+
+    def __repr__(self) -> str:
+        return f"WatchTarget({self.name!r}, {self.url!r})"
+
+WatchList = Union[Dict[str, Optional[str]], List[WatchTarget]]
+
+def as_targets(watch_list: WatchList) -> List[WatchTarget]:
+    """Targets with a URL, from a {name: url} dict (like config.WATCH_LIST) or a target list."""
+    if isinstance(watch_list, dict):
+        return [WatchTarget(name, url) for name, url in watch_list.items() if url]
+    return [target for target in watch_list if target.url]
+
+def load_watch_list(path: str) -> List[WatchTarget]:
+    """
+    Load targets from a JSON/YAML file, or from every such file in a directory
+    (in name order). A file holds either a list of targets, a {name: url or
+    target} mapping, or {"defaults": {...}, "targets": [...]}.
+    A target is {"name", "url", "interval", "timeout", "expected_status"}.
+    Raises ValueError for malformed files or duplicate names.
+    """
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.endswith(WATCH_FILE_SUFFIXES)
+        )
+    else:
+        files = [path]
+
+    targets: List[WatchTarget] = []
+    seen: Dict[str, str] = {}
+    for file in files:
+        for target in _parse_file(file):
+            if target.name in seen:
+                raise ValueError(f"{file}: duplicate target {target.name!r} (also in {seen[target.name]})")
+            seen[target.name] = file
+            targets.append(target)
+    logger.info(f"📋 Loaded {len(targets)} watch targets from {len(files)} file(s)")
+    return targets
+
+def _parse_file(file: str) -> List[WatchTarget]:
+    with open(file, "r", encoding="utf-8") as f:
+        if file.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError(f"{file}: PyYAML is required for YAML watch lists (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    defaults: Dict[str, Any] = {}
+    if isinstance(data, dict) and "targets" in data:
+        defaults = data.get("defaults") or {}
+        data = data["targets"]
+    if isinstance(data, dict):
+        data = [
+            {"name": name, **(entry if isinstance(entry, dict) else {"url": entry})}
+            for name, entry in data.items()
+        ]
+    if not isinstance(data, list):
+        raise ValueError(f"{file}: expected a list or mapping of targets")
+
+    targets = []
+    for i, entry in enumerate(data or []):
+        entry = {**defaults, **entry} if isinstance(entry, dict) else entry
+        if not isinstance(entry, dict) or not entry.get("name") or not entry.get("url"):
+            raise ValueError(f"{file}: target #{i + 1} needs a name and a url")
+        try:
+            targets.append(WatchTarget(
+                str(entry["name"]), entry["url"],
+                interval=_optional_float(entry.get("interval")),
+                timeout=_optional_float(entry.get("timeout")),
+                expected_status=entry.get("expected_status", 200),
+            ))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{file}: target {entry['name']!r}: {e}")
+    return targets
+
+def _optional_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+class HashRing:
+    """
+    Consistent hashing of target names onto nodes. Each node owns `replicas`
+    points on the ring, so adding or removing a node only moves the targets
+    between it and its neighbours.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 100):
+        self.nodes = sorted(set(nodes))
+        if not self.nodes:
+            raise ValueError("HashRing needs at least one node")
+        points: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        i = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._owners[i]
+
+    def shard(self, targets: List[WatchTarget], node: str) -> List[WatchTarget]:
+        """The targets owned by node, in their original order."""
+        return [target for target in targets if self.node_for(target.name) == node]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        # Stable across processes, unlike hash()
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
@@ -0,0 +1,392 @@
+"""
+Benchmark suite for the Meerkat Quake Bot.
+
+Starts local stand-ins for the P2P Quake history API, the LINE Messaging API
+and a set of monitored sites, serves the real FastAPI app with uvicorn, and
+drives /check_quake and /check_health over HTTP.
+
+Usage (from the repository root):
+    python -m benchmarks.run                     # run and compare with baseline.json
+    python -m benchmarks.run --update-baseline   # run and store the results as the new baseline
+    python -m benchmarks.run --scenario health --latency-ms 50 --error-rate 0.1
+    python -m benchmarks.run --scenario cold_start --cold-starts 10
+    python -m benchmarks.run --scenario parse --parse-events 100 --points 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from urllib.error import URLError
+from urllib.request import urlopen
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+import aiohttp  # noqa: E402
+import uvicorn  # noqa: E402
+
+from benchmarks.stand_ins import P2PQuakeStandIn, LineStandIn, SiteStandIn  # noqa: E402
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+TARGET_USER_ID = "U" + "0" * 32
+
+# A change is reported as a regression when it is worse than the baseline by this ratio
+REGRESSION_THRESHOLD = 0.2
+# Counts of failures, compared exactly
+COUNT_KEYS = ("missed", "errors")
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+async def load(url: str, requests: int, concurrency: int) -> Dict[str, float]:
+    """Send `requests` GETs with at most `concurrency` in flight."""
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(latencies, elapsed, errors)
+
+class Bench:
+    """Stand-ins plus the app served on a local port."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.p2p = P2PQuakeStandIn(
+            events=args.events, points=args.points,
+            latency_ms=args.latency_ms, error_rate=args.error_rate,
+        ).start()
+        self.line = LineStandIn(latency_ms=args.latency_ms, error_rate=args.error_rate).start()
+        self.sites = SiteStandIn(latency_ms=args.latency_ms, error_rate=args.error_rate).start()
+
+        # The app reads its configuration at import time
+        self.workdir = tempfile.mkdtemp(prefix="meerkat-bench-")
+        os.environ.update(bench_env(self.p2p, self.line, args.events))
+        os.chdir(self.workdir)
+
+        from app import main as app_main
+        self.app_main = app_main
+        app_main.WATCH_LIST = {
+            f"site{i}": f"{self.sites.base_url}/site/{i}" for i in range(args.targets)
+        }
+
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app_main.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="bench-app", daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+        for stand_in in (self.p2p, self.line, self.sites):
+            stand_in.stop()
+
+    def quake_unchanged(self) -> Dict[str, Any]:
+        """Polls where upstream has nothing new (the common case)."""
+        asyncio.run(load(f"{self.base_url}/check_quake", 1, 1))  # Notify the current event once
+        return asyncio.run(load(f"{self.base_url}/check_quake", self.args.requests, self.args.concurrency))
+
+    def quake_new_event(self) -> Dict[str, Any]:
+        """Delay from an event appearing upstream to the LINE stand-in receiving the push."""
+        delays: List[float] = []
+        missed = 0
+
+        for _ in range(self.args.rounds):
+            received_before = len(self.line.received)
+            event_id = self.p2p.publish()
+            asyncio.run(load(f"{self.base_url}/check_quake", 1, 1))
+
+            deadline = time.time() + 5
+            while len(self.line.received) == received_before and time.time() < deadline:
+                time.sleep(0.001)
+            if len(self.line.received) == received_before:
+                missed += 1
+                continue
+            delays.append(self.line.received[received_before]["at"] - self.p2p.published_at[event_id])
+
+        return {
+            "rounds": self.args.rounds,
+            "missed": missed,
+            "p50_ms": round(percentile(delays, 50) * 1000, 2),
+            "p99_ms": round(percentile(delays, 99) * 1000, 2),
+        }
+
+    def health(self) -> Dict[str, Any]:
+        result = asyncio.run(load(f"{self.base_url}/check_health", self.args.requests, self.args.concurrency))
+        result["targets"] = self.args.targets
+        return result
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bench_env(p2p: P2PQuakeStandIn, line: LineStandIn, events: int) -> Dict[str, str]:
+    """Environment pointing the app at the stand-ins."""
+    return {
+        "LINE_CHANNEL_ACCESS_TOKEN": "bench-token",
+        "TARGET_USER_ID": TARGET_USER_ID,
+        "LINE_API_ENDPOINT": line.base_url,
+        "P2P_API_URL": p2p.url,
+        "P2P_HISTORY_LIMIT": str(events),
+        "HTTP_RETRY_TOTAL": "0",
+        "NOTIFY_BACKOFF_MAX": "0.5",
+        # Every request measures a real check; back-to-back polls must not reuse a result
+        "QUAKE_RESULT_TTL": "0",
+        # The site stand-in serves every target from one host
+        "HEALTH_PER_HOST_CONCURRENCY": "10",
+    }
+
+def cold_start(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Start the app in a fresh process, as a scale-to-zero platform would, and measure
+    the time from spawning it to the first response and to the first /check_quake.
+    """
+    p2p = P2PQuakeStandIn(events=args.events, points=args.points, latency_ms=args.latency_ms).start()
+    line = LineStandIn(latency_ms=args.latency_ms).start()
+    env = {**os.environ, **bench_env(p2p, line, args.events), "PYTHONPATH": str(REPO_ROOT)}
+    ready, first_check, imports = [], [], []
+
+    try:
+        for _ in range(args.cold_starts):
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            workdir = tempfile.mkdtemp(prefix="meerkat-cold-")
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                while True:
+                    try:
+                        urlopen(f"{base_url}/", timeout=1).read()
+                        break
+                    except (URLError, ConnectionError):
+                        if process.poll() is not None or time.perf_counter() - start > 30:
+                            raise RuntimeError("App did not start")
+                        time.sleep(0.005)
+                ready.append(time.perf_counter() - start)
+
+                # The first real request may still be building services
+                urlopen(f"{base_url}/check_quake", timeout=30).read()
+                first_check.append(time.perf_counter() - start)
+
+                stats = json.loads(urlopen(f"{base_url}/startup_stats", timeout=5).read())
+                imports.append(stats["import_seconds"])
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        p2p.stop()
+        line.stop()
+
+    return {
+        "rounds": args.cold_starts,
+        "import_ms": round(percentile(imports, 50) * 1000, 1),
+        "ready_p50_ms": round(percentile(ready, 50) * 1000, 1),
+        "first_check_p50_ms": round(percentile(first_check, 50) * 1000, 1),
+        "first_check_max_ms": round(max(first_check) * 1000, 1),
+    }
+
+def region_index(args: argparse.Namespace) -> Dict[str, Any]:
+    """Recipient selection cost for one event against a large registry."""
+    from app.services.subscribers import RegionIndex
+
+    prefs = [f"県{i}" for i in range(47)]
+    subscribers = {
+        f"U{i:032d}": {"areas": [prefs[i % 47], f"市{i % 1000}"], "min_scale": 30 + (i % 3) * 10}
+        for i in range(args.subscribers)
+    }
+    index = RegionIndex(subscribers)
+    # A regional quake: observation points in a handful of prefectures
+    quake = {
+        "earthquake": {"maxScale": 50},
+        "points": [{"pref": prefs[i % 5], "addr": f"市{i}", "scale": 10 + (i % 5) * 10} for i in range(args.points)],
+    }
+
+    timings = []
+    for _ in range(200):
+        start = time.perf_counter()
+        recipients = index.recipients_for(quake)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "subscribers": args.subscribers,
+        "recipients": len(recipients),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+    }
+
+def parse(args: argparse.Namespace) -> Dict[str, Any]:
+    """Decode cost of a history response: plain json.loads vs the lean parser."""
+    from app.services.quake_parser import json_backend, parse_history
+
+    items = [
+        {
+            "_id": f"bench-{i}", "code": 551, "time": f"2024/01/01 00:{i // 60:02d}:{i % 60:02d}.000",
+            "earthquake": {"time": f"2024/01/01 00:{i // 60:02d}:{i % 60:02d}", "maxScale": 40,
+                           "hypocenter": {"name": "ベンチマーク沖", "magnitude": 5.0, "depth": 10},
+                           "domesticTsunami": "None", "foreignTsunami": "Unknown"},
+            "issue": {"source": "気象庁", "time": "2024/01/01 00:00:00", "type": "DetailScale"},
+            "points": [{"pref": f"県{p % 47}", "addr": f"市{p}", "isArea": False, "scale": 10 + (p % 4) * 10}
+                       for p in range(args.points)],
+        }
+        for i in range(args.parse_events)
+    ]
+    body = json.dumps(items, ensure_ascii=False).encode()
+
+    def measure(decode: Callable[[bytes], Any]) -> Dict[str, float]:
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            decode(body)
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        # Kept alive until the peak is read, like the evaluated list during a poll
+        data = decode(body)  # noqa: F841
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"ms": round(percentile(timings, 50) * 1000, 2), "peak_kb": round(peak / 1024)}
+
+    full = measure(json.loads)
+    lean = measure(parse_history)
+    return {
+        "events": args.parse_events,
+        "points": args.points,
+        "body_kb": round(len(body) / 1024),
+        "backend": json_backend(),
+        "full_ms": full["ms"],
+        "lean_ms": lean["ms"],
+        "full_peak_kb": full["peak_kb"],
+        "lean_peak_kb": lean["peak_kb"],
+    }
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Print current vs baseline and return the list of regressions."""
+    regressions = []
+    for scenario, metrics in results.items():
+        print(f"\n[{scenario}]")
+        base = baseline.get(scenario, {})
+        for key, value in metrics.items():
+            old = base.get(key)
+            if key in COUNT_KEYS and isinstance(value, (int, float)) and isinstance(old, (int, float)):
+                print(f"  {key:>18}: {value} (baseline {old})")
+                # Any missed alert or failed request more than the baseline is a regression
+                if value > old:
+                    regressions.append(f"{scenario}.{key}: {old} -> {value}")
+                continue
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                print(f"  {key:>18}: {value}")
+                continue
+            change = (value - old) / old
+            print(f"  {key:>18}: {value} (baseline {old}, {change:+.1%})")
+            worse = -change if key == "throughput_rps" else change
+            if key.endswith("_ms") or key == "throughput_rps":
+                if worse > REGRESSION_THRESHOLD:
+                    regressions.append(f"{scenario}.{key}: {old} -> {value}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append",
+                        choices=["quake_unchanged", "quake_new_event", "health", "region_index", "cold_start", "parse"],
+                        help="Scenario to run (repeatable). Default: all")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20, help="New events for quake_new_event")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Stand-in response latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stand-in requests answered with 503")
+    parser.add_argument("--events", type=int, default=1, help="Events per history response")
+    parser.add_argument("--points", type=int, default=300, help="Observation points per event")
+    parser.add_argument("--targets", type=int, default=20, help="Monitored sites for the health scenario")
+    parser.add_argument("--subscribers", type=int, default=20000, help="Registry size for region_index")
+    parser.add_argument("--cold-starts", type=int, default=5, help="Process starts for cold_start")
+    parser.add_argument("--parse-events", type=int, default=100, help="Events per body for parse")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or ["quake_unchanged", "quake_new_event", "health", "region_index", "cold_start", "parse"]
+    results: Dict[str, Dict[str, Any]] = {}
+
+    if "region_index" in scenarios:
+        results["region_index"] = region_index(args)
+    if "parse" in scenarios:
+        results["parse"] = parse(args)
+
+    # Before the in-process scenarios, which import the app into this process
+    if "cold_start" in scenarios:
+        results["cold_start"] = cold_start(args)
+
+    app_scenarios = [s for s in scenarios if s not in ("region_index", "cold_start", "parse")]
+    if app_scenarios:
+        bench = Bench(args)
+        try:
+            runners: Dict[str, Callable[[], Dict[str, Any]]] = {
+                "quake_unchanged": bench.quake_unchanged,
+                "quake_new_event": bench.quake_new_event,
+                "health": bench.health,
+            }
+            for scenario in app_scenarios:
+                results[scenario] = runners[scenario]()
+        finally:
+            bench.close()
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    regressions = compare(results, baseline)
+
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps({**baseline, **results}, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nBaseline written to {BASELINE_FILE}")
+    elif regressions:
+        print("\nRegressions (> {:.0%} worse than baseline):".format(REGRESSION_THRESHOLD))
+        for line in regressions:
+            print(f"  {line}")
+        if args.fail_on_regression:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Local stand-ins for the P2P Quake history API and the LINE Messaging API.
+Each runs an aiohttp server on its own event loop in a background thread,
+with configurable latency, error rate and payload size.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+JST = timezone(timedelta(hours=9))
+
+class StandInServer:
+    """aiohttp application served from a background thread."""
+
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.base_url: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def routes(self) -> List[web.RouteDef]:
+        raise NotImplementedError
+
+    def start(self) -> "StandInServer":
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start_site())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        started.wait(timeout=10)
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+    async def _start_site(self) -> None:
+        app = web.Application()
+        app.add_routes(self.routes())
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def simulate(self) -> Optional[web.Response]:
+        """Apply latency and return an error response for the configured share of requests."""
+        self.requests += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.json_response({"message": "stand-in error"}, status=503)
+        return None
+
+class P2PQuakeStandIn(StandInServer):
+    """
+    /v2/history returning `events` earthquake items (newest first),
+    each with `points` observation points. Supports ETag / 304.
+    """
+
+    def __init__(self, events: int = 1, points: int = 10, max_scale: int = 40, **kwargs):
+        super().__init__(**kwargs)
+        self.events = events
+        self.points = points
+        self.max_scale = max_scale
+        self.published_at: Dict[str, float] = {}
+        self._counter = 0
+        self._body = b"[]"
+        self._etag = '"0"'
+        self.publish()
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/v2/history?codes=551&limit={self.events}"
+
+    def publish(self) -> str:
+        """Add a new newest event. Returns its ID."""
+        self._counter += 1
+        now = datetime.now(JST)
+        items = [
+            self._make_event(f"bench-{self._counter}-{i}", now - timedelta(minutes=i))
+            for i in range(self.events)
+        ]
+        self._body = json.dumps(items, ensure_ascii=False).encode()
+        self._etag = '"' + hashlib.sha1(self._body).hexdigest() + '"'
+        self.published_at[items[0]["_id"]] = time.time()
+        return items[0]["_id"]
+
+    def _make_event(self, event_id: str, when: datetime) -> Dict[str, Any]:
+        return {
+            "_id": event_id,
+            "code": 551,
+            "time": when.strftime("%Y/%m/%d %H:%M:%S.000"),
+            "earthquake": {
+                "time": when.strftime("%Y/%m/%d %H:%M:%S"),
+                "maxScale": self.max_scale,
+                # Each publish is another quake; several may fall in the same second
+                "hypocenter": {"name": f"ベンチマーク沖{self._counter}", "magnitude": 5.0, "depth": 10,
+                               "latitude": 35.0, "longitude": 140.0},
+                "domesticTsunami": "None",
+                "foreignTsunami": "Unknown",
+            },
+            "issue": {"source": "気象庁", "time": when.strftime("%Y/%m/%d %H:%M:%S"), "type": "DetailScale"},
+            "points": [
+                {"pref": f"県{p % 47}", "addr": f"市{p}", "isArea": False, "scale": 10 + (p % 4) * 10}
+                for p in range(self.points)
+            ],
+        }
+
+    def routes(self) -> List[web.RouteDef]:
+        async def history(request: web.Request) -> web.Response:
+            error = await self.simulate()
+            if error is not None:
+                return error
+            if request.headers.get("If-None-Match") == self._etag:
+                return web.Response(status=304, headers={"ETag": self._etag})
+            return web.Response(body=self._body, content_type="application/json", headers={"ETag": self._etag})
+
+        return [web.get("/v2/history", history)]
+
+class LineStandIn(StandInServer):
+    """push / multicast endpoints that record when each message arrived."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.received: List[Dict[str, Any]] = []
+
+    def routes(self) -> List[web.RouteDef]:
+        async def message(request: web.Request) -> web.Response:
+            error = await self.simulate()
+            if error is not None:
+                return error
+            body = await request.json()
+            self.received.append({"at": time.time(), "to": body["to"], "messages": body["messages"]})
+            return web.json_response({})
+
+        return [
+            web.post("/v2/bot/message/push", message),
+            web.post("/v2/bot/message/multicast", message),
+        ]
+
+class SiteStandIn(StandInServer):
+    """Monitored websites: /site/{n} answers 200 (or 503 at the error rate)."""
+
+    def routes(self) -> List[web.RouteDef]:
+        async def site(request: web.Request) -> web.Response:
+            error = await self.simulate()
+            if error is not None:
+                return error
+            return web.Response(text="ok")
+
+        # web.get also answers HEAD
+        return [web.get("/site/{n}", site)]
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+from app.services.http_client import close_async_session
+from app.services.health_service import HealthService
+from app.services.line_notifier import LineNotifier
+from app.services.quake_service import QuakeService
+from app.services.state_store import InMemoryStateStore
+
+JST = timezone(timedelta(hours=9))
+
+async def start_server(routes):
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def test_check_quake_async_with_conditional_get():
+    quake = [{
+        "_id": "quake123",
+        "earthquake": {
+            "time": datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"),
+            "maxScale": 40,
+            "hypocenter": {"name": "Test Place", "magnitude": 5.0},
+            "domesticTsunami": "None"
+        }
+    }]
+
+    async def history(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.json_response(quake, headers={"ETag": '"v1"'})
+
+    async def scenario():
+        runner, base = await start_server([web.get("/v2/history", history)])
+        try:
+            service = QuakeService(f"{base}/v2/history", state_store=InMemoryStateStore())
+            return await service.check_quake_async(), await service.check_quake_async()
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    first, second = asyncio.run(scenario())
+
+    assert first["notify"] is True
+    assert "震度4" in first["message"]
+    assert second["status"] == "Not modified"
+
+def test_check_health_async_concurrent_and_ordered():
+    async def slow(request):
+        await asyncio.sleep(0.3)
+        return web.Response(status=500)
+
+    async def hung(request):
+        await asyncio.sleep(2)
+        return web.Response(status=200)
+
+    async def ok(request):
+        return web.Response(status=200)
+
+    async def scenario():
+        runner, base = await start_server([web.get("/slow", slow), web.get("/hung", hung), web.get("/ok", ok)])
+        try:
+            service = HealthService(max_concurrency=4, target_deadline=0.6)
+            watch_list = {
+                "Slow1": f"{base}/slow", "Hung": f"{base}/hung",
+                "OK": f"{base}/ok", "Slow2": f"{base}/slow",
+            }
+            start = time.monotonic()
+            errors = await service.check_health_async(watch_list)
+            return errors, time.monotonic() - start
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    errors, elapsed = asyncio.run(scenario())
+
+    assert elapsed < 1.5
+    assert errors == [
+        "⚠️ Slow1: Abnormal response (Code: 500)",
+        "❌ Hung: Access failed",
+        "⚠️ Slow2: Abnormal response (Code: 500)",
+    ]
+
+def test_check_health_async_head_probe_falls_back_to_get():
+    requests_seen = []
+
+    async def no_head(request):
+        requests_seen.append(request.method)
+        if request.method == "HEAD":
+            return web.Response(status=405)
+        return web.Response(body=b"x" * 1_000_000)
+
+    async def scenario():
+        runner, base = await start_server([web.route("*", "/page", no_head)])
+        try:
+            service = HealthService(probe_mode="head")
+            return await service.patrol_async({"Page": f"{base}/page"})
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    result = asyncio.run(scenario())
+
+    assert result["errors"] == []
+    assert requests_seen == ["HEAD", "GET"]
+
+def test_send_message_async():
+    received = []
+
+    async def push(request):
+        received.append((request.headers["Authorization"], await request.json()))
+        return web.json_response({})
+
+    async def scenario():
+        runner, base = await start_server([web.post("/v2/bot/message/push", push)])
+        try:
+            notifier = LineNotifier("token", "U123", endpoint=base)
+            return await notifier.send_message_async("hello")
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    assert asyncio.run(scenario()) is True
+    assert len(received) == 1
+    authorization, body = received[0]
+    assert authorization == "Bearer token"
+    assert body["to"] == "U123"
+    assert body["messages"] == [{"type": "text", "text": "hello"}]
+
+def test_check_quake_async_decides_off_the_event_loop():
+    quake = [{
+        "_id": "quake456",
+        "earthquake": {
+            "time": datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"),
+            "maxScale": 40,
+            "hypocenter": {"name": "Test Place", "magnitude": 5.0},
+            "domesticTsunami": "None"
+        }
+    }]
+
+    async def history(request):
+        return web.json_response(quake)
+
+    class SlowStore(InMemoryStateStore):
+        def compare_and_swap(self, *args, **kwargs):
+            time.sleep(0.3)
+            return super().compare_and_swap(*args, **kwargs)
+
+    async def ticker(ticks):
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def scenario():
+        runner, base = await start_server([web.get("/v2/history", history)])
+        ticks = []
+        task = asyncio.create_task(ticker(ticks))
+        try:
+            service = QuakeService(f"{base}/v2/history", state_store=SlowStore())
+            result = await service.check_quake_async()
+        finally:
+            task.cancel()
+            await close_async_session()
+            await runner.cleanup()
+        return result, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    result, longest_gap = asyncio.run(scenario())
+
+    assert result["notify"] is True
+    # The loop kept running while the state store was slow
+    assert longest_gap < 0.2
@@ -0,0 +1,98 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from app.services.coordination import InMemoryClaimStore, SqliteClaimStore
+from app.services.quake_service import QuakeService
+
+JST = timezone(timedelta(hours=9))
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    if request.param == "memory":
+        shared = InMemoryClaimStore()
+        return lambda: shared
+    # Each "node" opens the shared database on its own
+    return lambda: SqliteClaimStore(str(tmp_path / "claims.sqlite3"))
+
+def test_only_one_node_wins_a_claim(make_store):
+    stores = [make_store() for _ in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        won = list(pool.map(lambda i: stores[i].claim("quake:abc", f"node-{i}"), range(8)))
+
+    assert won.count(True) == 1
+    assert stores[0].owner_of("quake:abc") == f"node-{won.index(True)}"
+    assert stores[0].claim("quake:other", "node-0") is True
+
+def test_expired_claims_are_pruned(tmp_path):
+    store = SqliteClaimStore(str(tmp_path / "claims.sqlite3"), retention=60)
+    with patch("app.services.coordination.time.time", return_value=10000.0):
+        assert store.claim("quake:old", "node-a") is True
+
+    with patch("app.services.coordination.time.time", return_value=20000.0):
+        assert store.claim("quake:new", "node-a") is True
+
+    assert store.owner_of("quake:old") is None
+    assert store.owner_of("quake:new") == "node-a"
+
+def test_instances_with_separate_state_notify_once(tmp_path):
+    time_str = (datetime.now(JST) - timedelta(minutes=1)).strftime("%Y/%m/%d %H:%M:%S")
+    quake = {
+        "_id": "q1",
+        "earthquake": {
+            "time": time_str, "maxScale": 50, "domesticTsunami": "None",
+            "hypocenter": {"name": "Test Place", "magnitude": 6.0},
+        },
+    }
+    response = MagicMock(status_code=200)
+    response.json.return_value = [quake]
+    claims = InMemoryClaimStore()
+    # Each instance has its own last_quake.json, as on separate machines
+    nodes = [
+        QuakeService("http://mock-api", persistence_file=str(tmp_path / f"node{i}.json"),
+                     claims=claims, owner=f"node-{i}")
+        for i in range(3)
+    ]
+
+    with patch('requests.Session.get', return_value=response):
+        results = [node.check_quake() for node in nodes]
+
+    assert [r["notify"] for r in results] == [True, False, False]
+    assert results[1]["detail"] == "Claimed by another instance"
+    assert claims.owner_of(f"quake:{time_str}") == "node-0"
+
+def test_instances_seeing_different_reports_of_a_quake_notify_once(tmp_path):
+    time_str = (datetime.now(JST) - timedelta(minutes=1)).strftime("%Y/%m/%d %H:%M:%S")
+
+    def report(quake_id, scale, name, magnitude):
+        return {
+            "_id": quake_id,
+            "earthquake": {
+                "time": time_str, "maxScale": scale, "domesticTsunami": "None",
+                "hypocenter": {"name": name, "magnitude": magnitude},
+            },
+        }
+
+    claims = InMemoryClaimStore()
+    nodes = [
+        QuakeService("http://mock-api", persistence_file=str(tmp_path / f"node{i}.json"),
+                     claims=claims, owner=f"node-{i}")
+        for i in range(2)
+    ]
+
+    def check(node, quake):
+        response = MagicMock(status_code=200)
+        response.json.return_value = [quake]
+        with patch('requests.Session.get', return_value=response):
+            return node.check_quake()
+
+    # One node polled during the scale flash, the other only got the detailed report
+    first = [check(nodes[0], report("flash", 50, "", -1)), check(nodes[1], report("detail", 50, "Test Place", 6.0))]
+    assert [r["notify"] for r in first] == [True, False]
+    assert first[1]["detail"] == "Claimed by another instance"
+
+    # Each then gets its own revision raising the scale: one update between them
+    updates = [check(nodes[0], report("rev-a", 60, "Test Place", 6.1)), check(nodes[1], report("rev-b", 60, "Test Place", 6.2))]
+    assert [r["notify"] for r in updates] == [True, False]
+    assert updates[0]["status"] == "Earthquake Updated"
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from aiohttp import web
+from app.services.http_client import close_async_session
+from app.services.line_notifier import LineNotifier, DeliveryError
+from app.services.notification_queue import NotificationQueue, PRIORITY_QUAKE
+from app.services.subscribers import SubscriberRegistry
+
+async def start_line_stand_in(fail_first_multicast=False):
+    calls = {"multicast": [], "push": []}
+
+    async def multicast(request):
+        body = await request.json()
+        calls["multicast"].append(body["to"])
+        if fail_first_multicast and len(calls["multicast"]) == 1:
+            return web.json_response({"message": "Too many requests"}, status=429, headers={"Retry-After": "0"})
+        return web.json_response({})
+
+    async def push(request):
+        calls["push"].append((await request.json())["to"])
+        return web.json_response({})
+
+    app = web.Application()
+    app.add_routes([web.post("/v2/bot/message/multicast", multicast), web.post("/v2/bot/message/push", push)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", calls
+
+def test_fan_out_batches_users_and_pushes_groups():
+    recipients = [f"U{i:032d}" for i in range(1203)] + ["Cgroup1", "Rroom1"]
+
+    async def scenario():
+        runner, base, calls = await start_line_stand_in()
+        try:
+            notifier = LineNotifier("token", None, endpoint=base)
+            return await notifier.fan_out_async("hello", recipients), calls
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    results, calls = asyncio.run(scenario())
+
+    assert sorted(len(batch) for batch in calls["multicast"]) == [203, 500, 500]
+    assert sorted(calls["push"]) == ["Cgroup1", "Rroom1"]
+    assert [len(r["recipients"]) for r in results] == [500, 500, 203, 1, 1]
+    assert all(r["ok"] for r in results)
+
+def test_fan_out_retries_only_failed_batch(tmp_path):
+    recipients = [f"U{i:032d}" for i in range(700)]
+
+    async def scenario():
+        runner, base, calls = await start_line_stand_in(fail_first_multicast=True)
+        try:
+            notifier = LineNotifier("token", None, endpoint=base, multicast_concurrency=1)
+            queue = NotificationQueue(notifier.fan_out_async, str(tmp_path / "spool.jsonl"))
+            queue.enqueue("quake", PRIORITY_QUAKE, recipients)
+            queue.start()
+            assert await queue.drain(timeout=5)
+            await queue.stop()
+            return calls, queue.get_stats()
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    calls, stats = asyncio.run(scenario())
+
+    # First batch of 500 was rate limited and resent alone; the other 200 went out once
+    assert [len(batch) for batch in calls["multicast"]] == [500, 200, 500]
+    assert stats["delivered"] == 1
+    assert stats["last_batches"] == [{"batch": 0, "recipients": 500, "ok": True}]
+
+def test_subscriber_registry(tmp_path):
+    registry = SubscriberRegistry(str(tmp_path / "subscribers.json"), static_ids=["Utarget", None])
+    registry.add("Uuser1")
+    registry.add("Cgroup1")
+    registry.add("Utarget")
+
+    assert registry.all_ids() == ["Utarget", "Uuser1", "Cgroup1"]
+    assert registry.remove("Uuser1") is True
+    assert registry.remove("Uuser1") is False
+    assert SubscriberRegistry(str(tmp_path / "subscribers.json")).all_ids() == ["Cgroup1", "Utarget"]
+
+def make_quake(max_scale, points):
+    return {"earthquake": {"maxScale": max_scale}, "points": points}
+
+def test_region_index_filters_by_area_and_threshold(tmp_path):
+    registry = SubscriberRegistry(str(tmp_path / "subscribers.json"), static_ids=["Uadmin"])
+    registry.add("Utokyo3", areas=["東京都"], min_scale=30)
+    registry.add("Utokyo5", areas=["東京都"], min_scale=45)
+    registry.add("Usendai", areas=["仙台市青葉区"], min_scale=30)
+    registry.add("Ubig", min_scale=55)
+
+    quake = make_quake(45, [
+        {"pref": "宮城県", "addr": "仙台市青葉区", "scale": 45},
+        {"pref": "東京都", "addr": "東京千代田区", "scale": 30},
+        {"pref": "東京都", "addr": "東京新宿区", "scale": 20},
+    ])
+
+    assert sorted(registry.recipients_for(quake)) == ["Uadmin", "Usendai", "Utokyo3"]
@@ -0,0 +1,91 @@
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+from app.services.feed_handlers import EEWHandler, TsunamiHandler
+from app.services.quake_service import QuakeService
+from app.services.state_store import InMemoryStateStore
+
+JST = timezone(timedelta(hours=9))
+
+def now_str(minutes_ago=0):
+    return (datetime.now(JST) - timedelta(minutes=minutes_ago)).strftime("%Y/%m/%d %H:%M:%S")
+
+def make_tsunami(item_id, areas, cancelled=False, minutes_ago=0):
+    return {
+        "code": 552, "_id": item_id, "cancelled": cancelled,
+        "issue": {"time": now_str(minutes_ago), "type": "Focus"},
+        "areas": [{"grade": grade, "name": name, "immediate": False} for grade, name in areas],
+    }
+
+def make_eew(item_id, event_id, cancelled=False, test=False, minutes_ago=0):
+    return {
+        "code": 556, "_id": item_id, "test": test, "cancelled": cancelled,
+        "issue": {"time": now_str(minutes_ago), "eventId": event_id, "serial": item_id},
+        "earthquake": {"hypocenter": {"name": "石川県能登地方"}},
+        "areas": [{"pref": "石川県", "name": "石川県能登"}, {"pref": "富山県", "name": "富山県東部"}],
+    }
+
+def test_one_fetch_feeds_every_handler(tmp_path):
+    quake = {
+        "code": 551, "_id": "q1",
+        "earthquake": {"time": now_str(1), "maxScale": 50, "domesticTsunami": "Warning",
+                       "hypocenter": {"name": "石川県能登地方", "magnitude": 7.0}},
+    }
+    # Newest first, as returned by the history API
+    data = [make_tsunami("t1", [("Warning", "石川県能登")]), quake, make_eew("e1", "ev1")]
+    response = MagicMock(status_code=200)
+    response.json.return_value = data
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last.json"),
+                           feed_codes=[551, 552, 556])
+
+    with patch('requests.Session.get', return_value=response) as mock_get:
+        first = service.check_quake()
+        second = service.check_quake()
+
+    assert mock_get.call_count == 2
+    assert first["status"] == "Earthquake Detected"
+    assert [item["code"] for item in first["feed"]] == [556, 552]
+    assert "【津波警報】石川県能登" in first["feed"][1]["message"]
+    assert "石川県、富山県" in first["feed"][0]["message"]
+    # Each handler keeps its own dedupe state in the shared store
+    assert second["status"] == "Already notified" and "feed" not in second
+    assert set(service.state_store.get("sent_552")) and set(service.state_store.get("sent_556"))
+
+def test_tsunami_forecast_is_sent_when_its_content_changes():
+    handler = TsunamiHandler(InMemoryStateStore())
+
+    assert handler.handle(make_tsunami("t1", [("Watch", "岩手県")]))["notify"] is True
+    assert handler.handle(make_tsunami("t2", [("Watch", "岩手県")]))["status"] == "Already notified"
+
+    upgraded = handler.handle(make_tsunami("t3", [("Warning", "岩手県"), ("Watch", "宮城県")]))
+    assert upgraded["notify"] is True
+    assert upgraded["message"].index("【津波警報】岩手県") < upgraded["message"].index("【津波注意報】宮城県")
+
+    cancelled = handler.handle(make_tsunami("t4", [], cancelled=True))
+    assert "解除" in cancelled["message"]
+
+def test_tsunami_forecast_after_a_cancellation_is_sent_again():
+    handler = TsunamiHandler(InMemoryStateStore())
+    items = [
+        make_tsunami("t1", [("Watch", "岩手県")], minutes_ago=40),
+        make_tsunami("t2", [], cancelled=True, minutes_ago=30),
+        make_tsunami("t3", [("Watch", "岩手県")], minutes_ago=20),
+        make_tsunami("t4", [], cancelled=True, minutes_ago=10),
+    ]
+
+    # Each poll replays the history, oldest first
+    for n in range(1, len(items) + 1):
+        results = [handler.handle(item) for item in items[:n]]
+        assert [r["notify"] for r in results] == [False] * (n - 1) + [True]
+    # A repeated cancellation with nothing forecast in between is not
+    assert handler.handle(make_tsunami("t5", [], cancelled=True))["status"] == "Already notified"
+
+def test_early_warning_once_per_event_plus_cancellation():
+    handler = EEWHandler(InMemoryStateStore())
+
+    assert handler.handle(make_eew("e0", "ev0", test=True))["status"] == "Ignored"
+    assert handler.handle(make_eew("e1", "ev1", minutes_ago=30))["status"] == "Too old"
+    assert handler.handle(make_eew("e2", "ev2"))["notify"] is True
+    # Later serials of the same event are not re-sent
+    assert handler.handle(make_eew("e3", "ev2"))["notify"] is False
+    cancelled = handler.handle(make_eew("e4", "ev2", cancelled=True))
+    assert cancelled["notify"] is True and "取り消" in cancelled["message"]
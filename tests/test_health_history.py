@@ -0,0 +1,107 @@
+import asyncio
+import time
+from unittest.mock import patch
+from app.services.health_history import HealthHistory, UP, DOWN, DEGRADED
+from app.services.health_service import HealthService
+from app.services.http_client import AsyncResponse
+from app.services.state_store import InMemoryStateStore
+
+def sweep(history, ok, latency=0.1, at=None):
+    if ok:
+        return history.record_sweep([("Site", UP, None, latency)], at=at)
+    return history.record_sweep([("Site", DOWN, "❌ Site: Access failed", latency)], at=at)
+
+def test_alerts_only_on_confirmed_transitions():
+    history = HealthHistory(alert_after=2, flap_threshold=10)
+
+    assert sweep(history, True) == []
+    assert sweep(history, False) == []  # Not confirmed yet
+    assert sweep(history, False, at=1000) == ["❌ Site: Access failed"]
+    assert sweep(history, False) == []  # Still down: no repeat alert
+    assert sweep(history, True) == []
+    assert sweep(history, True, at=1600) == ["✅ Site: Recovered (down 10 min)"]
+
+def test_flapping_target_alerts_once_and_pauses():
+    history = HealthHistory(alert_after=1, flap_window=10, flap_threshold=4)
+
+    alerts = []
+    for ok in [False, True, False, True, False, True, False, True]:
+        alerts += sweep(history, ok)
+
+    # The fourth flip within the window marks it flapping; nothing is sent after that
+    assert alerts[:4] == ["❌ Site: Access failed", "✅ Site: Recovered"] * 2
+    assert alerts[4].startswith("🔁 Site: Unstable")
+    assert len(alerts) == 5
+    assert history.summary()["Site"]["flapping"] is True
+
+def test_summary_percentiles_and_state_survive_restart():
+    store = InMemoryStateStore()
+    history = HealthHistory(size=100, alert_after=1, state_store=store)
+    for i in range(100):
+        state = DOWN if i % 10 == 0 else DEGRADED if i % 10 == 1 else UP
+        history.record_sweep([("Site", state, None, (i + 1) / 1000)])
+
+    summary = history.summary()["Site"]
+    assert summary["samples"] == 100
+    assert summary["availability"] == 0.9
+    assert summary["degraded_ratio"] == 0.1
+    assert summary["p50_ms"] == 50.0
+    assert summary["p99_ms"] == 99.0
+
+    # A new process keeps the state machine, so the outage is not re-announced
+    restarted = HealthHistory(alert_after=1, state_store=store)
+    assert store.get("targets")["Site"]["state"] == UP
+    assert restarted.record_sweep([("Site", UP, None, 0.1)]) == []
+
+def test_streak_restarts_when_the_candidate_state_changes():
+    history = HealthHistory(alert_after=2, flap_threshold=10)
+    down = ("Site", DOWN, "❌ Site: Access failed", 0.1)
+    slow = ("Site", DEGRADED, "🐢 Site: Slow response (6.0s > 5s)", 6.0)
+
+    # One DOWN then one DEGRADED result do not confirm either state
+    assert history.record_sweep([down]) == []
+    assert history.record_sweep([slow]) == []
+    assert history.record_sweep([down]) == []
+    alerts = history.record_sweep([down])
+    assert alerts == ["❌ Site: Access failed"] and alerts[0].kind == DOWN
+
+def test_state_is_written_only_when_it_changes():
+    store = InMemoryStateStore()
+    history = HealthHistory(alert_after=1, flap_window=2, state_store=store)
+    with patch.object(store, "set", wraps=store.set) as store_set:
+        for latency in (0.1, 0.2, 0.3, 0.4):
+            history.record_sweep([("Site", UP, None, latency)])
+        assert store_set.call_count == 2  # new target, then its flap window filling up
+        assert sweep(history, False)[0].kind == DOWN
+        assert store_set.call_count == 3
+
+def test_async_patrol_records_off_the_event_loop():
+    class SlowStore(InMemoryStateStore):
+        def set(self, key, value):
+            time.sleep(0.3)
+            super().set(key, value)
+
+    service = HealthService(history=HealthHistory(state_store=SlowStore()))
+
+    async def request(method, url, timeout=None, read_body=True):
+        return AsyncResponse(200, {}, b"", url)
+
+    async def ticker(ticks):
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def scenario():
+        ticks = []
+        task = asyncio.create_task(ticker(ticks))
+        with patch("app.services.health_service.async_request", side_effect=request), \
+             patch.object(service, "_forget_dns"):
+            result = await service.patrol_async({"Site": "http://site.example.com"})
+        task.cancel()
+        return result, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    result, longest_gap = asyncio.run(scenario())
+
+    assert result["errors"] == []
+    # The new target's state was written while the loop kept running
+    assert longest_gap < 0.2
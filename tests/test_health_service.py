@@ -1,4 +1,5 @@
 import pytest
+import time
 from unittest.mock import MagicMock, patch
 from app.services.health_service import HealthService
 
@@ -7,7 +8,7 @@ def test_health_check_ok():
     mock_response = MagicMock()
     mock_response.status_code = 200
 
-    with patch('requests.get', return_value=mock_response):
+    with patch('requests.Session.get', return_value=mock_response):
         errors = service.check_health({"TestSite": "http://example.com"})
         assert len(errors) == 0
 
@@ -16,7 +17,7 @@ def test_health_check_fail():
     mock_response = MagicMock()
     mock_response.status_code = 500
 
-    with patch('requests.get', return_value=mock_response):
+    with patch('requests.Session.get', return_value=mock_response):
         errors = service.check_health({"TestSite": "http://example.com"})
         assert len(errors) == 1
         assert "Abnormal response" in errors[0]
@@ -24,7 +25,89 @@ def test_health_check_fail():
 def test_health_check_exception():
     service = HealthService()
 
-    with patch('requests.get', side_effect=Exception("Connection Error")):
+    with patch('requests.Session.get', side_effect=Exception("Connection Error")):
         errors = service.check_health({"TestSite": "http://example.com"})
         assert len(errors) == 1
         assert "Access failed" in errors[0]
+
+def test_health_check_runs_targets_concurrently():
+    service = HealthService(max_concurrency=4, target_deadline=5)
+    mock_response = MagicMock()
+    mock_response.status_code = 500
+
+    def slow_get(url, timeout=None):
+        time.sleep(0.3)
+        return mock_response
+
+    watch_list = {f"Site{i}": f"http://example{i}.com" for i in range(4)}
+
+    with patch('requests.Session.get', side_effect=slow_get):
+        start = time.monotonic()
+        errors = service.check_health(watch_list)
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 1.0
+    # Report order follows the watch list, not completion order
+    assert [e.split(":")[0] for e in errors] == [f"⚠️ Site{i}" for i in range(4)]
+
+def test_health_check_deadline_exceeded():
+    service = HealthService(max_concurrency=2, target_deadline=0.2)
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+
+    def get(url, timeout=None):
+        if "hung" in url:
+            time.sleep(1.0)
+        return mock_response
+
+    with patch('requests.Session.get', side_effect=get):
+        start = time.monotonic()
+        errors = service.check_health({"Hung": "http://hung.example.com", "Fine": "http://example.com"})
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.8
+    assert errors == ["❌ Hung: Access failed"]
+
+def test_head_probe_falls_back_to_streamed_get():
+    service = HealthService(probe_mode="head")
+    rejected = MagicMock(status_code=405)
+    streamed = MagicMock(status_code=200)
+    streamed.__enter__.return_value = streamed
+
+    with patch('requests.Session.head', return_value=rejected) as mock_head, \
+         patch('requests.Session.get', return_value=streamed) as mock_get:
+        errors = service.check_health({"TestSite": "http://example.com"})
+
+    assert errors == []
+    mock_head.assert_called_once()
+    assert mock_get.call_args.kwargs["stream"] is True
+
+def test_slow_target_is_degraded_not_failed():
+    service = HealthService(probe_mode="head", latency_slo=5, latency_slos={"Slow": 0.05})
+
+    def slow_head(url, **kwargs):
+        time.sleep(0.1)
+        return MagicMock(status_code=200)
+
+    with patch('requests.Session.head', side_effect=slow_head):
+        result = service.patrol({"Slow": "http://slow.example.com", "Fast": "http://example.com"})
+
+    assert result["errors"] == []
+    assert len(result["degraded"]) == 1
+    assert result["degraded"][0].startswith("🐢 Slow: Slow response")
+
+def test_dns_refresh_is_async_only():
+    service = HealthService()
+    targets = {"A": "http://a.example.com/1", "B": "http://a.example.com/2", "C": "https://c.example.com"}
+    connector = MagicMock()
+
+    with patch("app.services.health_service.get_async_session", return_value=MagicMock(connector=connector)):
+        # The sync patrol leaves DNS to the system resolver and never builds the aiohttp session
+        with patch('requests.Session.get', return_value=MagicMock(status_code=200)):
+            assert service.patrol(targets)["errors"] == []
+        connector.clear_dns_cache.assert_not_called()
+
+        service._forget_dns(list(targets.values()))
+
+    # One lookup per host per async patrol
+    assert sorted(c.args for c in connector.clear_dns_cache.call_args_list) == [("a.example.com", 80), ("c.example.com", 443)]
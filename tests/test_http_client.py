@@ -0,0 +1,31 @@
+from unittest.mock import MagicMock, patch
+from app.services import http_client
+from app.services.http_client import build_session, get_session, PooledLineHttpClient
+
+def test_build_session_per_host_pool_sizes():
+    session = build_session(pool_maxsize=10, host_pool_sizes={"api.p2pquake.net": 2}, retry_total=3)
+
+    quake_adapter = session.get_adapter("https://api.p2pquake.net/v2/history")
+    other_adapter = session.get_adapter("https://www.google.com")
+
+    assert quake_adapter._pool_maxsize == 2
+    assert other_adapter._pool_maxsize == 10
+    assert quake_adapter.max_retries.total == 3
+    # POST (LINE push) must never be retried automatically
+    assert "POST" not in quake_adapter.max_retries.allowed_methods
+
+def test_get_session_is_shared():
+    http_client.close_session()
+    assert get_session() is get_session()
+    http_client.close_session()
+
+def test_line_http_client_uses_shared_session():
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+
+    with patch('requests.Session.post', return_value=mock_response) as mock_post:
+        client = PooledLineHttpClient(timeout=(1, 2))
+        response = client.post("https://api.line.me/v2/bot/message/push", data="{}")
+
+        assert response.status_code == 200
+        assert mock_post.call_args.kwargs["timeout"] == (1, 2)
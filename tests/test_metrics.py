@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.metrics import Counter, Histogram, Registry, P2P_FETCH_SECONDS, P2P_PARSE_SECONDS
+from app.services.quake_service import QuakeService
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = Histogram("test_seconds", "Test latency.", ["target"], buckets=(0.1, 1.0), registry=registry)
+
+    histogram.observe(0.05, target="a")
+    histogram.observe(0.5, target="a")
+    histogram.observe(5, target="a")
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{target="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{target="a",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{target="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{target="a"} 3' in text
+    assert 'test_seconds_sum{target="a"} 5.55' in text
+
+def test_counter_escapes_label_values_and_checks_labels():
+    registry = Registry()
+    counter = Counter("test_total", "Test count.", ["status"], registry=registry)
+
+    counter.inc(status='Say "hi"')
+    counter.inc(2, status='Say "hi"')
+
+    assert 'test_total{status="Say \\"hi\\""} 3' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+def test_quake_fetch_records_fetch_and_parse_time():
+    service = QuakeService("http://mock-api", persistence_file="dummy_path.json")
+    response = MagicMock(status_code=200, headers={})
+    response.json.return_value = []
+    fetches, parses = P2P_FETCH_SECONDS.count(), P2P_PARSE_SECONDS.count()
+
+    with patch('requests.Session.get', return_value=response):
+        assert service.check_quake()["status"] == "No data"
+
+    assert P2P_FETCH_SECONDS.count() == fetches + 1
+    assert P2P_PARSE_SECONDS.count() == parses + 1
@@ -0,0 +1,160 @@
+import json
+import os
+import asyncio
+from unittest.mock import patch
+from app.services.notification_queue import NotificationQueue, PRIORITY_QUAKE, PRIORITY_HEALTH
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.headers = {"Retry-After": str(retry_after)}
+
+class Rejected(Exception):
+    status_code = 400
+
+def test_quake_alerts_are_delivered_before_health_alerts(tmp_path):
+    sent = []
+
+    async def send(text, recipients):
+        sent.append(text)
+        return True
+
+    async def scenario():
+        queue = NotificationQueue(send, str(tmp_path / "spool.jsonl"))
+        queue.enqueue("health", PRIORITY_HEALTH)
+        queue.enqueue("quake", PRIORITY_QUAKE)
+        queue.start()
+        assert await queue.drain(timeout=2)
+        await queue.stop()
+        return queue.get_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert sent == ["quake", "health"]
+    assert stats["depth"] == 0
+    assert stats["delivered"] == 2
+    assert stats["last_delivery_lag"] is not None
+
+def test_retry_after_and_permanent_failures(tmp_path):
+    calls = []
+
+    async def send(text, recipients):
+        calls.append(text)
+        if text == "bad":
+            raise Rejected("invalid message")
+        if calls.count("limited") == 1:
+            raise RateLimited(0.05)
+        return True
+
+    async def scenario():
+        queue = NotificationQueue(send, str(tmp_path / "spool.jsonl"))
+        queue.enqueue("limited", PRIORITY_QUAKE)
+        queue.enqueue("bad", PRIORITY_HEALTH)
+        queue.start()
+        assert await queue.drain(timeout=2)
+        await queue.stop()
+        return queue.get_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert calls.count("limited") == 2
+    assert calls.count("bad") == 1
+    assert (stats["delivered"], stats["dropped"], stats["retries"]) == (1, 1, 1)
+
+def test_undelivered_jobs_survive_restart(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    sent = []
+
+    async def failing_send(text, recipients):
+        raise ConnectionError("LINE unreachable")
+
+    async def send(text, recipients):
+        sent.append(text)
+        return True
+
+    async def before_restart():
+        queue = NotificationQueue(failing_send, spool, backoff_initial=10)
+        queue.enqueue("quake", PRIORITY_QUAKE)
+        queue.start()
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+    async def after_restart():
+        queue = NotificationQueue(send, spool)
+        queue.start()
+        assert await queue.drain(timeout=2)
+        await queue.stop()
+
+    asyncio.run(before_restart())
+    asyncio.run(after_restart())
+
+    assert sent == ["quake"]
+    # Delivered jobs are not replayed again
+    assert NotificationQueue(send, spool).get_stats()["depth"] == 0
+
+def test_spool_of_a_stopped_worker_is_adopted_by_one_worker_only(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    job = {"id": "j1", "text": "quake", "recipients": None, "priority": PRIORITY_QUAKE,
+           "enqueued_at": 0, "attempts": 0}
+    # Left behind by a worker that is gone (nothing holds its lock)
+    with open(spool + ".4242-dead", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "add", "job": job}) + "\n")
+
+    async def send(text, recipients):
+        return True
+
+    async def scenario():
+        # Several workers starting together; the running ones keep their spools locked
+        workers = [NotificationQueue(send, spool) for _ in range(3)]
+        depths = [w.get_stats()["depth"] for w in workers]
+        live = NotificationQueue(send, spool)
+        live.enqueue("health", PRIORITY_HEALTH)
+        late = NotificationQueue(send, spool)
+        late_depth = late.get_stats()["depth"]
+        for queue in workers + [live, late]:
+            await queue.stop()
+        return depths, late_depth
+
+    depths, late_depth = asyncio.run(scenario())
+
+    assert sorted(depths) == [0, 0, 1]
+    # A running worker's pending job is not taken over
+    assert late_depth == 0
+    assert not os.path.exists(spool + ".4242-dead")
+
+def test_worker_starting_while_another_publishes_its_spool_leaves_it_alone(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    job = {"id": "j1", "text": "quake", "recipients": None, "priority": PRIORITY_QUAKE,
+           "enqueued_at": 0, "attempts": 0}
+    with open(spool + ".4242-dead", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "add", "job": job}) + "\n")
+
+    async def send(text, recipients):
+        return True
+
+    started = []
+    replace = os.replace
+
+    def replace_then_start_another(src, dst):
+        replace(src, dst)
+        # A second worker starts right after the first published its spool
+        if not started:
+            started.append(None)
+            started[0] = NotificationQueue(send, spool)
+
+    async def scenario():
+        with patch("app.services.notification_queue.os.replace", side_effect=replace_then_start_another):
+            first = NotificationQueue(send, spool)
+        queues = [first, started[0]]
+        depths = [queue.get_stats()["depth"] for queue in queues]
+        files = sorted(os.listdir(tmp_path))
+        for queue in queues:
+            await queue.stop()
+        return depths, files
+
+    depths, files = asyncio.run(scenario())
+
+    # j1 is adopted once, and both spools stay on disk
+    assert sorted(depths) == [0, 1]
+    assert len(files) == 2 and not any(name.endswith((".tmp", "-dead")) for name in files)
@@ -0,0 +1,102 @@
+import json
+from unittest.mock import patch
+from app.services.quake_archive import QuakeArchive, iter_jsonl
+
+def make_quake(quake_id, time_str, max_scale, magnitude=5.0, region="Test Place"):
+    return {
+        "_id": quake_id,
+        "code": 551,
+        "earthquake": {
+            "time": time_str,
+            "maxScale": max_scale,
+            "hypocenter": {"name": region, "magnitude": magnitude, "depth": 10},
+            "domesticTsunami": "None"
+        }
+    }
+
+def test_later_report_replaces_earlier_one(tmp_path):
+    archive = QuakeArchive(str(tmp_path / "archive.bin"))
+
+    assert archive.add(make_quake("a", "2024/01/01 16:10:00", 30)) is True
+    # The same report again is a no-op
+    assert archive.add(make_quake("a", "2024/01/01 16:10:00", 30)) is False
+    # A detailed report for the same quake updates it
+    assert archive.add(make_quake("b", "2024/01/01 16:10:00", 70, magnitude=7.6)) is True
+
+    assert len(archive) == 1
+    assert archive.query()[0]["maxScale"] == 70
+    assert archive.query()[0]["magnitude"] == 7.6
+
+def test_quakes_at_the_same_time_are_kept_apart(tmp_path):
+    path = str(tmp_path / "archive.bin")
+    archive = QuakeArchive(path)
+    # The scale flash has no hypocenter yet; the first report naming it replaces it
+    archive.add(make_quake("flash", "2024/01/01 16:10:00", 70, region=""))
+    archive.add(make_quake("noto", "2024/01/01 16:10:00", 70, magnitude=7.6, region="石川県能登地方"))
+    # A different quake in the same second
+    archive.add(make_quake("chiba", "2024/01/01 16:10:00", 20, magnitude=3.2, region="千葉県東方沖"))
+    archive.add(make_quake("noto2", "2024/01/01 16:10:00", 70, magnitude=7.5, region="石川県能登地方"))
+
+    for a in (archive, QuakeArchive(path)):
+        assert len(a) == 2
+        assert sorted(q["id"] for q in a.query()) == ["chiba", "noto2"]
+        assert a.query(region="石川県能登地方")[0]["magnitude"] == 7.5
+
+def test_query_filters_and_reload(tmp_path):
+    path = str(tmp_path / "archive.bin")
+    archive = QuakeArchive(path)
+    # Added out of order
+    archive.add(make_quake("q2", "2024/02/01 00:00:00", 40, magnitude=6.1, region="石川県能登地方"))
+    archive.add(make_quake("q1", "2024/01/01 00:00:00", 20, magnitude=3.2, region="千葉県東方沖"))
+    archive.add(make_quake("q3", "2024/03/01 00:00:00", 50, magnitude=5.5, region="石川県能登地方"))
+
+    # Another process sees the same data from the file
+    reloaded = QuakeArchive(path)
+    assert [q["id"] for q in reloaded.query()] == ["q3", "q2", "q1"]
+    assert [q["id"] for q in reloaded.query(min_scale=40)] == ["q3", "q2"]
+    assert [q["id"] for q in reloaded.query(since="2024/01/15", until="2024/02/15")] == ["q2"]
+    assert [q["id"] for q in reloaded.query(region="石川県能登地方", min_magnitude=6)] == ["q2"]
+    assert [q["id"] for q in reloaded.query(limit=1)] == ["q3"]
+
+    # Appends made through the first instance are picked up on the next query
+    archive.add(make_quake("q4", "2024/04/01 00:00:00", 30))
+    assert reloaded.query(limit=1)[0]["id"] == "q4"
+
+def test_backfill_from_jsonl_and_stats(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    items = [make_quake(f"q{i}", f"2023/0{i % 9 + 1}/01 12:00:00", 10 * (i % 5 + 1), magnitude=2.5 + i % 4,
+                        region="A" if i % 2 else "B") for i in range(9)]
+    with open(dump, "w", encoding="utf-8") as f:
+        for item in items[:6]:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        # A line may hold a whole API page; other codes and broken lines are skipped
+        f.write(json.dumps(items[6:] + [{"code": 552, "_id": "t"}]) + "\n")
+        f.write("{broken\n")
+
+    archive = QuakeArchive(str(tmp_path / "archive.bin"))
+    assert archive.backfill(iter_jsonl(str(dump)), batch_size=4) == 9
+    assert archive.backfill(iter_jsonl(str(dump))) == 0
+
+    stats = archive.stats()
+    assert stats["count"] == 9
+    assert stats["first"] == "2023/01/01 12:00:00"
+    assert stats["by_region"] == {"B": 5, "A": 4}
+    assert sum(stats["by_scale"].values()) == 9
+    assert stats["by_magnitude"] == {"M2": 3, "M3": 2, "M4": 2, "M5": 2}
+    assert archive.stats(since="2024/01/01")["count"] == 0
+
+def test_correction_moves_row_between_region_and_scale_lists(tmp_path):
+    path = str(tmp_path / "archive.bin")
+    archive = QuakeArchive(path)
+    for i in range(3):
+        # The middle one is a scale flash, before the hypocenter is known
+        archive.add(make_quake(f"q{i}", f"2024/01/0{i + 1} 00:00:00", 30, region="" if i == 1 else "A"))
+    with patch.object(archive, "_reset", side_effect=AssertionError("rebuilt")):
+        # The detailed report names the hypocenter and revises the scale
+        assert archive.add(make_quake("q1b", "2024/01/02 00:00:00", 50, region="B")) is True
+
+    for reader in (archive, QuakeArchive(path)):
+        assert [q["id"] for q in reader.query(region="A")] == ["q2", "q0"]
+        assert [q["id"] for q in reader.query(region="B")] == ["q1b"]
+        assert [q["id"] for q in reader.query(min_scale=40)] == ["q1b"]
+        assert reader.stats()["by_region"] == {"A": 2, "B": 1}
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from app.services.quake_parser import LazyPoints, parse_history, parse_jst
+from app.services.quake_service import QuakeService
+
+def make_items():
+    return [
+        {"code": 552, "_id": "t1", "areas": [{"grade": "Watch", "name": "岩手県"}]},
+        {
+            "code": 551, "_id": "q1", "time": "2024/01/01 16:10:00.000",
+            "earthquake": {"time": "2024/01/01 16:10:00", "maxScale": 70,
+                           "hypocenter": {"name": "石川県能登地方", "magnitude": 7.6}, "domesticTsunami": "Warning"},
+            # Brackets and escaped quotes inside strings must not end the array early
+            "points": [{"pref": "石川県", "addr": "輪島市[門前]", "scale": 70},
+                       {"pref": "新潟県", "addr": "長岡市\"旧\"", "scale": 60}],
+            "issue": {"time": "2024/01/01 16:11:00"},
+        },
+    ]
+
+def test_points_are_decoded_only_when_read():
+    items = make_items()
+    for ensure_ascii in (True, False):
+        data = parse_history(json.dumps(items, ensure_ascii=ensure_ascii).encode())
+
+        points = data[1]["points"]
+        assert isinstance(points, LazyPoints) and repr(points) == "LazyPoints(pending)"
+        assert data[1]["issue"] == items[1]["issue"] and data[0] == items[0]
+        assert list(points) == items[1]["points"] and points[0]["scale"] == 70
+
+def test_unexpected_shapes_fall_back_to_a_full_decode():
+    nested = {"code": 551, "extra": {"points": [1, 2]}, "points": [[1], [2]]}
+    assert parse_history(json.dumps([nested]).encode()) == [nested]
+    assert parse_history(b'{"points": []}') == {"points": []}
+
+def test_recipients_are_picked_from_lazily_parsed_points(tmp_path):
+    now = datetime.now(timezone(timedelta(hours=9))).strftime("%Y/%m/%d %H:%M:%S")
+    items = make_items()
+    items[1]["earthquake"]["time"] = now
+    response = MagicMock(status_code=200, headers={}, content=json.dumps(items, ensure_ascii=False).encode())
+    seen = []
+
+    def recipient_filter(quake):
+        seen.append(quake["points"][1]["addr"])
+        return ["U1"]
+
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last.json"),
+                           recipient_filter=recipient_filter)
+    with patch('requests.Session.get', return_value=response):
+        result = service.check_quake()
+
+    assert result["status"] == "Earthquake Detected" and result["recipients"] == ["U1"]
+    assert seen == ['長岡市"旧"']
+    assert parse_jst(now) is parse_jst(now)
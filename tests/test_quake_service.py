@@ -1,7 +1,9 @@
 import pytest
 import json
-from unittest.mock import MagicMock, patch, mock_open
+from unittest.mock import MagicMock, patch
 from datetime import datetime, timedelta, timezone
+from app.services.coordination import DedupeWrites, InMemoryClaimStore
+from app.services.metrics import DEDUPE_FAILURES_TOTAL
 from app.services.quake_service import QuakeService
 
 @pytest.fixture
@@ -32,7 +34,7 @@ def test_check_quake_new_notification(quake_service):
     mock_response.json.return_value = mock_data
 
     # Mock persistence: Last ID was different (or None)
-    with patch('requests.get', return_value=mock_response), \
+    with patch('requests.Session.get', return_value=mock_response), \
          patch.object(QuakeService, '_load_last_quake_id', return_value="old_id"), \
          patch.object(QuakeService, '_save_last_quake_id') as mock_save:
 
@@ -42,8 +44,8 @@ def test_check_quake_new_notification(quake_service):
         assert "震度4" in result['message']
         assert result['status'] == "Earthquake Detected"
 
-        # Verify save was called with new ID
-        mock_save.assert_called_with("quake123")
+        # Verify save was called with new ID, guarded by the ID that was loaded
+        mock_save.assert_called_with("quake123", expected="old_id")
 
 def test_check_quake_already_notified(quake_service):
     # Mock response
@@ -66,7 +68,7 @@ def test_check_quake_already_notified(quake_service):
     mock_response.json.return_value = mock_data
 
     # Mock persistence: Last ID is SAME
-    with patch('requests.get', return_value=mock_response), \
+    with patch('requests.Session.get', return_value=mock_response), \
          patch.object(QuakeService, '_load_last_quake_id', return_value="quake123"), \
          patch.object(QuakeService, '_save_last_quake_id') as mock_save:
 
@@ -98,7 +100,7 @@ def test_check_quake_too_old(quake_service):
     }]
     mock_response.json.return_value = mock_data
 
-    with patch('requests.get', return_value=mock_response), \
+    with patch('requests.Session.get', return_value=mock_response), \
          patch.object(QuakeService, '_load_last_quake_id', return_value="diff_id"):
 
         result = quake_service.check_quake()
@@ -106,42 +108,43 @@ def test_check_quake_too_old(quake_service):
         assert result['notify'] is False
         assert result['status'] == "Too old"
 
-def test_persistence_methods(quake_service):
-    # Test _save_last_quake_id
-    with patch("builtins.open", mock_open()) as mock_file, \
-         patch("os.makedirs") as mock_makedirs, \
-         patch("app.services.quake_service.datetime") as mock_datetime:
-
-        mock_datetime.now.return_value.isoformat.return_value = "2023-01-01T12:00:00"
-
-        quake_service._save_last_quake_id("test_id")
-
-        mock_makedirs.assert_called_with("", exist_ok=True) # dirname of "dummy_path" is ""? No, "dummy_path.json" dirname is empty string.
-        # Actually os.path.dirname("dummy_path.json") is empty string.
-        # os.makedirs("") might fail or do nothing?
-        # Let's check logic: os.makedirs(os.path.dirname(...))
-        # If dirname is empty, makedirs might raise error or do nothing.
-        # But wait, local path "data/last_quake.json" has dirname "data".
-        # In test fixture I used "dummy_path.json".
-        # Using "data/dummy.json" is safer for test.
-
-    # Let's refine the test to use a path with dir
-    service = QuakeService("url", persistence_file="test_data/file.json")
-
-    with patch("builtins.open", mock_open()) as mock_file, \
-         patch("os.makedirs") as mock_makedirs:
-
-        service._save_last_quake_id("test_id")
-        mock_makedirs.assert_called_with("test_data", exist_ok=True)
-
-        handle = mock_file()
-        # Check written content
-        # It's hard to check exact json dump string because of formatting, but we can check if write was called.
-        assert handle.write.called
-
-    # Test _load_last_quake_id
-    with patch("os.path.exists", return_value=True), \
-         patch("builtins.open", mock_open(read_data='{"id": "saved_id"}')):
-
-        loaded_id = service._load_last_quake_id()
-        assert loaded_id == "saved_id"
+def test_persistence_methods(tmp_path):
+    path = tmp_path / "test_data" / "file.json"
+    service = QuakeService("url", persistence_file=str(path))
+
+    # Test _save_last_quake_id (creates the directory on first write)
+    assert service._save_last_quake_id("test_id") is True
+    assert json.loads(path.read_text())["id"] == "test_id"
+
+    # Test _load_last_quake_id from a fresh instance
+    assert QuakeService("url", persistence_file=str(path))._load_last_quake_id() == "test_id"
+
+    # Existing files written by older versions still load
+    path.write_text('{"id": "saved_id"}')
+    assert service._load_last_quake_id() == "saved_id"
+
+def test_save_last_quake_id_compare_and_swap(tmp_path):
+    path = str(tmp_path / "last_quake.json")
+    worker_a = QuakeService("url", persistence_file=path)
+    worker_b = QuakeService("url", persistence_file=path)
+
+    # Both workers saw the same old ID; only the first one may claim the new quake
+    assert worker_a._save_last_quake_id("quake1", expected=None) is True
+    assert worker_b._save_last_quake_id("quake1", expected=None) is False
+    assert worker_b._load_last_quake_id() == "quake1"
+
+def test_dedupe_store_failures_are_retried_then_follow_the_policy(tmp_path):
+    claims = MagicMock(spec=InMemoryClaimStore)
+    # A transient failure is retried and its answer used
+    claims.claim.side_effect = [OSError("database is locked"), False]
+    service = QuakeService("url", persistence_file=str(tmp_path / "last.json"), claims=claims,
+                           dedupe=DedupeWrites(retries=2, delay=0))
+    assert service._claim("q1") is False
+
+    claims.claim.side_effect = OSError("disk I/O error")
+    failures = DEDUPE_FAILURES_TOTAL.value(op="claim")
+    assert service._claim("q2") is True
+    service.dedupe.fail_open = False
+    assert service._claim("q3") is False
+    assert claims.claim.call_count == 2 + 3 + 3
+    assert DEDUPE_FAILURES_TOTAL.value(op="claim") == failures + 2
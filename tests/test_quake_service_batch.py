@@ -0,0 +1,80 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+from app.services.quake_service import QuakeService
+
+JST = timezone(timedelta(hours=9))
+
+def make_quake(quake_id, minutes_ago, max_scale):
+    time_str = (datetime.now(JST) - timedelta(minutes=minutes_ago)).strftime("%Y/%m/%d %H:%M:%S")
+    return {
+        "_id": quake_id,
+        "earthquake": {
+            "time": time_str,
+            "maxScale": max_scale,
+            "hypocenter": {"name": "Test Place", "magnitude": 5.0},
+            "domesticTsunami": "None"
+        }
+    }
+
+@pytest.fixture
+def quake_service(tmp_path):
+    return QuakeService("http://mock-api", persistence_file=str(tmp_path / "last_quake.json"))
+
+def mock_response(data):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = data
+    return response
+
+def test_batch_notifies_every_qualifying_event_oldest_first(quake_service):
+    # Newest first, as returned by the history API
+    data = [make_quake("q3", 1, 40), make_quake("q2", 5, 10), make_quake("q1", 10, 50)]
+
+    with patch('requests.Session.get', return_value=mock_response(data)):
+        result = quake_service.check_quakes()
+
+    assert result['notify'] is True
+    assert [r['id'] for r in result['results']] == ["q1", "q3"]
+    assert quake_service._load_cursor() == data[0]["earthquake"]["time"]
+
+def test_batch_skips_already_processed_events(quake_service):
+    first = [make_quake("q1", 10, 50)]
+    second = [make_quake("q2", 2, 40)] + first
+
+    with patch('requests.Session.get', return_value=mock_response(first)):
+        quake_service.check_quakes()
+
+    with patch('requests.Session.get', return_value=mock_response(second)):
+        result = quake_service.check_quakes()
+
+    assert [r['id'] for r in result['results']] == ["q2"]
+
+def test_batch_cursor_survives_restart(quake_service, tmp_path):
+    data = [make_quake("q2", 2, 40), make_quake("q1", 10, 50)]
+
+    with patch('requests.Session.get', return_value=mock_response(data)):
+        quake_service.check_quakes()
+
+    # A fresh instance has no in-memory IDs but resumes from the saved cursor
+    restarted = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last_quake.json"))
+    with patch('requests.Session.get', return_value=mock_response(data)):
+        result = restarted.check_quakes()
+
+    assert result['notify'] is False
+    assert result['results'] == []
+
+def test_batch_evaluates_a_correction_for_a_quake_before_the_cursor(quake_service):
+    older = make_quake("q1", 10, 40)
+    first = [make_quake("q2", 2, 40), older]
+
+    with patch('requests.Session.get', return_value=mock_response(first)):
+        quake_service.check_quakes()
+
+    # A detailed report of the older quake arrives after the newer quake
+    correction = {**older, "_id": "q1-detail", "earthquake": {**older["earthquake"], "maxScale": 55}}
+    with patch('requests.Session.get', return_value=mock_response([correction] + first)):
+        result = quake_service.check_quakes()
+
+    assert [(r['id'], r['status']) for r in result['results']] == [("q1-detail", "Earthquake Updated")]
+    assert quake_service._load_cursor() == first[0]["earthquake"]["time"]
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+from app.services.quake_service import QuakeService
+
+@pytest.fixture
+def quake_service():
+    return QuakeService("http://mock-api", persistence_file="dummy_path.json")
+
+def make_response(status_code, data=None, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = data
+    return response
+
+def small_quake():
+    JST = timezone(timedelta(hours=9))
+    return [{
+        "_id": "quake_small",
+        "earthquake": {
+            "time": datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"),
+            "maxScale": 10,
+            "hypocenter": {"name": "Test Place", "magnitude": 3.0},
+            "domesticTsunami": "None"
+        }
+    }]
+
+def test_conditional_get_short_circuits_on_304(quake_service):
+    first = make_response(200, small_quake(), {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+    second = make_response(304)
+
+    with patch('requests.Session.get', side_effect=[first, second]) as mock_get, \
+         patch.object(QuakeService, '_load_last_quake_id', return_value=None) as mock_load:
+
+        assert quake_service.check_quake()['status'] == "Small quake"
+        result = quake_service.check_quake()
+
+        assert result == {"notify": False, "status": "Not modified"}
+        sent_headers = mock_get.call_args_list[1].kwargs["headers"]
+        assert sent_headers["If-None-Match"] == '"v1"'
+        assert sent_headers["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+        # No persistence read and no JSON parsing on a 304
+        assert mock_load.call_count == 1
+        second.json.assert_not_called()
+
+    assert quake_service.get_cache_stats() == {"requests": 2, "not_modified": 1, "hit_rate": 0.5}
+
+def test_validators_not_kept_when_evaluation_fails(quake_service):
+    broken = make_response(200, [{"_id": "broken"}], {"ETag": '"v1"'})
+
+    with patch('requests.Session.get', return_value=broken), \
+         patch.object(QuakeService, '_load_last_quake_id', return_value=None):
+        assert quake_service.check_quake()['status'] == "Error"
+
+    with patch('requests.Session.get', return_value=broken) as mock_get, \
+         patch.object(QuakeService, '_load_last_quake_id', return_value=None):
+        quake_service.check_quake()
+        assert "If-None-Match" not in mock_get.call_args.kwargs["headers"]
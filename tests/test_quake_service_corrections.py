@@ -0,0 +1,91 @@
+import copy
+import pytest
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+from app.services.quake_service import QuakeService, _EventCache
+
+JST = timezone(timedelta(hours=9))
+TIME_STR = (datetime.now(JST) - timedelta(minutes=1)).strftime("%Y/%m/%d %H:%M:%S")
+
+def make_report(report_id, max_scale, tsunami="None", magnitude=5.0, place="Test Place"):
+    return {
+        "_id": report_id,
+        "earthquake": {
+            "time": TIME_STR,
+            "maxScale": max_scale,
+            "hypocenter": {"name": place, "magnitude": magnitude},
+            "domesticTsunami": tsunami
+        }
+    }
+
+@pytest.fixture
+def quake_service(tmp_path):
+    return QuakeService("http://mock-api", persistence_file=str(tmp_path / "last_quake.json"))
+
+def test_repeated_small_quake_is_a_cache_hit(quake_service):
+    report = make_report("small", 10)
+
+    with patch.object(QuakeService, "_evaluate_new", wraps=quake_service._evaluate_new) as evaluate_new:
+        results = [quake_service.process_event(copy.deepcopy(report)) for _ in range(3)]
+
+    assert [r["status"] for r in results] == ["Small quake"] * 3
+    assert evaluate_new.call_count == 1
+
+    # A scale correction of a skipped quake is its first alert
+    result = quake_service.process_event(make_report("small-2", 30))
+    assert result["status"] == "Earthquake Detected"
+    assert "update" not in result
+
+def test_corrections_send_updates_only_when_they_matter(quake_service):
+    assert quake_service.process_event(make_report("r1", 40, tsunami="Checking"))["notify"] is True
+
+    # Same content in a new report, a refined magnitude, a downgrade: no new alert
+    assert quake_service.process_event(make_report("r2", 40, tsunami="Checking"))["status"] == "Already notified"
+    assert quake_service.process_event(make_report("r3", 40, tsunami="Checking", magnitude=5.3))["notify"] is False
+    assert quake_service.process_event(make_report("r4", 30, tsunami="Checking"))["notify"] is False
+
+    # A scale upgrade is sent as a follow-up
+    upgrade = quake_service.process_event(make_report("r5", 50, tsunami="Checking"))
+    assert upgrade["status"] == "Earthquake Updated" and upgrade["update"] is True
+    assert "(続報)" in upgrade["message"]
+    assert "震度4 → 震度5強" in upgrade["message"]
+
+    # So is the tsunami answer, but not a return to "checking"
+    cleared = quake_service.process_event(make_report("r6", 50, tsunami="None"))
+    assert cleared["notify"] is True and "津波の心配なし" in cleared["message"]
+    assert quake_service.process_event(make_report("r7", 50, tsunami="Checking"))["notify"] is False
+    assert quake_service.process_event(make_report("r8", 50, tsunami="None"))["notify"] is False
+
+def test_quakes_in_the_same_second_are_kept_apart(quake_service):
+    # A scale flash has no hypocenter yet; the first report naming one continues it
+    assert quake_service.process_event(make_report("flash", 40, place="", magnitude=-1))["notify"] is True
+    assert quake_service.process_event(make_report("detail", 40, place="Here"))["notify"] is False
+
+    other = quake_service.process_event(make_report("other", 40, place="Elsewhere"))
+    assert other["status"] == "Earthquake Detected" and "update" not in other
+
+def test_only_new_or_changed_reports_are_archived(tmp_path):
+    archive = MagicMock()
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last_quake.json"), archive=archive)
+
+    for report_id in ("r1", "r1", "r2"):
+        service.process_event(make_report(report_id, 40))
+    service.process_event(make_report("r3", 50))
+
+    assert [call.args[0]["_id"] for call in archive.add.call_args_list] == ["r1", "r3"]
+
+def test_event_cache_is_bounded_and_expires():
+    cache = _EventCache(maxsize=2, ttl=60)
+    with patch("app.services.quake_service.time.monotonic", return_value=1000):
+        cache.put("a", {})
+        cache.put("b", {})
+        cache.get("a")
+        cache.put("c", {})
+
+    # "b" was the least recently used
+    with patch("app.services.quake_service.time.monotonic", return_value=1030):
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+    with patch("app.services.quake_service.time.monotonic", return_value=1061):
+        assert cache.get("c") is None
+    assert len(cache) == 1
@@ -30,7 +30,7 @@ def test_check_quake_small_scale_does_not_save_id(quake_service):
     mock_response.json.return_value = mock_data
 
     # Mock persistence
-    with patch('requests.get', return_value=mock_response), \
+    with patch('requests.Session.get', return_value=mock_response), \
          patch.object(QuakeService, '_load_last_quake_id', return_value="diff_id"), \
          patch.object(QuakeService, '_save_last_quake_id') as mock_save:
 
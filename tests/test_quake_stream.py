@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from websockets.asyncio.server import serve
+from app.services.quake_service import QuakeService
+from app.services.quake_stream import QuakeStreamIngestor
+
+JST = timezone(timedelta(hours=9))
+
+def make_event(quake_id, max_scale=40):
+    return {
+        "code": 551,
+        "id": quake_id,
+        "earthquake": {
+            "time": datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"),
+            "maxScale": max_scale,
+            "hypocenter": {"name": "Test Place", "magnitude": 5.0},
+            "domesticTsunami": "None"
+        }
+    }
+
+def test_stream_events_are_notified_and_deduped(tmp_path):
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last.json"))
+    notified = []
+
+    async def on_notify(result):
+        notified.append(result)
+
+    async def handler(websocket):
+        await websocket.send(json.dumps({"code": 555}))  # unrelated feed item
+        await websocket.send(json.dumps(make_event("s1")))
+        await websocket.send(json.dumps(make_event("s1")))  # duplicate push
+        await websocket.send(json.dumps(make_event("s2", max_scale=10)))
+        await asyncio.sleep(1)
+
+    async def scenario():
+        async with serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            ingestor = QuakeStreamIngestor(f"ws://127.0.0.1:{port}", service, on_notify)
+            ingestor.start()
+            for _ in range(50):
+                if ingestor.events_received == 3:
+                    break
+                await asyncio.sleep(0.02)
+            status = ingestor.get_status()
+            await ingestor.stop()
+            return status
+
+    status = asyncio.run(scenario())
+
+    assert [r["id"] for r in notified] == ["s1"]
+    assert status["connected"] is True
+    assert status["last_latency_ms"] is not None
+
+def test_stream_falls_back_to_polling_when_down(tmp_path):
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last.json"))
+    notified = []
+
+    async def on_notify(result):
+        notified.append(result)
+
+    polled = {"id": "p1", "notify": True, "message": "polled", "status": "Earthquake Detected"}
+
+    async def scenario():
+        # Nothing listens on this port, so every connection attempt fails
+        ingestor = QuakeStreamIngestor("ws://127.0.0.1:9", service, on_notify,
+                                       fallback_interval=10, backoff_initial=0.05, backoff_max=0.05)
+        ingestor.start()
+        await asyncio.sleep(0.3)
+        status = ingestor.get_status()
+        await ingestor.stop()
+        return status
+
+    with patch.object(QuakeService, 'check_quake_async', return_value=polled) as mock_check:
+        status = asyncio.run(scenario())
+
+    assert status["connected"] is False
+    assert status["polling_fallback"] is True
+    assert status["reconnects"] >= 2
+    # Fallback keeps polling on its own interval, not on every reconnect attempt
+    assert mock_check.call_count == 1
+    assert notified == [polled]
+
+def test_fallback_polls_through_the_given_check(tmp_path):
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last.json"))
+    notified, polls = [], []
+
+    async def on_notify(result):
+        notified.append(result)
+
+    async def poll():
+        # e.g. main's quake_check, which queues its own alerts
+        polls.append(1)
+        return {"id": "p1", "notify": True, "status": "Earthquake Detected"}
+
+    async def scenario():
+        ingestor = QuakeStreamIngestor("ws://127.0.0.1:9", service, on_notify, fallback_interval=10,
+                                       backoff_initial=0.05, backoff_max=0.05, poll=poll)
+        ingestor.start()
+        await asyncio.sleep(0.2)
+        await ingestor.stop()
+
+    with patch.object(QuakeService, 'check_quake_async') as mock_check:
+        asyncio.run(scenario())
+
+    assert polls == [1] and notified == []
+    mock_check.assert_not_called()
+
+def test_stream_events_wait_for_a_running_check(tmp_path):
+    service = QuakeService("http://mock-api", persistence_file=str(tmp_path / "last.json"))
+    done = threading.Event()
+    worker = threading.Thread(target=lambda: (service.process_feed_item(make_event("s1")), done.set()))
+
+    # A check holding the decision stage
+    with service._lock:
+        worker.start()
+        assert not done.wait(0.1)
+    worker.join(1)
+
+    assert done.is_set()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from unittest.mock import patch
+from aiohttp import web
+from benchmarks.stand_ins import P2PQuakeStandIn
+from app.services.http_client import build_session, close_async_session
+from app.services.quake_service import QuakeService
+from app.services.resilience import CircuitBreaker, HedgedFetcher, OPEN, HALF_OPEN, CLOSED
+from app.services.state_store import InMemoryStateStore
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    with patch("app.services.resilience.time.monotonic", return_value=100):
+        breaker.record_failure()
+        assert breaker.allow() is True
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.allow() is False
+
+    with patch("app.services.resilience.time.monotonic", return_value=131):
+        # One trial call after the reset timeout
+        assert breaker.allow() is True and breaker.state == HALF_OPEN
+        assert breaker.allow() is False
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+    with patch("app.services.resilience.time.monotonic", return_value=162):
+        assert breaker.allow() is True
+        breaker.record_success()
+        assert breaker.state == CLOSED and breaker.allow() is True
+    assert breaker.get_stats()["times_opened"] == 2
+
+def test_hedged_request_to_mirror_beats_slow_primary():
+    slow = P2PQuakeStandIn(latency_ms=1000).start()
+    mirror = P2PQuakeStandIn().start()
+    try:
+        fetcher = HedgedFetcher([slow.url, mirror.url], hedge_delay=0.1, deadline=5)
+        service = QuakeService(slow.url, state_store=InMemoryStateStore(), session=build_session(retry_total=0),
+                               fetcher=fetcher)
+
+        started = time.perf_counter()
+        result = service.check_quake()
+        elapsed = time.perf_counter() - started
+
+        assert result["notify"] is True
+        assert elapsed < 0.8
+        assert fetcher.get_stats()["hedged_requests"] == 1
+        assert fetcher.get_stats()["endpoints"][mirror.url]["wins"] == 1
+    finally:
+        slow.stop()
+        mirror.stop()
+
+def test_failing_primary_is_skipped_once_its_circuit_opens():
+    failing = P2PQuakeStandIn(error_rate=1.0).start()
+    mirror = P2PQuakeStandIn().start()
+    try:
+        fetcher = HedgedFetcher([failing.url, mirror.url], hedge_delay=1, deadline=5, failure_threshold=2)
+        service = QuakeService(failing.url, state_store=InMemoryStateStore(), session=build_session(retry_total=0),
+                               fetcher=fetcher)
+
+        # Failures move straight on to the mirror, without waiting for the hedge delay
+        statuses = [service.check_quake()["status"] for _ in range(4)]
+
+        assert statuses[0] == "Earthquake Detected"
+        assert statuses[1:] == ["Not modified"] * 3
+        assert failing.requests == 2
+        assert fetcher.get_stats()["endpoints"][failing.url]["state"] == OPEN
+    finally:
+        failing.stop()
+        mirror.stop()
+
+def test_async_fetch_fails_fast_at_the_deadline():
+    async def hung(request):
+        await asyncio.sleep(1)
+        return web.json_response([])
+
+    async def scenario():
+        app = web.Application()
+        app.add_routes([web.get("/v2/history", hung)])
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v2/history"
+        try:
+            fetcher = HedgedFetcher([url], deadline=0.3, failure_threshold=1)
+            service = QuakeService(url, state_store=InMemoryStateStore(), fetcher=fetcher)
+            started = time.perf_counter()
+            first = await service.check_quake_async()
+            elapsed = time.perf_counter() - started
+            # The circuit is open now, so the next poll does not even connect
+            second = await service.check_quake_async()
+            return first, elapsed, second
+        finally:
+            await close_async_session()
+            await runner.cleanup()
+
+    first, elapsed, second = asyncio.run(scenario())
+
+    assert first["status"] == "Error" and "0.3s" in first["error"]
+    assert elapsed < 0.8
+    assert second["status"] == "Error" and "Circuit open" in second["error"]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from app.services.scheduler import AdaptiveInterval, Scheduler
+
+def test_interval_tightens_on_activity_and_relaxes_when_quiet():
+    interval = AdaptiveInterval(5, 60, factor=2, jitter=0, active_window=600)
+
+    # Quiet runs stretch the interval up to the maximum
+    assert [interval.record(True, now=1000) for _ in range(5)] == [10, 20, 40, 60, 60]
+
+    # A quake two minutes ago: poll as fast as allowed for the rest of the window
+    assert interval.record(True, activity_at=880, now=1000) == 5
+    assert interval.record(True, now=1400) == 5
+    assert interval.record(True, now=1480) == 10
+
+    # Upstream errors back off, and success resets the error count
+    assert interval.record(False, now=1500) == 20
+    assert interval.record(False, now=1500) == 40
+    assert interval.errors == 2
+    interval.record(True, now=1500)
+    assert interval.errors == 0
+
+def test_jitter_spreads_delays():
+    interval = AdaptiveInterval(10, 10, jitter=0.2)
+    delays = [interval.next_delay() for _ in range(200)]
+
+    assert all(8 <= d <= 12 for d in delays)
+    assert max(delays) - min(delays) > 1
+
+def test_scheduler_runs_jobs_and_wakes_on_reported_activity():
+    runs = []
+
+    async def job():
+        runs.append(asyncio.get_running_loop().time())
+        return True, None
+
+    async def scenario():
+        scheduler = Scheduler()
+        # Quiet: the next run is an hour away
+        scheduler.add_job("quake", job, AdaptiveInterval(0.05, 3600, factor=100000, jitter=0))
+        scheduler.start()
+        await asyncio.sleep(0.1)
+        assert len(runs) == 1
+        status = scheduler.get_status()["jobs"]["quake"]
+        assert status["interval"] == 3600 and status["runs"] == 1
+
+        # An externally triggered check saw a quake: the scheduler catches up right away
+        scheduler.report("quake", True, activity_at=time.time())
+        await asyncio.sleep(0.2)
+        assert len(runs) >= 3
+        assert scheduler.get_status()["jobs"]["quake"]["active"] is True
+
+        await scheduler.stop()
+        assert scheduler.get_status()["running"] is False
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+import asyncio
+from unittest.mock import patch
+from app.services.single_flight import SingleFlight
+
+def make_check(delay=0.05, status="Earthquake Detected"):
+    calls = []
+
+    async def check():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"status": status, "notified": True}
+
+    return check, calls
+
+def test_concurrent_callers_share_one_call():
+    check, calls = make_check()
+    flight = SingleFlight(check)
+
+    async def burst():
+        return await asyncio.gather(*(flight() for _ in range(20)))
+
+    results = asyncio.run(burst())
+
+    assert len(calls) == 1
+    # Only the caller that ran the check sees the result as its own
+    assert [r.get("source") for r in results].count(None) == 1
+    assert {r["status"] for r in results} == {"Earthquake Detected"}
+    assert flight.get_stats()["coalesced"] == 19
+
+def test_result_is_reused_until_ttl_expires():
+    check, calls = make_check(delay=0)
+    flight = SingleFlight(check, ttl=2)
+
+    async def scenario():
+        with patch("app.services.single_flight.time.monotonic", return_value=100):
+            first = await flight()
+        with patch("app.services.single_flight.time.monotonic", return_value=101.5):
+            cached = await flight()
+        with patch("app.services.single_flight.time.monotonic", return_value=102.5):
+            fresh = await flight()
+        return first, cached, fresh
+
+    first, cached, fresh = asyncio.run(scenario())
+
+    assert len(calls) == 2
+    assert cached["source"] == "cache" and "source" not in first and "source" not in fresh
+
+def test_errors_are_not_cached():
+    check, calls = make_check(delay=0, status="Error")
+    flight = SingleFlight(check, ttl=60, cache_if=lambda result: result["status"] != "Error")
+
+    async def scenario():
+        await flight()
+        await flight()
+
+    asyncio.run(scenario())
+
+    assert len(calls) == 2
+
+def test_caller_can_refuse_a_cached_result():
+    check, calls = make_check(delay=0)
+    flight = SingleFlight(check, ttl=60)
+
+    async def scenario():
+        await flight()
+        cached = await flight()
+        fresh = await flight(max_age=0)
+        return cached, fresh
+
+    cached, fresh = asyncio.run(scenario())
+
+    assert len(calls) == 2
+    assert cached["source"] == "cache" and "source" not in fresh
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+def test_importing_app_is_lazy(tmp_path):
+    # A fresh interpreter, since other tests have already loaded the client libraries
+    script = (
+        "import json, os, sys\n"
+        "import app.main as m\n"
+        "heavy = sorted({k.split('.')[0] for k in sys.modules} & {'aiohttp', 'requests', 'linebot', 'websockets'})\n"
+        "print(json.dumps({'heavy': heavy, 'files': os.listdir('.'), 'services': sorted(m._services),"
+        " 'import_seconds': m.startup_stats['import_seconds']}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=tmp_path, env={"PYTHONPATH": str(REPO_ROOT)},
+        capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["heavy"] == []
+    assert result["files"] == []  # No data/ directory until something is stored
+    assert result["services"] == []
+    assert result["import_seconds"] > 0
+
+def test_services_are_built_once_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from app import main
+
+    monkeypatch.setattr(main, "_services", {})
+    service = main.get_quake_service()
+
+    assert main.get_quake_service() is service
+    assert sorted(main._services) == ["claim_store", "quake_archive", "quake_service", "subscriber_registry"]
+
+def test_recoveries_are_sent_under_their_own_title(monkeypatch):
+    from app import main
+    from app.services.health_history import DOWN, UP, HealthAlert
+
+    sent = []
+    patrol = {"errors": ["❌ Shop: Access failed"], "degraded": [], "alerts": [
+        HealthAlert("❌ Shop: Access failed", DOWN), HealthAlert("✅ Blog: Recovered", UP),
+    ]}
+
+    async def patrol_async(targets):
+        return patrol
+
+    monkeypatch.setattr(main, "_services", {"health_service": SimpleNamespace(patrol_async=patrol_async),
+                                            "watch_targets": []})
+    monkeypatch.setattr(main, "enqueue_health_alert", sent.append)
+    result = asyncio.run(main.run_health_patrol())
+
+    assert result["status"] == "Alert Sent"
+    assert sent == ["🦦 Emergency Alert! \n\n❌ Shop: Access failed", "🦦 Recovery Notice \n\n✅ Blog: Recovered"]
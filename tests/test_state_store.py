@@ -0,0 +1,35 @@
+import json
+from unittest.mock import patch
+from app.services.state_store import JsonFileStateStore, InMemoryStateStore
+
+def test_reads_are_cached_until_file_changes(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text('{"id": "a"}')
+    store = JsonFileStateStore(str(path))
+
+    assert store.get("id") == "a"
+    with patch("builtins.open", side_effect=AssertionError("unexpected disk read")):
+        assert store.get("id") == "a"
+
+    # Another process rewrites the file
+    other = JsonFileStateStore(str(path))
+    other.set("id", "b")
+    assert store.get("id") == "b"
+
+def test_writes_are_atomic_and_keep_other_keys(tmp_path):
+    path = tmp_path / "state.json"
+    store = JsonFileStateStore(str(path))
+    store.update({"id": "a", "cursor": "2024/01/01 00:00:00"})
+    store.set("id", "b")
+
+    assert json.loads(path.read_text()) == {"id": "b", "cursor": "2024/01/01 00:00:00"}
+    # No temp files are left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["state.json", "state.json.lock"]
+
+def test_compare_and_swap():
+    store = InMemoryStateStore({"id": "a"})
+
+    assert store.compare_and_swap("id", "x", "b") is False
+    assert store.compare_and_swap("id", "a", "b", extra={"updated_at": "now"}) is True
+    assert store.get("id") == "b"
+    assert store.get("updated_at") == "now"
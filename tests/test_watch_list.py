@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.health_service import HealthService
+from app.services.health_shards import merge_shards
+from app.services.host_limits import HostLimits, TokenBucket
+from app.services.http_client import AsyncResponse
+from app.services.metrics import HEALTH_PROBE_SECONDS
+from app.services.watch_list import HashRing, WatchTarget, load_watch_list
+
+def test_watch_list_loads_json_and_yaml_directory(tmp_path):
+    (tmp_path / "a.json").write_text(json.dumps({
+        "defaults": {"timeout": 5},
+        "targets": [{"name": "Shop", "url": "https://shop.example.com", "expected_status": [200, 204]}],
+    }), encoding="utf-8")
+    (tmp_path / "b.yaml").write_text("Blog: https://blog.example.com\nApi:\n  url: https://api.example.com\n  interval: 60\n",
+                                     encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+
+    targets = load_watch_list(str(tmp_path))
+
+    assert [t.name for t in targets] == ["Shop", "Blog", "Api"]
+    assert targets[0].timeout == 5 and targets[0].expected_status == (200, 204)
+    assert targets[2].interval == 60 and targets[1].expected_status == (200,)
+
+    (tmp_path / "c.json").write_text(json.dumps([{"name": "Shop", "url": "https://other.example.com"}]))
+    with pytest.raises(ValueError, match="duplicate"):
+        load_watch_list(str(tmp_path))
+
+def test_hash_ring_splits_targets_and_moves_few_when_a_node_joins():
+    targets = [WatchTarget(f"site{i}", f"https://site{i}.example.com") for i in range(1000)]
+    ring = HashRing(["a", "b", "c"])
+    shards = {node: ring.shard(targets, node) for node in ring.nodes}
+
+    assert sum(len(shard) for shard in shards.values()) == 1000
+    assert all(250 < len(shard) < 420 for shard in shards.values())
+
+    grown = HashRing(["a", "b", "c", "d"])
+    moved = [t for t in targets if ring.node_for(t.name) != grown.node_for(t.name)]
+    # Only the new node's share moves, and all of it moves to the new node
+    assert len(moved) < 350
+    assert {grown.node_for(t.name) for t in moved} == {"d"}
+
+def test_patrol_honours_per_target_interval_and_expected_status():
+    service = HealthService()
+    targets = [
+        WatchTarget("Api", "http://api.example.com", expected_status=204),
+        WatchTarget("Slowly", "http://slowly.example.com", interval=300),
+    ]
+    calls = []
+
+    async def request(method, url, timeout=None, read_body=True):
+        calls.append(url)
+        return AsyncResponse(204 if "api" in url else 500, {}, b"", url)
+
+    async def scenario():
+        with patch("app.services.health_service.async_request", side_effect=request), \
+             patch.object(service, "_forget_dns"):
+            first = await service.patrol_async(targets)
+            second = await service.patrol_async(targets)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert calls.count("http://slowly.example.com") == 1
+    assert calls.count("http://api.example.com") == 2
+    # The skipped target keeps its last result
+    assert first["errors"] == second["errors"] == ["⚠️ Slowly: Abnormal response (Code: 500)"]
+    assert second["alerts"] == []
+
+def test_host_limits_cap_concurrency_and_rate_per_host():
+    bucket = TokenBucket(rate=10, burst=2)
+    with patch("app.services.host_limits.time.monotonic", return_value=100):
+        bucket.updated = 100
+        assert [round(bucket.reserve(), 2) for _ in range(4)] == [0, 0, 0.1, 0.2]
+
+    service = HealthService(max_concurrency=10, host_limits=HostLimits(per_host=2))
+    in_flight = {"shared.example.com": 0, "other.example.com": 0}
+    peak = dict(in_flight)
+    response = MagicMock(status_code=200)
+
+    def get(url, timeout=None):
+        host = url.split("/")[2]
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        time.sleep(0.05)
+        in_flight[host] -= 1
+        return response
+
+    targets = [WatchTarget(f"s{i}", f"http://shared.example.com/{i}") for i in range(6)]
+    targets += [WatchTarget(f"o{i}", f"http://other.example.com/{i}") for i in range(2)]
+    with patch("requests.Session.get", side_effect=get):
+        assert service.check_health(targets) == []
+
+    assert peak == {"shared.example.com": 2, "other.example.com": 2}
+
+def test_busy_host_does_not_hold_up_other_hosts_in_the_sync_patrol():
+    service = HealthService(max_concurrency=2, host_limits=HostLimits(per_host=1, rate=20, burst=1))
+    starts = {}
+    response = MagicMock(status_code=200)
+
+    def get(url, timeout=None):
+        starts[url] = time.monotonic()
+        time.sleep(0.02)
+        return response
+
+    # The other host is listed last, behind four targets of a host allowing one probe at a time
+    targets = [WatchTarget(f"s{i}", f"http://shared.example.com/{i}") for i in range(4)]
+    targets.append(WatchTarget("other", "http://other.example.com/"))
+    begin = time.monotonic()
+    with patch("requests.Session.get", side_effect=get):
+        assert service.check_health(targets) == []
+
+    assert starts["http://other.example.com/"] - begin < 0.04
+    shared = sorted(starts[t.url] for t in targets[:4])
+    # One probe every 1/rate seconds on the shared host
+    assert all(b - a >= 0.045 for a, b in zip(shared, shared[1:]))
+
+def test_host_slot_of_an_abandoned_probe_is_held_until_it_returns():
+    service = HealthService(max_concurrency=2, target_deadline=0.1, host_limits=HostLimits(per_host=1))
+    ends = {}
+    response = MagicMock(status_code=200)
+
+    def get(url, timeout=None):
+        start = time.monotonic()
+        time.sleep(0.4 if url.endswith("/hung") else 0.01)
+        ends[url] = (start, time.monotonic())
+        return response
+
+    targets = [WatchTarget("hung", "http://shared.example.com/hung"), WatchTarget("next", "http://shared.example.com/next")]
+    before = HEALTH_PROBE_SECONDS.count(target="next", host="shared.example.com")
+    with patch("requests.Session.get", side_effect=get):
+        assert service.check_health(targets) == ["❌ hung: Access failed"]
+
+    # The host still had a request in flight after the deadline gave up on it
+    assert ends["http://shared.example.com/next"][0] >= ends["http://shared.example.com/hung"][1]
+    assert HEALTH_PROBE_SECONDS.count(target="next", host="shared.example.com") == before + 1
+
+def test_shard_results_merge_into_the_worst_status():
+    merged = merge_shards({
+        "a": {"status": "All Green", "detail": "異常なし"},
+        "b": {"status": "Degraded", "detail": ["🐢 Blog: Slow response (6.0s > 5s)"]},
+        "c": {"status": "Known Issues", "detail": ["❌ shard c: Unreachable"]},
+    })
+
+    assert merged["status"] == "Known Issues"
+    assert merged["detail"] == ["🐢 Blog: Slow response (6.0s > 5s)", "❌ shard c: Unreachable"]
+    assert merged["shards"] == {"a": "All Green", "b": "Degraded", "c": "Known Issues"}